@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, request
+from flask import Flask, current_app, jsonify, request
 from flask_cors import CORS
 from flask_login import LoginManager
 from config import Config
@@ -14,42 +14,39 @@ if "pytest" not in sys.modules:
 
     load_dotenv(override=True)
 
-app = Flask(__name__)
-app.config.from_object(Config)
-
-# Configurar CORS corretamente para permitir cookies e requisições de arquivos
-CORS(
-    app,
-    resources={r"/api/*": {"origins": "*"}},
-    supports_credentials=True,
-    expose_headers=["Content-Disposition", "Content-Type", "Content-Length"],
-    allow_headers=[
-        "Content-Type",
-        "Authorization",
-        "Content-Length",
-        "X-Requested-With",
-    ],
-    methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-)
-
-# Importar db de models e inicializar com app
-from models import db, User, Problem
-
-db.init_app(app)
+from models import db, User
+from database import configure_sqlite, engine_options
+from search import search_index
+from query_counter import query_counter
+from response_cache import response_cache
+from jobs import job_queue
+from identity import identity_cache
+from passwords import password_verifier
+from metrics import metrics, metrics_endpoint
+from related import related_index
+from broadcast import broadcaster
+from compression import compression
+from serialization import FastJSONProvider
+import facets  # mantém a tabela facet_counts a cada flush
+import changes  # updated_at e exclusões para o feed de alterações
+from file_serving import SendfileStandIn
 
 # Configurar login manager
 login_manager = LoginManager()
-login_manager.init_app(app)
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Identidade em cache (sem consultar a tabela users a cada requisição)
+    return identity_cache.load(user_id)
 
 
 # Criar diretório para uploads
 def create_upload_folder():
-    os.makedirs(os.path.join(app.root_path, Config.UPLOAD_FOLDER), exist_ok=True)
+    os.makedirs(
+        os.path.join(current_app.root_path, current_app.config["UPLOAD_FOLDER"]),
+        exist_ok=True,
+    )
 
 
 # Verificar se sistema tem um admin
@@ -58,23 +55,24 @@ def verificar_admin():
     return admin is not None
 
 
-# Importar rotas depois de inicializar tudo
-from routes.auth_routes import auth_bp
-from routes.problem_routes import problem_bp
-from routes.user_routes import user_bp
+# Preparar pasta de uploads e esquema do banco (uma vez, antes dos workers)
+def prepare_database():
+    from migrations import upgrade
 
-# Registrar blueprints
-app.register_blueprint(auth_bp, url_prefix="/api/auth")
-app.register_blueprint(problem_bp, url_prefix="/api/problems")
-app.register_blueprint(user_bp, url_prefix="/api/users")
+    # Criar diretório de uploads
+    create_upload_folder()
+
+    # Criar tabelas
+    db.create_all()
+
+    # Aplicar ajustes de esquema em bancos existentes
+    upgrade()
 
 
-@app.route("/api/health")
 def health_check():
     return jsonify({"status": "healthy"})
 
 
-@app.route("/api/setup", methods=["POST"])
 def setup_admin():
     # Verificar se já existe um admin
     if verificar_admin():
@@ -94,13 +92,79 @@ def setup_admin():
     return jsonify({"message": "Administrador configurado com sucesso"}), 201
 
 
-if __name__ == "__main__":
+def create_app(config_class=Config):
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+    app.json = FastJSONProvider(app)
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config))
+
+    # Configurar CORS corretamente para permitir cookies e requisições de arquivos
+    CORS(
+        app,
+        resources={r"/api/*": {"origins": "*"}},
+        supports_credentials=True,
+        expose_headers=["Content-Disposition", "Content-Type", "Content-Length"],
+        allow_headers=[
+            "Content-Type",
+            "Authorization",
+            "Content-Length",
+            "X-Requested-With",
+        ],
+        methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    )
+
+    # Inicializar extensões
+    db.init_app(app)
     with app.app_context():
-        # Criar diretório de uploads
-        create_upload_folder()
+        configure_sqlite(db.engine, app.config)
+    search_index.init_app(app)
+    query_counter.init_app(app)
+    metrics.init_app(app)
+    # Depois das métricas: o tempo de compressão entra na latência medida
+    compression.init_app(app)
+    response_cache.init_app(app)
+    job_queue.init_app(app)
+    related_index.init_app(app)
+    broadcaster.init_app(app)
+    identity_cache.init_app(app)
+    password_verifier.init_app(app)
+    login_manager.init_app(app)
+
+    # Importar rotas depois de inicializar tudo
+    from routes.auth_routes import auth_bp
+    from routes.problem_routes import problem_bp
+    from routes.user_routes import user_bp
+    from routes.upload_routes import upload_bp
+
+    # Registrar blueprints
+    app.register_blueprint(auth_bp, url_prefix="/api/auth")
+    app.register_blueprint(problem_bp, url_prefix="/api/problems")
+    app.register_blueprint(user_bp, url_prefix="/api/users")
+    app.register_blueprint(upload_bp, url_prefix="/api/uploads")
+
+    app.add_url_rule("/api/health", view_func=health_check)
+    app.add_url_rule("/api/setup", view_func=setup_admin, methods=["POST"])
+    app.add_url_rule("/api/metrics", view_func=metrics_endpoint)
+
+    # Simular o Nginx/Apache (X-Accel-Redirect/X-Sendfile) localmente
+    if app.config["SENDFILE_STANDIN"]:
+        app.wsgi_app = SendfileStandIn(
+            app.wsgi_app,
+            os.path.join(app.root_path, app.config["UPLOAD_FOLDER"]),
+            app.config["X_ACCEL_PREFIX"],
+        )
+
+    return app
+
+
+# Instância padrão (usada por "python app.py", init_db.py e manage.py); em
+# produção use wsgi.py
+app = create_app()
 
-        # Criar tabelas
-        db.create_all()
+
+if __name__ == "__main__":
+    with app.app_context():
+        prepare_database()
 
         # Verificar se o sistema precisa de setup inicial
         if not verificar_admin():
@@ -0,0 +1,753 @@
+# Benchmark de carga da API.
+#
+#   python benchmarks/api.py run                     # base temporária, padrão
+#   python benchmarks/api.py run --problems 20000 --clients 16 --requests 400
+#   python benchmarks/api.py run --scenario problems.list --scenario problems.get
+#   python benchmarks/api.py list                    # cenários disponíveis
+#   python benchmarks/api.py compare antes.json depois.json
+#
+# "run" gera uma base sintética (benchmarks/seed.py) em um banco e pasta de
+# uploads temporários e executa cada cenário em sequência, com vários clientes
+# simultâneos. Por padrão os clientes usam o cliente de teste do Flask no
+# próprio processo; com --url as requisições vão por HTTP para um servidor já
+# rodando (que deve usar o mesmo banco: --database e --uploads). Para cada
+# cenário são medidos latência (p50/p95/p99), vazão e comandos SQL por
+# requisição (cabeçalho X-Query-Count), além dos bytes transferidos e dos
+# bytes já descomprimidos (--accept-encoding identity mede sem compressão).
+# O resultado é salvo em JSON em benchmarks/results/ para ser comparado com
+# execuções anteriores.
+import argparse
+import gzip
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import Counter, namedtuple
+
+import seed as seed_module
+
+BACKEND_DIR = seed_module.BACKEND_DIR
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+# O parâmetro "json" dos clientes esconde o módulo
+_json_dumps = json.dumps
+
+# size: bytes transferidos; raw_size: bytes depois de descomprimir
+# body: conteúdo das respostas JSON (None para arquivos e demais tipos)
+Result = namedtuple("Result", ["status", "headers", "size", "raw_size", "body"])
+
+DEFAULT_ACCEPT_ENCODING = "gzip, br"
+
+
+def json_of(result):
+    try:
+        return json.loads(result.body) if result.body else {}
+    except ValueError:
+        return {}
+
+
+# --- Clientes ---------------------------------------------------------------
+
+
+def decode(data, encoding):
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    if encoding == "br":
+        import brotli
+
+        return brotli.decompress(data)
+    return data
+
+
+class TestClient:
+    # Cliente de teste do Flask (no mesmo processo)
+    def __init__(self, app, accept_encoding=DEFAULT_ACCEPT_ENCODING):
+        self.client = app.test_client()
+        self.accept_encoding = accept_encoding
+
+    def request(self, method, path, json=None, data=None, headers=None):
+        headers = {"Accept-Encoding": self.accept_encoding, **(headers or {})}
+        response = self.client.open(
+            path, method=method, json=json, data=data, headers=headers
+        )
+        data = response.get_data()
+        response.close()
+        raw = decode(data, response.headers.get("Content-Encoding"))
+        body = raw if response.mimetype == "application/json" else None
+        return Result(response.status_code, response.headers, len(data), len(raw), body)
+
+
+class HttpClient:
+    # Requisições HTTP reais, com cookies de sessão
+    def __init__(self, base_url, accept_encoding=DEFAULT_ACCEPT_ENCODING):
+        self.base_url = base_url.rstrip("/")
+        self.accept_encoding = accept_encoding
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def request(self, method, path, json=None, data=None, headers=None):
+        headers = {"Accept-Encoding": self.accept_encoding, **(headers or {})}
+        body = None
+        if json is not None:
+            body = _json_dumps(json).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        elif isinstance(data, dict):
+            body = urllib.parse.urlencode(data).encode("utf-8")
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        elif data is not None:
+            body = data
+
+        request = urllib.request.Request(
+            self.base_url + path, data=body, headers=headers, method=method
+        )
+        try:
+            response = self.opener.open(request)
+        except urllib.error.HTTPError as e:
+            response = e
+        with response:
+            data = response.read()
+            raw = decode(data, response.headers.get("Content-Encoding"))
+            body = (
+                raw
+                if response.headers.get_content_type() == "application/json"
+                else None
+            )
+            return Result(response.status, response.headers, len(data), len(raw), body)
+
+
+# --- Cenários ---------------------------------------------------------------
+
+# run(client, context, rng) faz uma ou mais requisições e retorna os resultados
+Scenario = namedtuple("Scenario", ["name", "run", "max_requests"])
+
+SCENARIOS = []
+
+
+def scenario(name, max_requests=None):
+    def decorator(func):
+        SCENARIOS.append(Scenario(name, func, max_requests))
+        return func
+
+    return decorator
+
+
+def _get(client, path, headers=None):
+    return client.request("GET", path, headers=headers)
+
+
+@scenario("health")
+def _health(client, context, rng):
+    return _get(client, "/api/health")
+
+
+@scenario("auth.login")
+def _login(client, context, rng):
+    return client.request(
+        "POST",
+        "/api/auth/login",
+        json={"username": "admin", "password": seed_module.PASSWORD},
+    )
+
+
+@scenario("auth.me")
+def _me(client, context, rng):
+    return _get(client, "/api/auth/me")
+
+
+@scenario("auth.register", max_requests=50)
+def _register(client, context, rng):
+    return client.request(
+        "POST",
+        "/api/auth/register",
+        json={
+            "username": f"bench-{uuid.uuid4().hex[:12]}",
+            "password": seed_module.PASSWORD,
+            "role": "user",
+        },
+    )
+
+
+@scenario("problems.list_all", max_requests=50)
+def _list_all(client, context, rng):
+    # Listagem completa (formato antigo, sem paginação)
+    return _get(client, "/api/problems/")
+
+
+@scenario("problems.list_stream", max_requests=50)
+def _list_stream(client, context, rng):
+    # Listagem completa em streaming
+    return _get(client, "/api/problems/?stream=true")
+
+
+@scenario("problems.list")
+def _list(client, context, rng):
+    return _get(client, "/api/problems/?limit=20&view=summary")
+
+
+@scenario("problems.list_pages")
+def _list_pages(client, context, rng):
+    # Três páginas seguidas pelo cursor
+    results = []
+    path = "/api/problems/?limit=20&view=summary"
+    for _ in range(3):
+        result = _get(client, path)
+        results.append(result)
+        cursor = context["cursors"].get(path)
+        if cursor is None:
+            break
+        path = "/api/problems/?limit=20&view=summary&cursor=" + cursor
+    return results
+
+
+@scenario("problems.list_tag")
+def _list_tag(client, context, rng):
+    tag = urllib.parse.quote(rng.choice(context["tags"]))
+    return _get(client, f"/api/problems/?limit=20&tag={tag}")
+
+
+@scenario("problems.list_category")
+def _list_category(client, context, rng):
+    category = urllib.parse.quote(rng.choice(context["categories"]))
+    return _get(client, f"/api/problems/?limit=20&category={category}")
+
+
+@scenario("problems.search")
+def _search(client, context, rng):
+    query = urllib.parse.quote(" ".join(rng.sample(seed_module.WORDS, 2)))
+    return _get(client, f"/api/problems/search?q={query}")
+
+
+@scenario("problems.get")
+def _get_problem(client, context, rng):
+    return _get(client, f"/api/problems/{rng.choice(context['problem_ids'])}")
+
+
+@scenario("problems.categories")
+def _categories(client, context, rng):
+    return _get(client, "/api/problems/categories")
+
+
+@scenario("problems.tags")
+def _tags(client, context, rng):
+    return _get(client, "/api/problems/tags")
+
+
+@scenario("problems.file")
+def _file(client, context, rng):
+    return _get(client, "/api/problems/files/" + rng.choice(context["documents"]))
+
+
+@scenario("problems.file_range")
+def _file_range(client, context, rng):
+    return _get(
+        client,
+        "/api/problems/files/" + rng.choice(context["documents"]),
+        headers={"Range": "bytes=0-65535"},
+    )
+
+
+@scenario("problems.thumbnail")
+def _thumbnail(client, context, rng):
+    return _get(
+        client,
+        "/api/problems/files/" + rng.choice(context["images"]) + "?size=sm",
+        headers={"Accept": "image/webp,image/*"},
+    )
+
+
+@scenario("problems.export", max_requests=5)
+def _export(client, context, rng):
+    return _get(client, "/api/problems/export")
+
+
+@scenario("problems.create")
+def _create(client, context, rng):
+    return client.request(
+        "POST",
+        "/api/problems/",
+        data={
+            "title": " ".join(rng.sample(seed_module.WORDS, 4)),
+            "description": " ".join(rng.choices(seed_module.WORDS, k=60)),
+            "category": rng.choice(context["categories"]),
+            "tags": ",".join(rng.sample(context["tags"], 2)),
+        },
+    )
+
+
+@scenario("problems.update")
+def _update(client, context, rng):
+    problem_id = rng.choice(context["problem_ids"])
+    return client.request(
+        "PUT",
+        f"/api/problems/{problem_id}",
+        data={
+            "title": " ".join(rng.sample(seed_module.WORDS, 4)),
+            "tags": ",".join(rng.sample(context["tags"], 3)),
+        },
+    )
+
+
+@scenario("problems.delete")
+def _delete(client, context, rng):
+    # Cria e exclui (não consome os problemas da base)
+    created = client.request(
+        "POST",
+        "/api/problems/",
+        data={
+            "title": "Excluir",
+            "description": "Problema temporário do benchmark",
+            "category": rng.choice(context["categories"]),
+            "tags": rng.choice(context["tags"]),
+        },
+    )
+    problem_id = json_of(created).get("id")
+    if problem_id is None:
+        return created
+    return [created, client.request("DELETE", f"/api/problems/{problem_id}")]
+
+
+@scenario("users.list")
+def _users(client, context, rng):
+    return _get(client, "/api/users/")
+
+
+@scenario("users.get")
+def _user(client, context, rng):
+    return _get(client, f"/api/users/{rng.choice(context['user_ids'])}")
+
+
+@scenario("users.update")
+def _update_user(client, context, rng):
+    return client.request(
+        "PUT",
+        f"/api/users/{rng.choice(context['user_ids'])}",
+        json={"role": rng.choice(["tecnico", "user"])},
+    )
+
+
+@scenario("uploads.flow")
+def _upload_flow(client, context, rng):
+    # Início, uma parte de 64KB, finalização e cancelamento
+    content = rng.getrandbits(64 * 1024 * 8).to_bytes(64 * 1024, "little")
+    started = client.request(
+        "POST",
+        "/api/uploads/",
+        json={"filename": "bench.pdf", "size": len(content)},
+    )
+    upload_id = json_of(started).get("id")
+    if upload_id is None:
+        return started
+    return [
+        started,
+        client.request("PUT", f"/api/uploads/{upload_id}/chunks/0", data=content),
+        client.request("POST", f"/api/uploads/{upload_id}/complete"),
+        client.request("DELETE", f"/api/uploads/{upload_id}"),
+    ]
+
+
+# --- Execução ---------------------------------------------------------------
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    index = min(int(round(fraction * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def run_scenario(scenario, make_client, context, clients, requests, warmup, seed):
+    total = min(requests, scenario.max_requests or requests)
+    clients = max(min(clients, total), 1)
+    per_client = [
+        total // clients + (1 if index < total % clients else 0)
+        for index in range(clients)
+    ]
+
+    sessions = [make_client() for _ in range(clients)]
+    for client_index, client in enumerate(sessions):
+        rng = random.Random(f"{seed}-{scenario.name}-warmup-{client_index}")
+        for _ in range(warmup if client_index == 0 else 0):
+            scenario.run(client, context, rng)
+
+    samples = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients + 1)
+
+    def worker(client_index):
+        client = sessions[client_index]
+        rng = random.Random(f"{seed}-{scenario.name}-{client_index}")
+        local = []
+        barrier.wait()
+        for _ in range(per_client[client_index]):
+            started = time.perf_counter()
+            results = scenario.run(client, context, rng)
+            elapsed = time.perf_counter() - started
+            if not isinstance(results, list):
+                results = [results]
+            local.append(
+                (
+                    elapsed,
+                    [result.status for result in results],
+                    sum(
+                        int(result.headers.get("X-Query-Count") or 0)
+                        for result in results
+                    ),
+                    sum(result.size for result in results),
+                    sum(result.raw_size for result in results),
+                )
+            )
+        with lock:
+            samples.extend(local)
+
+    threads = [
+        threading.Thread(target=worker, args=(index,)) for index in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies = sorted(sample[0] for sample in samples)
+    statuses = Counter(status for sample in samples for status in sample[1])
+    queries = [sample[2] for sample in samples]
+    size = sum(sample[3] for sample in samples)
+    raw_size = sum(sample[4] for sample in samples)
+
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        "requests": len(samples),
+        "clients": clients,
+        "seconds": round(wall, 3),
+        "throughput": round(len(samples) / wall, 2) if wall else None,
+        "p50_ms": ms(percentile(latencies, 0.50)),
+        "p95_ms": ms(percentile(latencies, 0.95)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "max_ms": ms(latencies[-1]) if latencies else None,
+        "errors": sum(n for status, n in statuses.items() if status >= 400),
+        "statuses": {str(status): n for status, n in sorted(statuses.items())},
+        "queries_mean": round(sum(queries) / len(queries), 2) if queries else None,
+        "queries_max": max(queries) if queries else None,
+        "bytes": size,
+        "raw_bytes": raw_size,
+        "kb_per_request": round(size / len(samples) / 1024, 1) if samples else None,
+        "raw_kb_per_request": (
+            round(raw_size / len(samples) / 1024, 1) if samples else None
+        ),
+    }
+
+
+def build_context(app, make_client):
+    # Dados usados pelos cenários, lidos da base já populada
+    from models import Attachment, Problem, Tag, User, db
+
+    with app.app_context():
+        problem_ids = [row[0] for row in db.session.query(Problem.id)]
+        tags = [row[0] for row in db.session.query(Tag.name)]
+        categories = [row[0] for row in db.session.query(Problem.category.distinct())]
+        user_ids = [
+            row[0] for row in db.session.query(User.id).filter(User.username != "admin")
+        ]
+        documents, images = set(), set()
+        for reference, mime_type in (
+            db.session.query(Attachment.reference, Attachment.mime_type)
+            .filter(Attachment.sha256.isnot(None))
+            .limit(4000)
+        ):
+            name = reference.rsplit("/", 1)[-1]
+            if mime_type.startswith("image/"):
+                images.add(name)
+            else:
+                documents.add(name)
+
+    # Cursores das primeiras páginas (para o cenário de páginas seguidas)
+    cursors = {}
+    client = make_client()
+    path = "/api/problems/?limit=20&view=summary"
+    for _ in range(3):
+        cursor = json_of(client.request("GET", path)).get("next_cursor")
+        if not cursor:
+            break
+        cursors[path] = cursor
+        path = "/api/problems/?limit=20&view=summary&cursor=" + cursor
+
+    return {
+        "problem_ids": problem_ids,
+        "tags": tags,
+        "categories": categories,
+        "user_ids": user_ids or [1],
+        "documents": sorted(documents) or ["inexistente.pdf"],
+        "images": sorted(images) or ["inexistente.png"],
+        "cursors": cursors,
+    }
+
+
+def environment_info(app):
+    from serialization import FastJSONProvider
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        commit = None
+
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sqlite": sqlite3.sqlite_version,
+        "database": app.config["SQLALCHEMY_DATABASE_URI"].split(":", 1)[0],
+        "search_backend": app.config["SEARCH_BACKEND"],
+        "response_cache": app.config["RESPONSE_CACHE_BACKEND"],
+        "password_hash": app.config["PASSWORD_HASH_METHOD"],
+        "json": "orjson" if FastJSONProvider.available else "json",
+        "compression": app.config["COMPRESS_ENABLED"],
+    }
+
+
+def run(args):
+    directory = tempfile.mkdtemp(prefix="wiki-bench-")
+    database = args.database or "sqlite:///" + os.path.join(directory, "bench.db")
+    uploads = os.path.abspath(args.uploads or os.path.join(directory, "uploads"))
+
+    # O app lê estas variáveis ao ser importado
+    os.environ["DATABASE_URL"] = database
+    os.environ["JOB_WORKERS"] = "0"
+    os.environ["QUERY_COUNT_HEADER"] = "true"
+    if args.no_response_cache:
+        os.environ["RESPONSE_CACHE_BACKEND"] = "null"
+    sys.path.insert(0, BACKEND_DIR)
+
+    from app import app, prepare_database
+
+    app.config["UPLOAD_FOLDER"] = uploads
+    app.config["LOGIN_MAX_ATTEMPTS"] = 10**9
+
+    try:
+        with app.app_context():
+            prepare_database()
+
+        dataset = seed_module.dataset_options(args)
+        if not args.skip_seed:
+            print(f"Gerando base sintética: {dataset}", file=sys.stderr)
+            result = seed_module.seed_database(app, **dataset)
+            print(
+                f"{result.imported} problemas em {result.elapsed:.1f}s",
+                file=sys.stderr,
+            )
+
+        def make_client():
+            client = (
+                HttpClient(args.url, args.accept_encoding)
+                if args.url
+                else TestClient(app, args.accept_encoding)
+            )
+            client.request(
+                "POST",
+                "/api/auth/login",
+                json={"username": "admin", "password": seed_module.PASSWORD},
+            )
+            return client
+
+        context = build_context(app, make_client)
+
+        selected = select_scenarios(args.scenario)
+        results = {}
+        for item in selected:
+            stats = run_scenario(
+                item,
+                make_client,
+                context,
+                args.clients,
+                args.requests,
+                args.warmup,
+                args.seed,
+            )
+            results[item.name] = stats
+            print(format_row(item.name, stats), file=sys.stderr)
+    finally:
+        if not args.keep:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "environment": environment_info(app),
+        "dataset": dataset,
+        "settings": {
+            "clients": args.clients,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "mode": "http" if args.url else "test_client",
+            "accept_encoding": args.accept_encoding,
+        },
+        "scenarios": results,
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S", time.gmtime()) + ".json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Resultados salvos em {output}", file=sys.stderr)
+
+
+def select_scenarios(names):
+    # Nomes exatos ou prefixos ("problems." seleciona todos de problems)
+    if not names:
+        return list(SCENARIOS)
+    return [
+        item
+        for item in SCENARIOS
+        if any(item.name == name or item.name.startswith(name) for name in names)
+    ]
+
+
+HEADER = (
+    f"{'cenário':<24} {'req':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+    f"{'p99 ms':>9} {'SQL':>6} {'KB/req':>8} {'KB bruto':>9} {'erros':>6}"
+)
+
+
+def format_row(name, stats):
+    return (
+        f"{name:<24} {stats['requests']:>6} {stats['throughput']:>9} "
+        f"{stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9} "
+        f"{stats['queries_mean']:>6} {stats['kb_per_request']:>8} "
+        f"{stats['raw_kb_per_request']:>9} {stats['errors']:>6}"
+    )
+
+
+def compare(args):
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+
+    if baseline.get("dataset") != current.get("dataset"):
+        print("Aviso: as bases sintéticas das duas execuções são diferentes")
+
+    def change(old, new):
+        if old in (None, 0) or new is None:
+            return "     -"
+        return f"{(new - old) / old * 100:+6.1f}%"
+
+    print(
+        f"{'cenário':<24} {'p95 antes':>10} {'p95 depois':>10} {'Δ p95':>8} "
+        f"{'req/s Δ':>8} {'SQL antes':>9} {'SQL depois':>10} {'KB/req Δ':>9}"
+    )
+    regressions = []
+    for name, new in current["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if old is None:
+            print(f"{name:<24} (novo)")
+            continue
+
+        p95_change = change(old["p95_ms"], new["p95_ms"])
+        print(
+            f"{name:<24} {old['p95_ms']:>10} {new['p95_ms']:>10} {p95_change:>8} "
+            f"{change(old['throughput'], new['throughput']):>8} "
+            f"{old['queries_mean']:>9} {new['queries_mean']:>10} "
+            f"{change(old.get('kb_per_request'), new.get('kb_per_request')):>9}"
+        )
+
+        if old["p95_ms"] and new["p95_ms"] > old["p95_ms"] * (1 + args.threshold / 100):
+            regressions.append(f"{name}: p95 {old['p95_ms']} -> {new['p95_ms']} ms")
+        if (new["queries_mean"] or 0) > (old["queries_mean"] or 0):
+            regressions.append(
+                f"{name}: SQL {old['queries_mean']} -> {new['queries_mean']}"
+            )
+        if new["errors"] > old["errors"]:
+            regressions.append(f"{name}: erros {old['errors']} -> {new['errors']}")
+
+    if regressions:
+        print("\nPossíveis regressões:")
+        for line in regressions:
+            print("  " + line)
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga da API")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Executar o benchmark")
+    seed_module.add_arguments(run_parser)
+    run_parser.add_argument(
+        "--clients", type=int, default=8, help="Clientes simultâneos"
+    )
+    run_parser.add_argument(
+        "--requests", type=int, default=200, help="Iterações por cenário"
+    )
+    run_parser.add_argument(
+        "--warmup", type=int, default=5, help="Iterações descartadas por cenário"
+    )
+    run_parser.add_argument(
+        "--scenario", action="append", help="Cenário ou prefixo (pode repetir)"
+    )
+    run_parser.add_argument("--output", "-o", help="Arquivo JSON de resultado")
+    run_parser.add_argument("--database", help="URL do banco (padrão: temporário)")
+    run_parser.add_argument("--uploads", help="Pasta de uploads (padrão: temporária)")
+    run_parser.add_argument("--url", help="Usar um servidor HTTP já rodando")
+    run_parser.add_argument(
+        "--skip-seed", action="store_true", help="Usar a base já existente"
+    )
+    run_parser.add_argument(
+        "--no-response-cache",
+        action="store_true",
+        help="Desativar o cache de respostas",
+    )
+    run_parser.add_argument(
+        "--keep", action="store_true", help="Manter a pasta temporária"
+    )
+    run_parser.add_argument(
+        "--accept-encoding",
+        default=DEFAULT_ACCEPT_ENCODING,
+        help="Accept-Encoding dos clientes ('identity' para medir sem compressão)",
+    )
+
+    commands.add_parser("list", help="Listar os cenários")
+
+    compare_parser = commands.add_parser("compare", help="Comparar dois resultados")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument(
+        "--threshold", type=float, default=20.0, help="Piora tolerada no p95 (%%)"
+    )
+
+    args = parser.parse_args()
+    if args.command == "run":
+        print(HEADER, file=sys.stderr)
+        run(args)
+    elif args.command == "list":
+        for item in SCENARIOS:
+            print(item.name)
+    elif args.command == "compare":
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
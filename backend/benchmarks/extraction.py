@@ -0,0 +1,172 @@
+# Benchmark da extração de texto dos anexos (extractors.py), em páginas por
+# segundo, com diferentes números de processos no pool.
+#
+#   python benchmarks/extraction.py
+#   python benchmarks/extraction.py --files 40 --pages 50 --workers 1,2,4,8
+#   python benchmarks/extraction.py --ocr modulo:funcao
+#
+# Gera PDFs sintéticos (texto com as palavras de benchmarks/seed.py, um
+# content stream comprimido por página) em uma pasta temporária e mede o tempo
+# para extrair todos, com o pool já iniciado. O resultado depende do extrator
+# disponível: o pypdf, se instalado, ou o extrator embutido.
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import seed as seed_module
+
+BACKEND_DIR = seed_module.BACKEND_DIR
+
+LINES_PER_PAGE = 50
+WORDS_PER_LINE = 12
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages, rng):
+    # PDF mínimo com uma fonte padrão e uma página de texto por content stream
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # páginas, preenchido ao final
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+        b"/Encoding /WinAnsiEncoding >>",
+    ]
+    kids = []
+    for _ in range(pages):
+        lines = [
+            " ".join(rng.choice(seed_module.WORDS) for _ in range(WORDS_PER_LINE))
+            for _ in range(LINES_PER_PAGE)
+        ]
+        content = "BT /F1 10 Tf 14 TL 50 800 Td\n" + "".join(
+            f"({_escape(line)}) Tj T*\n" for line in lines
+        )
+        stream = zlib.compress((content + "ET").encode("cp1252"))
+        objects.append(
+            b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream)
+            + stream
+            + b"\nendstream"
+        )
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids),
+        len(kids),
+    )
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    return bytes(output)
+
+
+def run(executor, paths, args):
+    # (segundos, páginas, caracteres) para extrair todos os arquivos
+    import extractors
+
+    started = time.perf_counter()
+    futures = [
+        executor.submit(
+            extractors.extract_file,
+            path,
+            extractors.PDF_MIME_TYPE,
+            args.max_pages,
+            args.max_chars,
+            args.ocr,
+            args.language,
+        )
+        for path in paths
+    ]
+    results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+
+    errors = [result["error"] for result in results if result["error"]]
+    if errors:
+        sys.exit(f"Erro na extração: {errors[0]}")
+    pages = sum(min(result["page_count"] or 0, args.max_pages) for result in results)
+    return elapsed, pages, sum(len(result["text"]) for result in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da extração de texto")
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=25, help="Páginas por arquivo")
+    parser.add_argument(
+        "--workers",
+        default="1,2,4",
+        help="Números de processos a comparar, separados por vírgula",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-pages", type=int, default=500)
+    parser.add_argument("--max-chars", type=int, default=500_000)
+    parser.add_argument("--ocr", help="Mecanismo de OCR (EXTRACTION_OCR_ENGINE)")
+    parser.add_argument("--language", default="por+eng")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    import extractors
+
+    rng = random.Random(args.seed)
+    directory = tempfile.mkdtemp(prefix="extraction-benchmark-")
+    try:
+        paths = []
+        size = 0
+        for index in range(args.files):
+            data = make_pdf(args.pages, rng)
+            path = os.path.join(directory, f"manual{index:04d}.pdf")
+            with open(path, "wb") as output:
+                output.write(data)
+            paths.append(path)
+            size += len(data)
+
+        extractor = (
+            f"pypdf {extractors.pypdf.__version__}"
+            if extractors.pypdf is not None
+            else "extrator embutido (pypdf não instalado)"
+        )
+        print(
+            f"{args.files} PDFs × {args.pages} páginas ({size / 1024 / 1024:.1f} MB); "
+            f"{extractor}"
+        )
+        print(f"{'processos':>9} {'s':>8} {'páginas/s':>10} {'MB/s':>8}")
+
+        context = multiprocessing.get_context("spawn")
+        for workers in [int(value) for value in args.workers.split(",")]:
+            with ProcessPoolExecutor(workers, mp_context=context) as executor:
+                # Processos iniciados (e módulos importados) antes da medição
+                list(executor.map(abs, range(workers)))
+                best = None
+                for _ in range(args.repeat):
+                    elapsed, pages, _ = run(executor, paths, args)
+                    best = elapsed if best is None else min(best, elapsed)
+            print(
+                f"{workers:>9} {best:>8.2f} {pages / best:>10.0f} "
+                f"{size / 1024 / 1024 / best:>8.1f}"
+            )
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# Benchmark do login: requisições por segundo para cada PASSWORD_HASH_METHOD.
+#
+#   python benchmarks/login.py
+#   python benchmarks/login.py --method scrypt:16384:8:1 --clients 16
+#
+# Cada configuração roda em um subprocesso com um banco SQLite temporário, com
+# vários clientes fazendo logins simultâneos pelo cliente de teste do Flask.
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+DEFAULT_METHODS = [
+    "pbkdf2:sha256:600000",
+    "pbkdf2:sha256:260000",
+    "scrypt:32768:8:1",
+    "scrypt:16384:8:1",
+]
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_single(method, clients, requests_per_client, workers):
+    # Executado no subprocesso: configura o app pelo ambiente antes de importar
+    directory = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(directory, "bench.db")
+    os.environ["PASSWORD_HASH_METHOD"] = method
+    os.environ["LOGIN_VERIFY_WORKERS"] = str(workers)
+    os.environ["JOB_WORKERS"] = "0"
+    sys.path.insert(0, BACKEND_DIR)
+
+    from app import app
+    from models import User, db
+
+    with app.app_context():
+        db.create_all()
+        user = User(username="bench", role="user")
+        user.set_password("senha-benchmark")
+        db.session.add(user)
+        db.session.commit()
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def client():
+        test_client = app.test_client()
+        for _ in range(requests_per_client):
+            started = time.perf_counter()
+            response = test_client.post(
+                "/api/auth/login",
+                json={"username": "bench", "password": "senha-benchmark"},
+            )
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = time.perf_counter() - started
+
+    shutil.rmtree(directory, ignore_errors=True)
+
+    latencies.sort()
+    return {
+        "method": method,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "seconds": round(total, 3),
+        "requests_per_second": round(len(latencies) / total, 2),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do login")
+    parser.add_argument(
+        "--method",
+        action="append",
+        help="método de hash (pode repetir); padrão: " + ", ".join(DEFAULT_METHODS),
+    )
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=10, help="por cliente")
+    parser.add_argument("--workers", type=int, default=4, help="LOGIN_VERIFY_WORKERS")
+    parser.add_argument("--json", action="store_true", help="saída em JSON")
+    parser.add_argument("--single", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        result = run_single(args.single, args.clients, args.requests, args.workers)
+        print(json.dumps(result))
+        return
+
+    results = []
+    for method in args.method or DEFAULT_METHODS:
+        output = subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--single",
+                method,
+                "--clients",
+                str(args.clients),
+                "--requests",
+                str(args.requests),
+                "--workers",
+                str(args.workers),
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'método':<24} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'erros':>6}")
+    for result in results:
+        print(
+            f"{result['method']:<24} {result['requests_per_second']:>8} "
+            f"{result['p50_ms']:>8} {result['p95_ms']:>8} {result['errors']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
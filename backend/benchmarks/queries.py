@@ -0,0 +1,143 @@
+# Verificação do número de comandos SQL por requisição nas rotas principais,
+# para que uma regressão para N+1 (um comando por problema, tag ou anexo)
+# falhe em vez de só aparecer como piora no benchmark.
+#
+#   python benchmarks/queries.py
+#   python benchmarks/queries.py --sizes 200,2000
+#
+# Gera uma base sintética (benchmarks/seed.py) em um banco temporário, mede
+# cada rota com query_counter.assert_max_queries e depois aumenta a base para
+# o tamanho seguinte e mede de novo. Falha (código de saída 1) se alguma rota
+# passar do limite de MAX_QUERIES ou executar mais comandos com a base maior.
+# O cache de respostas fica desligado para que toda requisição chegue ao banco.
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import urllib.parse
+
+import seed as seed_module
+
+BACKEND_DIR = seed_module.BACKEND_DIR
+
+# Comandos SQL por requisição, com o cache de respostas desligado
+MAX_QUERIES = {
+    "problems.list": 4,
+    "problems.list_tag": 4,
+    "problems.get": 4,
+    "problems.search": 5,
+    "problems.tags": 2,
+}
+
+
+def paths(app):
+    # Rota de cada verificação; o problema do detalhe tem tags e anexos
+    from models import Attachment, Problem, Tag, db
+
+    with app.app_context():
+        problem_id = (
+            db.session.query(Problem.id)
+            .join(Attachment)
+            .filter(Problem.tags != "")
+            .order_by(Problem.id.desc())
+            .limit(1)
+            .scalar()
+        )
+        tag = db.session.query(Tag.name).order_by(Tag.id).limit(1).scalar()
+    query = urllib.parse.quote(" ".join(seed_module.WORDS[:2]))
+    return {
+        "problems.list": "/api/problems/?limit=20&view=summary",
+        "problems.list_tag": "/api/problems/?limit=20&tag=" + urllib.parse.quote(tag),
+        "problems.get": f"/api/problems/{problem_id}",
+        "problems.search": f"/api/problems/search?q={query}",
+        "problems.tags": "/api/problems/tags",
+    }
+
+
+def measure(app, client):
+    # {rota: (comandos, erro ou None)}
+    from query_counter import query_counter
+
+    results = {}
+    for name, path in paths(app).items():
+        # Uma requisição antes, para não contar o que só roda uma vez por
+        # processo (índices em memória, metadados)
+        client.get(path)
+        try:
+            with query_counter.assert_max_queries(MAX_QUERIES[name]) as counter:
+                response = client.get(path)
+            error = None
+        except AssertionError as e:
+            error = str(e).split("\n", 1)[0]  # sem a lista de comandos
+        if response.status_code != 200:
+            error = f"HTTP {response.status_code}"
+        results[name] = (counter.count, error)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comandos SQL por requisição")
+    parser.add_argument(
+        "--sizes",
+        default="100,1000",
+        help="Números de problemas da base, separados por vírgula",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    sizes = sorted(int(value) for value in args.sizes.split(","))
+
+    directory = tempfile.mkdtemp(prefix="wiki-queries-")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(directory, "queries.db")
+    os.environ["JOB_WORKERS"] = "0"
+    os.environ["RESPONSE_CACHE_BACKEND"] = "null"
+    sys.path.insert(0, BACKEND_DIR)
+
+    from app import app, prepare_database
+
+    app.config["UPLOAD_FOLDER"] = os.path.join(directory, "uploads")
+
+    failures = []
+    previous = None
+    try:
+        with app.app_context():
+            prepare_database()
+        client = app.test_client()
+
+        total = 0
+        for size in sizes:
+            # A base cresce até o tamanho seguinte (outra semente, problemas
+            # novos com as mesmas tags e categorias)
+            seed_module.seed_database(
+                app, problems=size - total, seed=args.seed + total
+            )
+            total = size
+            client.post(
+                "/api/auth/login",
+                json={"username": "admin", "password": seed_module.PASSWORD},
+            )
+
+            results = measure(app, client)
+            print(f"{size} problemas")
+            for name, (count, error) in results.items():
+                print(f"  {name:<20} {count:>3} (máximo {MAX_QUERIES[name]})")
+                if error:
+                    failures.append(f"{name} com {size} problemas: {error}")
+                if previous is not None and count > previous[name][0]:
+                    failures.append(
+                        f"{name}: {previous[name][0]} comandos com {previous_size} "
+                        f"problemas e {count} com {size}"
+                    )
+            previous, previous_size = results, size
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if failures:
+        print("\nFalhas:")
+        for line in failures:
+            print("  " + line)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
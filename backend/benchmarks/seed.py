@@ -0,0 +1,217 @@
+# Base sintética para os benchmarks: usuários, tags, categorias, problemas e
+# anexos (PDFs e imagens), gerada pelos modelos a partir de uma semente fixa,
+# de modo que duas execuções com os mesmos parâmetros produzam os mesmos dados.
+#
+#   DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/seed.py --problems 5000
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PASSWORD = "benchmark"
+
+WORDS = """
+    tela bateria fonte placa capacitor resistor diodo transistor curto solda
+    conector cabo tensão corrente aquecimento liga desliga reinicia travando
+    lento ruído chiado imagem som listras piscando apagada inchado oxidação
+    umidade firmware atualização backlight inverter fusível regulador bobina
+    trilha flat touch câmera microfone alto-falante carregador usb hdmi wifi
+    bluetooth memória processador cooler pasta térmica teclado dobradiça
+    carcaça botão sensor display led
+""".split()
+
+CATEGORIES = [
+    "Televisores",
+    "Celulares",
+    "Notebooks",
+    "Fontes",
+    "Placas-mãe",
+    "Impressoras",
+    "Monitores",
+    "Áudio",
+    "Videogames",
+    "Tablets",
+    "Micro-ondas",
+    "Ar-condicionado",
+    "Geladeiras",
+    "Máquinas de lavar",
+    "Drones",
+]
+
+BASE_DATE = datetime(2024, 1, 1)
+
+
+def attachment_name(index, images):
+    # Os primeiros "images" anexos são imagens; os demais, PDFs
+    return f"foto{index:04d}.png" if index < images else f"manual{index:04d}.pdf"
+
+
+def attachment_content(index, images, seed):
+    rng = random.Random(f"{seed}-file-{index}")
+    if index < images:
+        from PIL import Image, ImageDraw
+
+        image = Image.new("RGB", (1200, 900), tuple(rng.randrange(256) for _ in "rgb"))
+        draw = ImageDraw.Draw(image)
+        for _ in range(20):
+            x, y = rng.randrange(1200), rng.randrange(900)
+            draw.rectangle(
+                [x, y, x + rng.randrange(50, 400), y + rng.randrange(50, 300)],
+                fill=tuple(rng.randrange(256) for _ in "rgb"),
+            )
+        output = io.BytesIO()
+        image.save(output, "PNG")
+        return output.getvalue()
+
+    size = rng.randrange(20, 200) * 1024
+    return b"%PDF-1.4\n" + rng.getrandbits(size * 8).to_bytes(size, "little")
+
+
+def generate_records(problems, users, tags, categories, attachments, images, seed):
+    rng = random.Random(seed)
+    tag_names = [f"{rng.choice(WORDS)}-{index}" for index in range(tags)]
+    # Poucas tags muito usadas e muitas pouco usadas
+    tag_weights = [1 / (index + 1) for index in range(tags)]
+    category_names = (CATEGORIES * (categories // len(CATEGORIES) + 1))[:categories]
+    category_names = [
+        name if index < len(CATEGORIES) else f"{name} {index}"
+        for index, name in enumerate(category_names)
+    ]
+    authors = ["admin"] + [f"tecnico{index}" for index in range(1, users // 2 + 1)]
+    hashes = {}
+
+    for index in range(problems):
+        files = []
+        if attachments:
+            for _ in range(rng.choice([0, 0, 1, 1, 2, 3])):
+                file_index = rng.randrange(attachments)
+                if file_index not in hashes:
+                    hashes[file_index] = hashlib.sha256(
+                        attachment_content(file_index, images, seed)
+                    ).hexdigest()
+                files.append(
+                    {
+                        "name": attachment_name(file_index, images),
+                        "sha256": hashes[file_index],
+                        "path": f"seed/{file_index}",
+                    }
+                )
+
+        yield {
+            "title": " ".join(rng.choices(WORDS, k=rng.randrange(3, 8))).capitalize(),
+            "description": " ".join(rng.choices(WORDS, k=rng.randrange(30, 150))),
+            "category": rng.choice(category_names),
+            "tags": list(
+                dict.fromkeys(
+                    rng.choices(tag_names, weights=tag_weights, k=rng.randrange(1, 5))
+                )
+            ),
+            "youtubeLink": None,
+            "author": rng.choice(authors),
+            "created_at": (
+                BASE_DATE + timedelta(minutes=rng.randrange(2 * 365 * 24 * 60))
+            ).isoformat(),
+            "files": files,
+        }
+
+
+def seed_database(
+    app,
+    problems=1000,
+    users=20,
+    tags=100,
+    categories=15,
+    attachments=100,
+    images=30,
+    seed=42,
+    progress=None,
+):
+    import bulk
+    from jobs import job_queue
+    from models import User, db
+
+    images = min(images, attachments)
+    with app.app_context():
+        # Um único hash de senha reaproveitado por todos os usuários
+        admin = User.query.filter_by(username="admin").first()
+        if admin is None:
+            admin = User(username="admin", role="admin")
+            admin.set_password(PASSWORD)
+            db.session.add(admin)
+        password_hash = admin.password_hash
+
+        existing = {username for (username,) in db.session.query(User.username)}
+        for index in range(1, users + 1):
+            if index <= users // 2:
+                username, role = f"tecnico{index}", "tecnico"
+            else:
+                username, role = f"usuario{index}", "user"
+            if username not in existing:
+                db.session.add(
+                    User(username=username, role=role, password_hash=password_hash)
+                )
+        db.session.commit()
+
+        def open_file(path):
+            index = int(path.rsplit("/", 1)[1])
+            return io.BytesIO(attachment_content(index, images, seed))
+
+        lines = (
+            json.dumps(record)
+            for record in generate_records(
+                problems, users, tags, categories, attachments, images, seed
+            )
+        )
+        result = bulk.import_records(lines, open_file=open_file, progress=progress)
+
+    # Miniaturas das imagens (tarefas criadas pelo armazenamento)
+    while job_queue.run_pending(limit=100):
+        pass
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gerar base sintética")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    from app import app, prepare_database
+
+    with app.app_context():
+        prepare_database()
+
+    result = seed_database(app, **dataset_options(args))
+    print(f"{result.imported} problemas gerados em {result.elapsed:.1f}s")
+
+
+def add_arguments(parser):
+    parser.add_argument("--problems", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--tags", type=int, default=100)
+    parser.add_argument("--categories", type=int, default=15)
+    parser.add_argument("--attachments", type=int, default=100)
+    parser.add_argument("--images", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def dataset_options(args):
+    return {
+        "problems": args.problems,
+        "users": args.users,
+        "tags": args.tags,
+        "categories": args.categories,
+        "attachments": args.attachments,
+        "images": args.images,
+        "seed": args.seed,
+    }
+
+
+if __name__ == "__main__":
+    main()
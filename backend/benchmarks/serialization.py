@@ -0,0 +1,130 @@
+# Benchmark da serialização e da compressão da listagem completa de problemas.
+#
+#   python benchmarks/serialization.py
+#   python benchmarks/serialization.py --problems 20000 --repeat 5
+#
+# Monta, a partir da base sintética de benchmarks/seed.py (sem banco), a lista
+# no formato de Problem.to_dict e mede o tempo e o tamanho do JSON com o
+# provedor padrão do Flask (antes) e com o FastJSONProvider (depois), e de
+# cada compressão aplicada sobre o JSON resultante.
+import argparse
+import sys
+import time
+
+import seed as seed_module
+
+BACKEND_DIR = seed_module.BACKEND_DIR
+
+
+def build_payload(problems, seed):
+    items = []
+    for index, record in enumerate(
+        seed_module.generate_records(problems, 20, 100, 15, 100, 30, seed), start=1
+    ):
+        items.append(
+            {
+                "id": index,
+                "title": record["title"],
+                "description": record["description"],
+                "category": record["category"],
+                "tags": record["tags"],
+                "files": [
+                    f"uploads/{item['sha256']}_{item['name']}"
+                    for item in record["files"]
+                ],
+                "attachments": [
+                    {
+                        "file": f"uploads/{item['sha256']}_{item['name']}",
+                        "name": item["name"],
+                        "size": 123456,
+                        "mime_type": "application/pdf",
+                        "sha256": item["sha256"],
+                        "width": None,
+                        "height": None,
+                        "page_count": 12,
+                    }
+                    for item in record["files"]
+                ],
+                "youtubeLink": None,
+                "author": record["author"],
+                "author_id": 1,
+                "created_at": record["created_at"],
+            }
+        )
+    return items
+
+
+def measure(func, repeat):
+    # Melhor tempo entre as repetições (menos sujeito a ruído)
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de serialização")
+    parser.add_argument("--problems", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    from flask import Flask
+    from flask.json.provider import DefaultJSONProvider
+
+    import compression as compression_module
+    from serialization import FastJSONProvider, iter_array
+
+    app = Flask(__name__)
+    items = build_payload(args.problems, args.seed)
+    default = DefaultJSONProvider(app)
+    fast = FastJSONProvider(app)
+
+    rows = []
+    with app.app_context():
+        app.json = fast
+        serializers = [
+            ("json padrão do Flask", lambda: default.response(items).get_data()),
+            (
+                "FastJSONProvider"
+                + (" (orjson)" if FastJSONProvider.available else " (json)"),
+                lambda: fast.response(items).get_data(),
+            ),
+            ("streaming (iter_array)", lambda: b"".join(iter_array(items))),
+        ]
+        outputs = {}
+        for name, func in serializers:
+            data, elapsed = measure(func, args.repeat)
+            outputs[name] = data
+            rows.append((name, len(data), elapsed))
+
+        data = outputs[serializers[1][0]]
+        compressor = compression_module.Compression()
+        encodings = [("gzip", 1), ("gzip", 6), ("gzip", 9)]
+        if compression_module.brotli is not None:
+            encodings += [("br", 5), ("br", 11)]
+        for encoding, level in encodings:
+            compressor.gzip_level = compressor.brotli_quality = level
+            compressed, elapsed = measure(
+                lambda: compressor.compress(data, encoding), args.repeat
+            )
+            rows.append((f"  + {encoding} nível {level}", len(compressed), elapsed))
+
+    baseline = rows[0][1]
+    print(f"{args.problems} problemas")
+    print(f"{'serialização':<32} {'KB':>10} {'% do padrão':>12} {'ms':>9}")
+    for name, size, elapsed in rows:
+        print(
+            f"{name:<32} {size / 1024:>10.1f} {size / baseline * 100:>11.1f}% "
+            f"{elapsed * 1000:>9.1f}"
+        )
+    if compression_module.brotli is None:
+        print("(brotli não instalado: pip install brotli)")
+
+
+if __name__ == "__main__":
+    main()
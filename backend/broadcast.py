@@ -0,0 +1,329 @@
+# Eventos de problemas em tempo real (Server-Sent Events em
+# GET /api/problems/events), para que as abas abertas não precisem consultar
+# a lista periodicamente.
+#
+# Cada flush que cria, altera ou exclui problemas grava as linhas de
+# problem_events na mesma transação (um rollback, inclusive de um savepoint,
+# desfaz o evento). Em cada processo, uma única thread lê os eventos novos do
+# banco (a cada SSE_POLL_INTERVAL segundos, ou logo após um commit no próprio
+# processo), monta a mensagem de cada evento uma vez e a guarda em um buffer;
+# as conexões abertas só esperam em uma Condition e copiam as mensagens do
+# buffer, sem consultar o banco.
+#
+# Só funciona com SQLite: a leitura incremental (ID maior que o último lido) e
+# a retomada supõem IDs sem lacunas e visíveis na ordem em que foram criados,
+# o que só o AUTOINCREMENT com um único escritor por vez garante. Em outros
+# bancos, transações simultâneas confirmam IDs fora de ordem e eventos seriam
+# perdidos; por isso init_app desliga os eventos (SSE_ENABLED) fora do SQLite
+# e as abas passam a sincronizar a lista periodicamente.
+#
+# O ID de cada mensagem é o ID do evento. Um cliente que reconecta com
+# Last-Event-ID recebe o que perdeu a partir do buffer ou, se ele já não
+# cobrir, da tabela (eventos guardados por SSE_EVENT_TTL); se nem a tabela
+# cobrir, recebe um evento "reset" e deve recarregar a lista (o feed de
+# changes.py resolve isso com poucos bytes).
+#
+# Com o worker gevent do gunicorn (o padrão de gunicorn.conf.py) uma conexão
+# ociosa custa só um greenlet. Com threads reais (GUNICORN_WORKER_CLASS=gthread,
+# servidor de desenvolvimento) cada conexão ocupa uma thread, por isso
+# SSE_MAX_CLIENTS tem padrão baixo nesse caso; as abas recusadas (503) voltam a
+# tentar depois de um intervalo e sincronizam a lista enquanto isso.
+import bisect
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from concurrency import cooperative
+from events import models_committed
+from models import Attachment, Problem, ProblemEvent, User, db
+from serialization import dumps_bytes
+
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+
+# Limite padrão de conexões por processo, com threads reais ou com gevent
+THREADED_MAX_CLIENTS = 2
+COOPERATIVE_MAX_CLIENTS = 1000
+
+POLL_BATCH_SIZE = 500
+
+
+def _enabled():
+    return not has_app_context() or current_app.config.get("SSE_ENABLED", True)
+
+
+def format_message(event_id, name, data):
+    # data já serializado (bytes)
+    return f"id: {event_id}\nevent: {name}\ndata: ".encode() + data + b"\n\n"
+
+
+class Broadcaster:
+    def __init__(self):
+        self.app = None
+        self._condition = threading.Condition()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._pid = None
+        self._clients = 0
+        # Mensagens já montadas, em ordem de ID (_ids em paralelo, para busca
+        # binária); _last_id é o último evento lido do banco
+        self._ids = []
+        self._messages = []
+        self._last_id = None
+
+    def init_app(self, app):
+        app.config.setdefault("SSE_ENABLED", True)
+        app.config.setdefault("SSE_POLL_INTERVAL", 1.0)
+        app.config.setdefault("SSE_HEARTBEAT", 15)
+        app.config.setdefault("SSE_MAX_DURATION", 300)
+        app.config.setdefault("SSE_RETRY", 3000)
+        app.config.setdefault("SSE_BUFFER_SIZE", 1000)
+        app.config.setdefault("SSE_EVENT_TTL", timedelta(days=1))
+        app.config.setdefault("SSE_MAX_CLIENTS", None)
+        backend = make_url(app.config["SQLALCHEMY_DATABASE_URI"]).get_backend_name()
+        if app.config["SSE_ENABLED"] and backend != "sqlite":
+            app.logger.warning(
+                "Eventos em tempo real desativados: exigem SQLite (banco: %s)",
+                backend,
+            )
+            app.config["SSE_ENABLED"] = False
+        app.extensions["broadcaster"] = self
+        self.app = app
+        models_committed.connect(self._on_models_committed, sender=app, weak=False)
+
+    def _on_models_committed(self, sender, changes):
+        if self._clients and any(change.table == "problems" for change in changes):
+            self._wake.set()
+
+    # --- Conexões -----------------------------------------------------------
+
+    def max_clients(self):
+        limit = self.app.config["SSE_MAX_CLIENTS"]
+        if limit is None:
+            limit = COOPERATIVE_MAX_CLIENTS if cooperative() else THREADED_MAX_CLIENTS
+        return limit
+
+    def connect(self):
+        # Reserva uma conexão; False quando o processo já está no limite
+        self._ensure_started()
+        with self._condition:
+            if self._clients >= self.max_clients():
+                return False
+            if not self._clients:
+                # Sem ninguém conectado o buffer parou de ser atualizado
+                self._reset_buffer()
+            self._clients += 1
+        return True
+
+    def disconnect(self):
+        with self._condition:
+            self._clients -= 1
+
+    def _reset_buffer(self):
+        self._ids, self._messages, self._last_id = [], [], None
+
+    # --- Leitura dos eventos ------------------------------------------------
+
+    def _ensure_started(self):
+        # Uma thread por processo (depois do fork dos servidores WSGI)
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            with self._condition:
+                self._clients = 0
+                self._reset_buffer()
+            thread = threading.Thread(
+                target=self.run_forever, name="broadcast", daemon=True
+            )
+            thread.start()
+
+    def run_forever(self):
+        while True:
+            self._wake.wait(self.app.config["SSE_POLL_INTERVAL"])
+            self._wake.clear()
+            if not self._clients:
+                continue
+            try:
+                self.poll()
+            except Exception:
+                self.app.logger.exception("Erro ao ler os eventos de problemas")
+
+    def poll(self):
+        # Lê os eventos novos e acorda as conexões que estão esperando
+        with self._poll_lock, self.app.app_context():
+            try:
+                if self._last_id is None:
+                    # Início: só os eventos a partir de agora (os anteriores
+                    # vêm da tabela, para quem reconecta)
+                    last_id = db.session.execute(
+                        select(func.max(ProblemEvent.id))
+                    ).scalar()
+                    with self._condition:
+                        self._last_id = last_id or 0
+                        self._condition.notify_all()
+                    return
+                rows = self._read_events(self._last_id, POLL_BATCH_SIZE)
+                messages = self._render(rows)
+            finally:
+                db.session.remove()
+
+        if not rows:
+            return
+        size = self.app.config["SSE_BUFFER_SIZE"]
+        with self._condition:
+            self._ids.extend(event_id for event_id, _ in messages)
+            self._messages.extend(message for _, message in messages)
+            # Cortar só quando passar do dobro (cópia amortizada)
+            if len(self._ids) > 2 * size:
+                del self._ids[:-size], self._messages[:-size]
+            self._last_id = rows[-1].id
+            self._condition.notify_all()
+        if len(rows) == POLL_BATCH_SIZE:
+            self._wake.set()
+
+    @staticmethod
+    def _read_events(after_id, limit, until_id=None):
+        query = select(
+            ProblemEvent.id, ProblemEvent.problem_id, ProblemEvent.action
+        ).where(ProblemEvent.id > after_id)
+        if until_id is not None:
+            query = query.where(ProblemEvent.id <= until_id)
+        return db.session.execute(query.order_by(ProblemEvent.id).limit(limit)).all()
+
+    @staticmethod
+    def _render(rows):
+        # [(id, mensagem)]; criações e alterações levam o resumo atual do
+        # problema (o mesmo da listagem resumida)
+        problem_ids = {row.problem_id for row in rows if row.action != DELETED}
+        summaries = {}
+        if problem_ids:
+            summaries = {
+                row.id: Problem.summary_to_dict(row)
+                for row in Problem.query.join(User)
+                .with_entities(*Problem.summary_columns())
+                .filter(Problem.id.in_(problem_ids))
+            }
+            attachments = Attachment.for_problems(list(problem_ids))
+            for problem_id, summary in summaries.items():
+                summary["attachments"] = attachments.get(problem_id, [])
+
+        messages = []
+        for row in rows:
+            data = {"id": row.problem_id, "action": row.action}
+            if row.action != DELETED:
+                data["problem"] = summaries.get(row.problem_id)
+            messages.append(
+                (row.id, format_message(row.id, "problem", dumps_bytes(data)))
+            )
+        return messages
+
+    def current_id(self):
+        if self._last_id is None:
+            self.poll()
+        return self._last_id
+
+    def messages_after(self, position):
+        # [(id, mensagem)] depois do ID informado, até o último lido; None se
+        # parte dos eventos já foi descartada (o cliente deve recarregar)
+        with self._condition:
+            last_id = self._last_id
+            if last_id is None or position >= last_id:
+                return []
+            if self._ids and self._ids[0] <= position + 1:
+                start = bisect.bisect_right(self._ids, position)
+                return list(zip(self._ids[start:], self._messages[start:]))
+
+        # Fora do buffer (reconexão depois de muito tempo ou cliente lento)
+        with self.app.app_context():
+            try:
+                rows = self._read_events(
+                    position, self.app.config["SSE_BUFFER_SIZE"], until_id=last_id
+                )
+                # Os IDs não têm lacunas (AUTOINCREMENT do SQLite): faltar o
+                # seguinte é sinal de que a limpeza já passou por ele
+                if not rows or rows[0].id != position + 1:
+                    return None
+                return self._render(rows)
+            finally:
+                db.session.remove()
+
+    # --- Stream de uma conexão ----------------------------------------------
+
+    def stream(self, last_event_id=None):
+        config = self.app.config
+        deadline = time.monotonic() + config["SSE_MAX_DURATION"]
+        yield f"retry: {int(config['SSE_RETRY'])}\n\n".encode()
+
+        position = self.current_id()
+        if last_event_id is not None:
+            if last_event_id > position:
+                yield format_message(position, "reset", b"{}")
+            else:
+                position = last_event_id
+
+        # Ao fim de SSE_MAX_DURATION a conexão é encerrada e o navegador
+        # reconecta (com Last-Event-ID), liberando a thread periodicamente
+        while time.monotonic() < deadline:
+            messages = self.messages_after(position)
+            if messages is None:
+                position = self.current_id()
+                yield format_message(position, "reset", b"{}")
+            elif messages:
+                position = messages[-1][0]
+                yield b"".join(message for _, message in messages)
+            else:
+                with self._condition:
+                    arrived = self._condition.wait_for(
+                        lambda: (self._last_id or 0) > position,
+                        timeout=min(
+                            config["SSE_HEARTBEAT"], deadline - time.monotonic()
+                        ),
+                    )
+                if not arrived:
+                    # Comentário SSE: mantém a conexão (e proxies) ativos
+                    yield b": ping\n\n"
+
+
+broadcaster = Broadcaster()
+
+
+# --- Registro dos eventos a cada flush ----------------------------------------
+
+
+@event.listens_for(Session, "after_flush")
+def _record_events(session, flush_context):
+    if not _enabled():
+        return
+    rows = [
+        {"problem_id": problem.id, "action": action}
+        for action, instances in (
+            (CREATED, session.new),
+            (UPDATED, session.dirty),
+            (DELETED, session.deleted),
+        )
+        for problem in instances
+        if isinstance(problem, Problem)
+        and (action != UPDATED or session.is_modified(problem))
+    ]
+    if not rows:
+        return
+
+    table = ProblemEvent.__table__
+    now = datetime.utcnow()
+    connection = session.connection()
+    connection.execute(table.insert(), [dict(row, created_at=now) for row in rows])
+    # Eventos que já passaram do prazo de retomada
+    if has_app_context():
+        limit = now - current_app.config["SSE_EVENT_TTL"]
+        connection.execute(table.delete().where(table.c.created_at < limit))
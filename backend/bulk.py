@@ -0,0 +1,388 @@
+# Exportação e importação em massa da base de problemas.
+#
+# Formato: NDJSON, um problema por linha:
+#   {"id": 1, "title": "...", "description": "...", "category": "...",
+#    "tags": ["a", "b"], "youtubeLink": null, "author": "admin",
+#    "created_at": "2024-01-01T12:00:00",
+#    "files": [{"name": "manual.pdf", "sha256": "...", "path": "files/..."}]}
+#
+# A exportação percorre a tabela em lotes por chave (id), com memória
+# constante, e pode gerar um tar em streaming com o NDJSON (problems.ndjson)
+# seguido dos arquivos (files/<nome no armazenamento>). A importação aceita o
+# mesmo formato (só title, description e category são obrigatórios), grava em
+# transações grandes e resolve autores e tags com uma consulta por lote.
+import json
+import os
+import tarfile
+import tempfile
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select
+from werkzeug.utils import secure_filename
+
+import storage
+from models import Attachment, Blob, Problem, Tag, User, db, parse_tags
+
+EXPORT_BATCH_SIZE = 500
+IMPORT_BATCH_SIZE = 1000
+NDJSON_MEMBER = "problems.ndjson"
+FILES_PREFIX = "files/"
+
+_TAR_BLOCK = 512
+
+
+# --- Exportação -------------------------------------------------------------
+
+
+def _problem_batches(batch_size):
+    # Lotes de linhas de problems (com o nome do autor) em ordem de id
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(
+                Problem.id,
+                Problem.title,
+                Problem.description,
+                Problem.category,
+                Problem.tags,
+                Problem.youtubeLink,
+                Problem.created_at,
+                User.username.label("author"),
+            )
+            .join(User, User.id == Problem.author_id)
+            .where(Problem.id > last_id)
+            .order_by(Problem.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def export_records(batch_size=EXPORT_BATCH_SIZE):
+    for rows in _problem_batches(batch_size):
+        # Anexos do lote inteiro em uma consulta
+        files = {}
+        for attachment in db.session.execute(
+            select(
+                Attachment.problem_id,
+                Attachment.original_name,
+                Attachment.sha256,
+                Attachment.storage_name,
+            )
+            .where(Attachment.problem_id.in_([row.id for row in rows]))
+            .order_by(Attachment.problem_id, Attachment.position)
+        ):
+            files.setdefault(attachment.problem_id, []).append(
+                {
+                    "name": attachment.original_name,
+                    "sha256": attachment.sha256,
+                    "path": FILES_PREFIX + attachment.storage_name,
+                }
+            )
+
+        for row in rows:
+            yield {
+                "id": row.id,
+                "title": row.title,
+                "description": row.description,
+                "category": row.category,
+                "tags": parse_tags(row.tags),
+                "youtubeLink": row.youtubeLink,
+                "author": row.author,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+                "files": files.get(row.id, []),
+            }
+
+
+def iter_ndjson(batch_size=EXPORT_BATCH_SIZE):
+    for record in export_records(batch_size):
+        yield (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _export_files(batch_size):
+    # (nome no tar, caminho no disco) de todos os arquivos: blobs em uso e os
+    # arquivos antigos (uuid_nome) referenciados pelos problemas
+    last_id = 0
+    while True:
+        blobs = db.session.execute(
+            select(Blob.id, Blob.sha256, Blob.extension)
+            .where(Blob.id > last_id, Blob.ref_count > 0)
+            .order_by(Blob.id)
+            .limit(batch_size)
+        ).all()
+        if not blobs:
+            break
+        for blob in blobs:
+            name = f"{blob.sha256}.{blob.extension}"
+            yield FILES_PREFIX + name, storage.file_path(name)
+        last_id = blobs[-1].id
+
+    last_id = 0
+    while True:
+        legacy = db.session.execute(
+            select(Attachment.id, Attachment.storage_name)
+            .where(Attachment.id > last_id, Attachment.sha256.is_(None))
+            .order_by(Attachment.id)
+            .limit(batch_size)
+        ).all()
+        if not legacy:
+            break
+        for attachment in legacy:
+            name = attachment.storage_name
+            yield FILES_PREFIX + name, storage.file_path(name)
+        last_id = legacy[-1].id
+
+
+def _tar_member(name, size, source, mtime=None):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mode = 0o644
+    info.mtime = int(mtime if mtime is not None else time.time())
+    yield info.tobuf(format=tarfile.PAX_FORMAT)
+
+    remaining = size
+    while remaining > 0:
+        chunk = source.read(min(storage.CHUNK_SIZE, remaining))
+        if not chunk:
+            raise IOError(f"Arquivo encurtado durante a exportação: {name}")
+        remaining -= len(chunk)
+        yield chunk
+
+    padding = size % _TAR_BLOCK
+    if padding:
+        yield b"\0" * (_TAR_BLOCK - padding)
+
+
+def iter_tar(batch_size=EXPORT_BATCH_SIZE):
+    # O cabeçalho do tar exige o tamanho do NDJSON: ele é gerado antes em um
+    # arquivo temporário (em memória até 8MB), e os arquivos vêm em seguida
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+        for line in iter_ndjson(batch_size):
+            spool.write(line)
+        size = spool.tell()
+        spool.seek(0)
+        yield from _tar_member(NDJSON_MEMBER, size, spool)
+
+    for name, path in _export_files(batch_size):
+        try:
+            source = open(path, "rb")
+        except FileNotFoundError:
+            current_app.logger.warning(f"Arquivo ausente na exportação: {path}")
+            continue
+        with source:
+            stat = os.fstat(source.fileno())
+            yield from _tar_member(name, stat.st_size, source, stat.st_mtime)
+
+    # Fim do arquivo: dois blocos vazios
+    yield b"\0" * (_TAR_BLOCK * 2)
+
+
+# --- Importação -------------------------------------------------------------
+
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.skipped = []  # (linha, motivo)
+        self.missing_files = 0
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        return self.imported / self.elapsed if self.elapsed else 0.0
+
+
+def read_ndjson(lines):
+    # (número da linha, registro ou mensagem de erro)
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, f"JSON inválido: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield number, "Registro não é um objeto"
+            continue
+        yield number, record
+
+
+def _validate(record):
+    for field in ["title", "description", "category"]:
+        if not isinstance(record.get(field), str) or not record[field].strip():
+            return f"Campo obrigatório ausente: {field}"
+
+    for field in ["author", "youtubeLink"]:
+        if record.get(field) is not None and not isinstance(record[field], str):
+            return f"Campo inválido: {field}"
+
+    # Tags: lista ou texto separado por vírgulas (números viram texto)
+    tags = record.get("tags")
+    scalar = (str, int, float)
+    if tags is not None and not (
+        isinstance(tags, scalar)
+        or (isinstance(tags, list) and all(isinstance(tag, scalar) for tag in tags))
+    ):
+        return "Campo inválido: tags"
+
+    files = record.get("files")
+    if files is not None:
+        if not isinstance(files, list):
+            return "Campo inválido: files"
+        for item in files:
+            if isinstance(item, str):
+                continue
+            if not isinstance(item, dict) or any(
+                item.get(key) is not None and not isinstance(item[key], str)
+                for key in ["name", "path", "sha256"]
+            ):
+                return f"Arquivo inválido: {json.dumps(item)[:100]}"
+
+    created_at = record.get("created_at")
+    if created_at is not None:
+        try:
+            record["created_at"] = datetime.fromisoformat(created_at)
+        except (TypeError, ValueError):
+            return f"Data inválida: {created_at}"
+
+    tags = tags or []
+    if isinstance(tags, list):
+        tags = ",".join(str(tag) for tag in tags)
+    record["tags"] = parse_tags(str(tags))
+    return None
+
+
+def _import_files(record, open_file, result):
+    references = []
+    for item in record.get("files") or []:
+        if isinstance(item, str):
+            item = {"name": os.path.basename(item), "path": item}
+        name = secure_filename(
+            item.get("name") or os.path.basename(item.get("path") or "")
+        )
+        if not name:
+            continue
+
+        # Conteúdo já armazenado (reimportação na mesma instância)
+        sha256 = item.get("sha256")
+        reference = storage.add_reference(sha256, name) if sha256 else None
+
+        if reference is None and open_file is not None and item.get("path"):
+            source = open_file(item["path"])
+            if source is not None:
+                with source:
+                    reference = storage.store(source, name)
+
+        if reference is None:
+            result.missing_files += 1
+            continue
+        references.append(reference)
+    return references
+
+
+def _import_batch(batch, default_author_id, open_file, result):
+    # Autores e tags do lote inteiro com uma consulta cada
+    usernames = {record.get("author") for _, record in batch} - {None}
+    authors = dict(
+        db.session.query(User.username, User.id)
+        .filter(User.username.in_(usernames))
+        .all()
+    )
+    tags = {
+        tag.name: tag
+        for tag in Tag.get_or_create_all(
+            list({name for _, record in batch for name in record["tags"]})
+        )
+    }
+
+    for _, record in batch:
+        problem = Problem(
+            title=record["title"],
+            description=record["description"],
+            category=record["category"],
+            tags=",".join(record["tags"]),
+            youtubeLink=record.get("youtubeLink") or None,
+            author_id=authors.get(record.get("author"), default_author_id),
+        )
+        if record.get("created_at"):
+            problem.created_at = record["created_at"]
+        problem.tag_items = [tags[name] for name in record["tags"]]
+        # Na sessão antes dos arquivos (store_file consulta com a sessão)
+        db.session.add(problem)
+        storage.attach(problem, _import_files(record, open_file, result))
+
+    db.session.commit()
+    result.imported += len(batch)
+
+
+def import_records(
+    lines,
+    open_file=None,
+    batch_size=IMPORT_BATCH_SIZE,
+    default_author="admin",
+    progress=None,
+):
+    # lines: linhas NDJSON; open_file(path) retorna o arquivo de "path"
+    # (ex.: "files/<nome>") ou None; autores desconhecidos viram default_author
+    default_author_id = (
+        db.session.query(User.id).filter_by(username=default_author).scalar()
+    )
+    if default_author_id is None:
+        raise ValueError(f"Autor padrão não encontrado: {default_author}")
+
+    result = ImportResult()
+    batch = []
+    for number, record in read_ndjson(lines):
+        error = record if isinstance(record, str) else _validate(record)
+        if error:
+            result.skipped.append((number, error))
+            continue
+
+        batch.append((number, record))
+        if len(batch) >= batch_size:
+            _import_batch(batch, default_author_id, open_file, result)
+            batch = []
+            if progress:
+                progress(result)
+
+    if batch:
+        _import_batch(batch, default_author_id, open_file, result)
+        if progress:
+            progress(result)
+    return result
+
+
+def directory_opener(root):
+    # Arquivos exportados extraídos em uma pasta (root/files/...)
+    def open_file(path):
+        full_path = os.path.join(root, *path.split("/"))
+        if not os.path.realpath(full_path).startswith(os.path.realpath(root)):
+            return None
+        try:
+            return open(full_path, "rb")
+        except FileNotFoundError:
+            return None
+
+    return open_file
+
+
+def tar_opener(archive):
+    def open_file(path):
+        try:
+            return archive.extractfile(path)
+        except KeyError:
+            return None
+
+    return open_file
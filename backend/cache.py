@@ -0,0 +1,165 @@
+# Backends de cache chave/valor usados pela aplicação.
+#   - MemoryCache: LRU com TTL dentro do processo
+#   - SQLiteCache: arquivo SQLite local compartilhado entre os workers da
+#     mesma máquina (útil com vários processos do servidor WSGI)
+#   - NullCache: desativa o cache
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class NullCache:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryCache:
+    def __init__(self, max_entries=1024, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache:
+    # Limpeza de entradas vencidas a cada N gravações
+    PRUNE_INTERVAL = 100
+
+    def __init__(self, path, max_entries=10000, default_ttl=300):
+        self.path = path
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._local = threading.local()
+        self._writes = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+        )
+
+    def _connection(self):
+        # Uma conexão por thread e por processo (não reaproveitar após fork)
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        row = (
+            self._connection()
+            .execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,))
+            .fetchone()
+        )
+        if row is None:
+            return None
+
+        value, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            self.delete(key)
+            return None
+        return pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires_at),
+        )
+
+        self._writes += 1
+        if self._writes % self.PRUNE_INTERVAL == 0:
+            self.prune()
+
+    def prune(self):
+        connection = self._connection()
+        connection.execute(
+            "DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?",
+            (time.time(),),
+        )
+        # Acima do limite, saem as que vencem primeiro; as sem validade (como a
+        # geração do cache de respostas) nunca são descartadas aqui
+        connection.execute(
+            "DELETE FROM cache WHERE expires_at IS NOT NULL AND key NOT IN ("
+            "SELECT key FROM cache WHERE expires_at IS NOT NULL "
+            "ORDER BY expires_at DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache")
+
+
+def create_cache(app, prefix="CACHE"):
+    # Monta o backend a partir das chaves <prefix>_BACKEND, <prefix>_TTL etc.
+    config = app.config
+    backend = config.get(f"{prefix}_BACKEND", "memory")
+    ttl = config.get(f"{prefix}_TTL", 300)
+    max_entries = config.get(f"{prefix}_MAX_ENTRIES", 1024)
+
+    if backend == "memory":
+        return MemoryCache(max_entries=max_entries, default_ttl=ttl)
+    if backend == "sqlite":
+        # Um arquivo por cache: clear() e o limite de entradas de um não
+        # atingem os outros
+        path = config.get(f"{prefix}_SQLITE_PATH") or os.path.join(
+            app.instance_path, f"{prefix.lower()}.sqlite3"
+        )
+        return SQLiteCache(path, max_entries=max_entries, default_ttl=ttl)
+    if backend == "null":
+        return NullCache()
+    raise ValueError(f"Backend de cache desconhecido: {backend}")
@@ -0,0 +1,145 @@
+# Feed de alterações dos problemas (GET /api/problems/changes?since=<token>).
+#
+# Cada problema tem updated_at, renovado a cada flush que altera o problema,
+# as tags ou os anexos, e cada exclusão deixa uma linha em problem_tombstones.
+# O feed percorre as duas por chave, (updated_at, id) e (deleted_at,
+# problem_id), usando os índices, a partir da posição guardada no token. O
+# token é opaco para o cliente (mesma codificação dos cursores de
+# pagination.py).
+#
+# updated_at é definido no flush, não no commit: uma transação que demora a
+# confirmar pode gravar um horário anterior ao de alterações já lidas. Por
+# isso, na última página o token nunca avança além de "agora -
+# CHANGES_SAFETY_WINDOW"; o que mudou nessa janela é enviado de novo na
+# próxima sincronização (o cliente substitui pelo ID).
+#
+# Tokens mais antigos que CHANGES_TOMBSTONE_TTL não são aceitos (as exclusões
+# antigas já foram descartadas): o cliente precisa carregar a lista de novo.
+from datetime import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import and_, event, or_, select
+from sqlalchemy.orm import Session
+
+from models import Attachment, Problem, ProblemTombstone
+from pagination import InvalidCursor, decode_cursor, encode_cursor, parse_datetime
+
+START = (datetime.min, 0)
+
+
+class ExpiredToken(ValueError):
+    pass
+
+
+# --- Registro das alterações a cada flush -------------------------------------
+
+
+@event.listens_for(Session, "before_flush")
+def _touch_problems(session, flush_context, instances):
+    now = datetime.utcnow()
+    touched = {
+        problem
+        for problem in session.dirty
+        if isinstance(problem, Problem) and session.is_modified(problem)
+    }
+    # Anexos alterados sem passar pela lista do problema
+    problem_ids = {
+        attachment.problem_id
+        for attachment in (*session.new, *session.dirty, *session.deleted)
+        if isinstance(attachment, Attachment) and attachment.problem_id is not None
+    }
+    for problem_id in problem_ids:
+        problem = session.get(Problem, problem_id)
+        if problem is not None:
+            touched.add(problem)
+    for problem in touched:
+        if problem not in session.deleted and problem not in session.new:
+            problem.updated_at = now
+
+
+@event.listens_for(Session, "after_flush")
+def _record_tombstones(session, flush_context):
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, Problem)]
+    created = [obj.id for obj in session.new if isinstance(obj, Problem)]
+    if not (deleted or created):
+        return
+
+    table = ProblemTombstone.__table__
+    connection = session.connection()
+    # Um ID reaproveitado pelo banco deixa de constar como excluído
+    connection.execute(table.delete().where(table.c.problem_id.in_(deleted + created)))
+    if deleted:
+        now = datetime.utcnow()
+        connection.execute(
+            table.insert(),
+            [{"problem_id": problem_id, "deleted_at": now} for problem_id in deleted],
+        )
+        # Exclusões que já passaram do prazo (o índice em deleted_at atende)
+        if has_app_context():
+            limit = now - current_app.config["CHANGES_TOMBSTONE_TTL"]
+            connection.execute(table.delete().where(table.c.deleted_at < limit))
+
+
+# --- Token --------------------------------------------------------------------
+
+
+def decode_token(token):
+    # Posições (updated_at, id) dos problemas e (deleted_at, id) das exclusões
+    try:
+        changed_at, changed_id, deleted_at, deleted_id = decode_cursor(token, 4)
+        changed = (parse_datetime(changed_at), int(changed_id))
+        deleted = (parse_datetime(deleted_at), int(deleted_id))
+    except (TypeError, ValueError):
+        raise InvalidCursor(token)
+
+    limit = datetime.utcnow() - current_app.config["CHANGES_TOMBSTONE_TTL"]
+    if deleted[0] < limit:
+        raise ExpiredToken(token)
+    return changed, deleted
+
+
+def initial_positions():
+    # Primeira sincronização: todos os problemas, e só as exclusões feitas a
+    # partir de agora
+    started = datetime.utcnow() - current_app.config["CHANGES_SAFETY_WINDOW"]
+    return START, (started, 0)
+
+
+def encode_token(changed, deleted, has_more):
+    if not has_more:
+        horizon = (datetime.utcnow() - current_app.config["CHANGES_SAFETY_WINDOW"], 0)
+        changed = min(changed, horizon)
+        deleted = min(deleted, horizon)
+    return encode_cursor(*changed, *deleted)
+
+
+# --- Consultas ----------------------------------------------------------------
+
+
+def changed_since(query, position):
+    # Problemas criados ou alterados depois da posição, na ordem do índice
+    # ix_problems_updated_at_id
+    updated_at, last_id = position
+    return query.filter(
+        or_(
+            Problem.updated_at > updated_at,
+            and_(Problem.updated_at == updated_at, Problem.id > last_id),
+        )
+    ).order_by(Problem.updated_at, Problem.id)
+
+
+def deleted_since(connection, position, limit):
+    # [(deleted_at, problem_id)] das exclusões depois da posição
+    table = ProblemTombstone.__table__
+    deleted_at, last_id = position
+    return connection.execute(
+        select(table.c.deleted_at, table.c.problem_id)
+        .where(
+            or_(
+                table.c.deleted_at > deleted_at,
+                and_(table.c.deleted_at == deleted_at, table.c.problem_id > last_id),
+            )
+        )
+        .order_by(table.c.deleted_at, table.c.problem_id)
+        .limit(limit)
+    ).all()
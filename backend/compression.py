@@ -0,0 +1,151 @@
+# Compressão das respostas de texto (JSON, NDJSON etc.).
+# O algoritmo é escolhido conforme o cabeçalho Accept-Encoding do cliente:
+# brotli (se o pacote "brotli" estiver instalado) ou gzip. Respostas comuns só são comprimidas acima de
+# COMPRESS_MIN_SIZE; respostas em streaming são comprimidas bloco a bloco,
+# sem esperar o fim. Arquivos enviados com send_file (direct_passthrough) e
+# tipos já comprimidos (imagens, PDFs) passam direto.
+#
+# O corpo comprimido das respostas com ETag (cache de respostas) é guardado
+# em memória pela ETag, para não comprimir de novo o mesmo conteúdo. A ETag
+# passa a ser fraca, como faz o Nginx: o conteúdo é o mesmo, mas os bytes não.
+import zlib
+
+from flask import request
+
+from cache import MemoryCache
+
+try:
+    import brotli
+except ImportError:  # dependência opcional
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/css",
+    "text/csv",
+    "text/html",
+    "text/plain",
+    "text/xml",
+}
+
+# Com streaming, os dados comprimidos são liberados a cada N bytes recebidos
+STREAM_FLUSH_SIZE = 64 * 1024
+
+
+class Compression:
+    def __init__(self):
+        self.encodings = []
+        self.min_size = 1024
+        self.gzip_level = 6
+        self.brotli_quality = 5
+        self._cache = None
+
+    def init_app(self, app):
+        app.config.setdefault("COMPRESS_ENABLED", True)
+        app.config.setdefault("COMPRESS_MIN_SIZE", 1024)
+        app.config.setdefault("COMPRESS_GZIP_LEVEL", 6)
+        app.config.setdefault("COMPRESS_BROTLI_QUALITY", 5)
+        app.config.setdefault("COMPRESS_CACHE_ENTRIES", 256)
+        app.extensions["compression"] = self
+        if not app.config["COMPRESS_ENABLED"]:
+            return
+
+        self.min_size = app.config["COMPRESS_MIN_SIZE"]
+        self.gzip_level = app.config["COMPRESS_GZIP_LEVEL"]
+        self.brotli_quality = app.config["COMPRESS_BROTLI_QUALITY"]
+        # Em ordem de preferência quando o cliente aceita os dois
+        self.encodings = (["br"] if brotli is not None else []) + ["gzip"]
+        self._cache = MemoryCache(
+            max_entries=app.config["COMPRESS_CACHE_ENTRIES"], default_ttl=0
+        )
+        app.after_request(self._compress_response)
+
+    def _compressor(self, encoding):
+        if encoding == "br":
+            return brotli.Compressor(quality=self.brotli_quality)
+        # wbits 31: formato gzip
+        return zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data, encoding):
+        compressor = self._compressor(encoding)
+        if encoding == "br":
+            return compressor.process(data) + compressor.finish()
+        return compressor.compress(data) + compressor.flush()
+
+    def _compress_response(self, response):
+        if (
+            response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or response.status_code < 200
+            or response.status_code in (204, 206, 304)
+            or "no-transform" in response.headers.get("Cache-Control", "")
+        ):
+            return response
+
+        # A resposta varia conforme o Accept-Encoding, comprimida ou não
+        response.vary.add("Accept-Encoding")
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if encoding is None or request.method == "HEAD":
+            return response
+
+        if response.is_streamed:
+            response.response = self._compress_stream(response.response, encoding)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            response.set_data(self._compressed_body(response, data, encoding))
+
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def _compressed_body(self, response, data, encoding):
+        etag, weak = response.get_etag()
+        if not etag or weak:
+            return self.compress(data, encoding)
+
+        key = f"{encoding}:{etag}"
+        body = self._cache.get(key)
+        if body is None:
+            body = self.compress(data, encoding)
+            self._cache.set(key, body)
+        return body
+
+    def _compress_stream(self, chunks, encoding):
+        compressor = self._compressor(encoding)
+        if encoding == "br":
+            write, flush = compressor.process, compressor.flush
+            finish = compressor.finish
+        else:
+            write = compressor.compress
+            flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+            finish = compressor.flush
+
+        pending = 0
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode("utf-8")
+                output = write(chunk)
+                pending += len(chunk)
+                # Liberar a cada bloco grande, para o cliente já ir recebendo
+                if pending >= STREAM_FLUSH_SIZE:
+                    output += flush()
+                    pending = 0
+                if output:
+                    yield output
+            yield finish()
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+
+compression = Compression()
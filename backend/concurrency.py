@@ -0,0 +1,43 @@
+# Pools de threads para trabalho que usa CPU (hash de senhas, miniaturas).
+#
+# Com o worker gevent do gunicorn (o padrão em gunicorn.conf.py) o módulo
+# threading é trocado por greenlets, que se revezam em uma única thread: um
+# hash de senha ou o redimensionamento de uma imagem rodando em um greenlet
+# pararia todas as outras requisições do processo. Nesse caso os pools usam
+# threads do sistema (gevent.threadpool), e quem espera pelo resultado só
+# libera o greenlet. offload() faz o mesmo para um trecho avulso (o índice de
+# problemas relacionados).
+from concurrent.futures import ThreadPoolExecutor
+
+_offload_pool = None
+
+
+def cooperative():
+    # Threads trocadas por greenlets (worker gevent do gunicorn)?
+    try:
+        from gevent import monkey
+    except ImportError:  # dependência opcional (não instalada no Windows)
+        return False
+    return monkey.is_module_patched("threading")
+
+
+def thread_pool(max_workers, thread_name_prefix=""):
+    if cooperative():
+        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+
+        return NativeThreadPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix=thread_name_prefix
+    )
+
+
+def offload(func, *args, **kwargs):
+    # Executa func em uma thread do sistema quando as threads são greenlets
+    # (quem chama só espera o resultado); sem gevent, chama direto. Só para
+    # trabalho em memória: sessões e conexões do banco ficam com o greenlet
+    if not cooperative():
+        return func(*args, **kwargs)
+    global _offload_pool
+    if _offload_pool is None:
+        _offload_pool = thread_pool(1, thread_name_prefix="offload")
+    return _offload_pool.submit(func, *args, **kwargs).result()
@@ -6,10 +6,192 @@ class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY") or "chave-secreta-padrao"
     SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL") or "sqlite:///wiki.db"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Pool de conexões do SQLAlchemy (por processo do servidor)
+    SQLALCHEMY_POOL_SIZE = int(os.environ.get("SQLALCHEMY_POOL_SIZE", 5))
+    SQLALCHEMY_MAX_OVERFLOW = int(os.environ.get("SQLALCHEMY_MAX_OVERFLOW", 10))
+    SQLALCHEMY_POOL_TIMEOUT = 30  # segundos esperando uma conexão livre
+    SQLALCHEMY_POOL_RECYCLE = int(os.environ.get("SQLALCHEMY_POOL_RECYCLE", 1800))
+    SQLALCHEMY_POOL_PRE_PING = True  # descarta conexões derrubadas pelo banco
+
+    # Ajustes aplicados a cada conexão SQLite: WAL permite leituras durante
+    # uma gravação e busy_timeout espera o lock em vez de falhar na hora
+    SQLITE_JOURNAL_MODE = "WAL"
+    SQLITE_BUSY_TIMEOUT = 5000  # milissegundos
+    SQLITE_SYNCHRONOUS = "NORMAL"
+    SQLITE_CACHE_SIZE_KB = 20000
     UPLOAD_FOLDER = "uploads"
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB máximo para uploads
     PERMANENT_SESSION_LIFETIME = timedelta(days=1)
-    ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "pdf"}
+    ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "pdf", "mp4", "webm"}
+
+    # Envio dos anexos: "direct" (Flask), "x-accel" (Nginx) ou "x-sendfile"
+    # (Apache/lighttpd). Com SENDFILE_STANDIN o próprio app simula o servidor
+    # web, para testar os modos x-accel/x-sendfile localmente.
+    FILE_SERVING_MODE = os.environ.get("FILE_SERVING_MODE") or "direct"
+    X_ACCEL_PREFIX = os.environ.get("X_ACCEL_PREFIX") or "/protected-uploads/"
+    SENDFILE_STANDIN = os.environ.get("SENDFILE_STANDIN", "").lower() == "true"
+
+    # Uploads em partes (manuais e vídeos maiores que MAX_CONTENT_LENGTH)
+    UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # deve ser menor que MAX_CONTENT_LENGTH
+    MAX_UPLOAD_SIZE = 2 * 1024 * 1024 * 1024  # 2GB por arquivo
+    UPLOAD_SESSION_TTL = timedelta(days=1)  # sessões não finalizadas expiram
+    # "manage.py gc-uploads" não remove arquivos sem referência mais novos que
+    # isso (podem ser de um upload cujo commit ainda não aconteceu)
+    UPLOAD_GC_GRACE = timedelta(days=1)
+
+    # Miniaturas das imagens enviadas (lado maior em pixels por tamanho)
+    THUMBNAIL_SIZES = {"sm": 320, "md": 800, "lg": 1600}
+    THUMBNAIL_QUALITY = 80
+    THUMBNAIL_WORKERS = 2  # threads para miniaturas pedidas antes de existir
+
+    # Extração de texto dos anexos para a busca (PDFs; imagens só com OCR).
+    # EXTRACTION_OCR_ENGINE: "tesseract" (pytesseract) ou "modulo:funcao"
+    EXTRACTION_ENABLED = True
+    EXTRACTION_WORKERS = int(os.environ.get("EXTRACTION_WORKERS", 2))  # processos
+    EXTRACTION_TIMEOUT = 120  # segundos por arquivo (menor que JOB_LOCK_TIMEOUT)
+    EXTRACTION_MAX_PAGES = 500
+    EXTRACTION_MAX_CHARS = 500_000  # texto guardado por arquivo
+    # Arquivos maiores não são processados (ficam sem texto, como falha)
+    EXTRACTION_MAX_FILE_SIZE = int(
+        os.environ.get("EXTRACTION_MAX_FILE_SIZE", 200 * 1024 * 1024)
+    )
+    EXTRACTION_OCR_ENGINE = os.environ.get("EXTRACTION_OCR_ENGINE") or None
+    EXTRACTION_OCR_LANGUAGE = os.environ.get("EXTRACTION_OCR_LANGUAGE", "por+eng")
+
+    # Fila de tarefas em segundo plano (remoção de arquivos, miniaturas etc.).
+    # JOB_WORKERS threads rodam em cada processo do servidor; use 0 para
+    # executar as tarefas só com "python manage.py worker"
+    JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 1))
+    JOB_POLL_INTERVAL = 2.0  # segundos entre consultas à fila
+    JOB_LOCK_TIMEOUT = 300  # segundos até uma tarefa travada voltar à fila
+    JOB_RETRY_DELAY = 5  # espera base (exponencial) entre tentativas
+    # Tarefas concluídas são removidas depois de JOB_RETENTION (os workers
+    # verificam a cada JOB_PRUNE_INTERVAL segundos; "python manage.py
+    # prune-jobs" faz na hora). As que falharam ficam para análise.
+    JOB_RETENTION = timedelta(days=int(os.environ.get("JOB_RETENTION_DAYS", 7)))
+    JOB_PRUNE_INTERVAL = 3600
+
+    # Paginação das listagens
+    PAGE_SIZE = 20
+    MAX_PAGE_SIZE = 100
+
+    # API em lote (/api/problems/batch): máximo de IDs por leitura e de
+    # operações por requisição de escrita
+    BATCH_MAX_ITEMS = 500
+    BATCH_MAX_OPERATIONS = 1000
+
+    # Contagem de comandos SQL por requisição: devolve o total no cabeçalho
+    # X-Query-Count e registra um aviso quando passar de SQL_QUERY_BUDGET
+    QUERY_COUNT_HEADER = os.environ.get("QUERY_COUNT_HEADER", "").lower() == "true"
+    SQL_QUERY_BUDGET = int(os.environ.get("SQL_QUERY_BUDGET") or 0) or None
+
+    # Compressão gzip/brotli das respostas JSON maiores que COMPRESS_MIN_SIZE
+    # bytes (brotli só com o pacote "brotli" instalado)
+    COMPRESS_ENABLED = os.environ.get("COMPRESS_ENABLED", "true").lower() == "true"
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_GZIP_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 5  # 0 a 11; acima de ~6 fica lento demais
+    COMPRESS_CACHE_ENTRIES = 256  # corpos comprimidos guardados pela ETag
+
+    # Feed de alterações (GET /api/problems/changes): problemas por página, a
+    # janela reenviada a cada sincronização (transações que demoram a
+    # confirmar) e por quanto tempo as exclusões ficam registradas (tokens
+    # mais antigos recebem 410)
+    CHANGES_PAGE_SIZE = 500
+    CHANGES_MAX_PAGE_SIZE = 2000
+    CHANGES_SAFETY_WINDOW = timedelta(seconds=60)
+    CHANGES_TOMBSTONE_TTL = timedelta(days=30)
+
+    # Eventos em tempo real (GET /api/problems/events, Server-Sent Events):
+    # intervalo de leitura da tabela de eventos, comentário periódico para
+    # manter a conexão, duração máxima de cada conexão (o navegador
+    # reconecta), mensagens guardadas em memória e eventos guardados para a
+    # retomada com Last-Event-ID. SSE_MAX_CLIENTS limita as conexões por
+    # processo (vazio: 1000 com o worker gevent, 2 com threads reais). Só
+    # com SQLite (em outros bancos ficam desligados, ver broadcast.py)
+    SSE_ENABLED = os.environ.get("SSE_ENABLED", "true").lower() == "true"
+    SSE_POLL_INTERVAL = 1.0  # segundos
+    SSE_HEARTBEAT = 15  # segundos
+    SSE_MAX_DURATION = 300  # segundos
+    SSE_RETRY = 3000  # milissegundos até o navegador reconectar
+    SSE_BUFFER_SIZE = 1000
+    SSE_EVENT_TTL = timedelta(days=1)
+    SSE_MAX_CLIENTS = int(os.environ.get("SSE_MAX_CLIENTS") or 0) or None
+
+    # Listagem completa em streaming (?stream=true): problemas por lote
+    JSON_STREAM_BATCH_SIZE = 500
+
+    # Métricas por rota em /api/metrics (formato do Prometheus). Com
+    # METRICS_TOKEN o endpoint exige "Authorization: Bearer <token>"; sem ele,
+    # só administradores logados. "sqlite" soma os workers da mesma máquina.
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+    METRICS_BACKEND = os.environ.get("METRICS_BACKEND") or "memory"
+    METRICS_SQLITE_PATH = os.environ.get("METRICS_SQLITE_PATH")
+    METRICS_FLUSH_INTERVAL = 5  # segundos entre gravações de cada worker
+
+    # Log das requisições mais lentas que SLOW_REQUEST_MS (desativado se
+    # vazio), com os comandos SQL mais demorados de cada uma
+    SLOW_REQUEST_MS = int(os.environ.get("SLOW_REQUEST_MS") or 0) or None
+    SLOW_REQUEST_MAX_QUERIES = 10
+
+    # Cache das respostas de leitura: "memory" (LRU no processo), "sqlite"
+    # (arquivo local compartilhado entre workers) ou "null" (desativado). Com
+    # mais de um worker, gunicorn.conf.py usa "sqlite" por padrão
+    RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND") or "memory"
+    RESPONSE_CACHE_TTL = 300  # segundos
+    RESPONSE_CACHE_MAX_ENTRIES = 1024
+    RESPONSE_CACHE_SQLITE_PATH = os.environ.get("RESPONSE_CACHE_SQLITE_PATH")
+
+    # Hash das senhas: algoritmo e custo no formato do Werkzeug, por exemplo
+    # "pbkdf2:sha256:600000" ou "scrypt:32768:8:1". Senhas gravadas com outros
+    # parâmetros são refeitas no próximo login bem-sucedido.
+    PASSWORD_HASH_METHOD = (
+        os.environ.get("PASSWORD_HASH_METHOD") or "pbkdf2:sha256:600000"
+    )
+
+    # Login: verificação das senhas em um pool limitado (503 quando lotado) e
+    # limite de tentativas erradas por usuário (429). Com mais de um worker,
+    # gunicorn.conf.py guarda as tentativas no SQLite por padrão
+    LOGIN_VERIFY_WORKERS = int(os.environ.get("LOGIN_VERIFY_WORKERS", 4))
+    LOGIN_VERIFY_QUEUE = 32  # logins aguardando além dos que estão no pool
+    LOGIN_VERIFY_TIMEOUT = 10  # segundos de espera antes de responder 503
+    LOGIN_MAX_ATTEMPTS = 5
+    LOGIN_ATTEMPT_WINDOW = 300  # segundos
+    LOGIN_THROTTLE_BACKEND = os.environ.get("LOGIN_THROTTLE_BACKEND") or "memory"
+    LOGIN_THROTTLE_SQLITE_PATH = os.environ.get("LOGIN_THROTTLE_SQLITE_PATH")
+
+    # Cache da identidade do usuário logado (user_loader do Flask-Login);
+    # mesmos backends do cache de respostas. Com mais de um worker,
+    # gunicorn.conf.py usa "sqlite" por padrão (mudanças de papel valem em
+    # todos os processos)
+    IDENTITY_CACHE_BACKEND = os.environ.get("IDENTITY_CACHE_BACKEND") or "memory"
+    IDENTITY_CACHE_TTL = 300  # segundos
+    IDENTITY_CACHE_MAX_ENTRIES = 4096
+    IDENTITY_CACHE_SQLITE_PATH = os.environ.get("IDENTITY_CACHE_SQLITE_PATH")
+
+    # Busca textual: "auto" usa FTS5 no SQLite e o índice em tabela nos demais
+    # bancos; "fts5" ou "table" forçam um dos dois
+    SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND") or "auto"
+
+    # Problemas relacionados (pré-calculados pela fila de tarefas): score =
+    # peso do texto (TF-IDF) * cosseno + peso das tags * cosseno + bônus da
+    # mesma categoria; o índice em memória é refeito a cada
+    # RELATED_REFRESH_INTERVAL segundos
+    RELATED_ENABLED = os.environ.get("RELATED_ENABLED", "true").lower() == "true"
+    RELATED_TOP_K = 10
+    RELATED_MAX_TERMS = 32  # termos de maior peso guardados por problema
+    # Termos presentes em mais dessa fração dos problemas contam na norma do
+    # vetor, mas não são indexados (quase não distinguem e dominam o custo)
+    RELATED_MAX_DF = 0.2
+    RELATED_MIN_SCORE = 0.05
+    RELATED_TEXT_WEIGHT = 0.6
+    RELATED_TAG_WEIGHT = 0.3
+    RELATED_CATEGORY_WEIGHT = 0.1
+    RELATED_REFRESH_INTERVAL = 12 * 3600
+    RELATED_UPDATE_LIMIT = 200  # acima disso, recálculo completo em partes
+    RELATED_REBUILD_CHUNK = 5000  # problemas por tarefa do recálculo completo
 
     # Configurações para o Flask-Session e cookies
     SESSION_TYPE = "filesystem"
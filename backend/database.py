@@ -0,0 +1,63 @@
+# Ajustes do engine do SQLAlchemy para produção.
+#   - pool de conexões configurável (tamanho, pre-ping e reciclagem)
+#   - no SQLite: journal WAL (leitores não bloqueiam quem grava e vice-versa),
+#     busy_timeout (espera pelo lock em vez de "database is locked" imediato),
+#     synchronous=NORMAL (seguro com WAL) e cache de páginas maior
+#   - savepoints (begin_nested) dentro de uma transação de verdade
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def _is_sqlite_memory(url):
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def engine_options(config):
+    # Opções passadas ao create_engine (SQLALCHEMY_ENGINE_OPTIONS)
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    options = {"pool_pre_ping": config["SQLALCHEMY_POOL_PRE_PING"]}
+
+    # O SQLite em memória usa um pool de conexão única (sem tamanho)
+    if not _is_sqlite_memory(url):
+        options.update(
+            pool_size=config["SQLALCHEMY_POOL_SIZE"],
+            max_overflow=config["SQLALCHEMY_MAX_OVERFLOW"],
+            pool_timeout=config["SQLALCHEMY_POOL_TIMEOUT"],
+            pool_recycle=config["SQLALCHEMY_POOL_RECYCLE"],
+        )
+    return options
+
+
+def configure_sqlite(engine, config):
+    if engine.dialect.name != "sqlite":
+        return
+
+    pragmas = [
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT'])}",
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        # Valor negativo: tamanho em KiB (e não em páginas)
+        f"PRAGMA cache_size=-{int(config['SQLITE_CACHE_SIZE_KB'])}",
+    ]
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    # O pysqlite só abre a transação (BEGIN) no primeiro comando de escrita.
+    # Um SAVEPOINT emitido antes disso vira a transação externa e o RELEASE
+    # grava tudo, sem que um rollback posterior possa desfazer. Abrir a
+    # transação antes do primeiro savepoint, já com o lock de escrita
+    # (IMMEDIATE): com BEGIN simples, as leituras dentro do savepoint fixam um
+    # snapshot e a primeira escrita falha na hora ("database is locked", sem
+    # esperar o busy_timeout) se outra conexão gravou nesse meio-tempo.
+    @event.listens_for(engine, "savepoint")
+    def _begin_before_savepoint(connection, name):
+        dbapi_connection = connection.connection.dbapi_connection
+        if not dbapi_connection.in_transaction:
+            dbapi_connection.execute("BEGIN IMMEDIATE")
@@ -0,0 +1,53 @@
+# Sinal emitido depois que alterações no banco são confirmadas.
+# As mudanças são coletadas a cada flush e enviadas somente após o commit, para
+# que os receptores (cache, índices em memória etc.) nunca reajam a dados que
+# acabaram desfeitos por um rollback.
+from collections import namedtuple
+
+from blinker import Namespace
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+Change = namedtuple("Change", ["table", "id", "action"])
+
+signals = Namespace()
+models_committed = signals.signal("models-committed")
+
+
+def _pending(session):
+    return session.info.setdefault("pending_changes", [])
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    pending = _pending(session)
+    for action, instances in (
+        ("insert", session.new),
+        ("update", session.dirty),
+        ("delete", session.deleted),
+    ):
+        for instance in instances:
+            table = getattr(instance, "__tablename__", None)
+            if table is None:
+                continue
+            if action == "update" and not session.is_modified(instance):
+                continue
+            pending.append(Change(table, getattr(instance, "id", None), action))
+
+
+@event.listens_for(Session, "after_commit")
+def _send_changes(session):
+    changes = session.info.pop("pending_changes", None)
+    if not changes:
+        return
+
+    sender = current_app._get_current_object() if has_app_context() else None
+    models_committed.send(sender, changes=changes)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_changes(session, previous_transaction):
+    # Somente o rollback da transação principal (não de um savepoint)
+    if previous_transaction.parent is None:
+        session.info.pop("pending_changes", None)
@@ -0,0 +1,169 @@
+# Extração do texto dos anexos (PDFs e, com OCR, imagens) para a busca.
+#
+# No upload de um conteúdo novo a extração vira uma tarefa da fila (jobs.py);
+# a tarefa entrega o arquivo a um pool de processos (o parsing de PDF e o OCR
+# usam CPU e não liberam o GIL) e grava o resultado em file_texts, pelo
+# SHA-256: o mesmo conteúdo enviado de novo, em qualquer problema, não é
+# processado outra vez. Em seguida os problemas que usam o arquivo são
+# reindexados (search.py).
+#
+# O pool usa "spawn": o servidor tem threads, e um fork copiaria locks em uso.
+# Um arquivo que passe de EXTRACTION_TIMEOUT encerra os processos do pool (que
+# é recriado) e fica registrado como falha, sem novas tentativas; arquivos
+# maiores que EXTRACTION_MAX_FILE_SIZE nem chegam ao pool.
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from flask import current_app
+
+import extractors
+import file_serving
+import jobs
+import shards
+import thumbnails
+from models import Attachment, Blob, FileText, db
+from search import search_index
+
+DONE = "done"
+FAILED = "failed"
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def supported(filename):
+    # PDFs sempre; imagens só com um mecanismo de OCR configurado
+    if file_serving.mime_type_for(filename) == extractors.PDF_MIME_TYPE:
+        return True
+    return thumbnails.is_image(filename) and bool(
+        current_app.config["EXTRACTION_OCR_ENGINE"]
+    )
+
+
+def schedule(blob):
+    # Cria a tarefa de extração na transação atual, se o texto desse conteúdo
+    # ainda não existir
+    if not current_app.config["EXTRACTION_ENABLED"] or not supported(blob.storage_name):
+        return
+    with db.session.no_autoflush:
+        cached = db.session.get(FileText, blob.sha256)
+    if cached is None:
+        jobs.enqueue("extract_text", sha256=blob.sha256)
+
+
+def _get_pool(app):
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(
+                max_workers=app.config["EXTRACTION_WORKERS"],
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _discard_pool(pool):
+    # Processos travados ou mortos: encerrá-los e criar outro pool na próxima
+    # extração
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    for process in list((pool._processes or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def extract(path, mime_type):
+    # Resultado de extractors.extract_file, executado no pool
+    app = current_app._get_current_object()
+    config = app.config
+    size = os.path.getsize(path)
+    if size > config["EXTRACTION_MAX_FILE_SIZE"]:
+        error = f"Arquivo grande demais para extração ({size // (1024 * 1024)} MB)"
+        return {"text": "", "method": None, "page_count": None, "error": error}
+    pool = _get_pool(app)
+    future = pool.submit(
+        extractors.extract_file,
+        path,
+        mime_type,
+        config["EXTRACTION_MAX_PAGES"],
+        config["EXTRACTION_MAX_CHARS"],
+        config["EXTRACTION_OCR_ENGINE"],
+        config["EXTRACTION_OCR_LANGUAGE"],
+    )
+    try:
+        return future.result(timeout=config["EXTRACTION_TIMEOUT"])
+    except FutureTimeoutError:
+        _discard_pool(pool)
+        error = f"Tempo esgotado ({config['EXTRACTION_TIMEOUT']}s)"
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        error = "Processo de extração encerrado inesperadamente"
+    return {"text": "", "method": None, "page_count": None, "error": error}
+
+
+@jobs.handler("extract_text")
+def extract_job(sha256, force=False):
+    blob = Blob.query.filter_by(sha256=sha256).first()
+    if blob is None:
+        return  # removido antes da extração
+    if not force and db.session.get(FileText, sha256) is not None:
+        return
+
+    # O blob expira no commit abaixo (e pode ser removido durante a extração)
+    storage_name = blob.storage_name
+    path = shards.locate(
+        os.path.join(current_app.root_path, current_app.config["UPLOAD_FOLDER"]),
+        storage_name,
+    )
+    # Arquivo ausente propaga o erro para que a tarefa seja tentada novamente
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    mime_type = file_serving.mime_type_for(storage_name)
+    # Não manter a transação de leitura aberta durante a extração
+    db.session.commit()
+
+    started = time.perf_counter()
+    result = extract(path, mime_type)
+    elapsed = time.perf_counter() - started
+    if result["error"]:
+        current_app.logger.warning(
+            f"Extração de texto de {storage_name} falhou: {result['error']}"
+        )
+
+    db.session.merge(
+        FileText(
+            sha256=sha256,
+            status=FAILED if result["error"] else DONE,
+            method=result["method"],
+            page_count=result["page_count"],
+            text=result["text"],
+            error=result["error"],
+            elapsed=elapsed,
+            extracted_at=datetime.utcnow(),
+        )
+    )
+    db.session.flush()
+    # Com a escrita já bloqueada pelo flush: se o conteúdo foi removido
+    # durante a extração, o texto não fica guardado
+    if db.session.query(Blob.id).filter_by(sha256=sha256).first() is None:
+        db.session.rollback()
+        return
+
+    problem_ids = [
+        problem_id
+        for (problem_id,) in db.session.query(Attachment.problem_id)
+        .filter_by(sha256=sha256)
+        .distinct()
+    ]
+    if problem_ids:
+        search_index.reindex(db.session.connection(), problem_ids)
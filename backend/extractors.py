@@ -0,0 +1,168 @@
+# Extração de texto de um arquivo (PDF ou imagem), executada nos processos do
+# pool de extraction.py. Só funções puras: este módulo não importa Flask nem
+# os modelos, para que os processos do pool iniciem rápido.
+#
+# PDFs: com o pypdf instalado (opcional) o texto vem dele. Sem ele, um
+# extrator simples lê as strings dos operadores de texto (Tj, TJ, ' e ") dos
+# content streams sem compressão ou com FlateDecode; fontes com codificação
+# própria (strings hexadecimais, CID) ficam sem texto. O arquivo é mapeado
+# em memória (mmap) em vez de lido inteiro, e cada stream descomprimido tem um
+# limite de tamanho.
+#
+# OCR: "tesseract" usa o pytesseract (e o executável tesseract) nas imagens;
+# "modulo:funcao" chama uma função própria (caminho, mime_type, idioma) ->
+# texto, que também pode tratar PDFs sem camada de texto.
+import importlib
+import mmap
+import re
+import zlib
+
+try:
+    import pypdf
+except ImportError:  # dependência opcional
+    pypdf = None
+
+PDF_MIME_TYPE = "application/pdf"
+
+# Um PDF com menos caracteres que isso por página é tratado como digitalizado
+# (sem camada de texto) e vai para o OCR, se houver
+MIN_CHARS_PER_PAGE = 20
+
+_PAGE_RE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+_STREAM_RE = re.compile(rb"stream\r?\n")
+_SKIPPED_STREAM_RE = re.compile(rb"/Subtype\s*/Image|/FontFile|/Length1|/XRef")
+_TEXT_OPERATOR_RE = re.compile(
+    rb"\((?P<string>(?:\\.|[^\\)])*)\)\s*(?:Tj|'|\")"
+    rb"|\[(?P<array>(?:\\.|[^\\\]])*)\]\s*TJ",
+    re.DOTALL,
+)
+_ARRAY_ITEM_RE = re.compile(rb"\((?P<string>(?:\\.|[^\\)])*)\)|(?P<number>-?[\d.]+)")
+_ESCAPE_RE = re.compile(rb"\\([0-7]{1,3}|.)", re.DOTALL)
+_ESCAPES = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f"}
+
+# Tamanho máximo de um content stream descomprimido (o restante é ignorado)
+MAX_STREAM_SIZE = 64 * 1024 * 1024
+
+# Afastamento em TJ (milésimos de em) a partir do qual há um espaço
+_TJ_SPACE = 200
+
+
+def _unescape(value):
+    def replace(match):
+        escaped = match.group(1)
+        if escaped[:1].isdigit():
+            return bytes([int(escaped, 8) & 0xFF])
+        if escaped in (b"\n", b"\r"):
+            return b""  # quebra de linha dentro da string
+        return _ESCAPES.get(escaped, escaped)
+
+    return _ESCAPE_RE.sub(replace, value).decode("latin-1")
+
+
+def _content_streams(data):
+    # Conteúdo (já descomprimido) dos streams que podem ter texto
+    position = 0
+    while True:
+        match = _STREAM_RE.search(data, position)
+        if match is None:
+            return
+        end = data.find(b"endstream", match.end())
+        if end < 0:
+            return
+        position = end + 9
+
+        header = data[max(0, match.start() - 1024) : match.start()]
+        header = header[header.rfind(b"obj") + 1 :]
+        if _SKIPPED_STREAM_RE.search(header):
+            continue
+        content = data[match.end() : end]
+        if b"/FlateDecode" in header:
+            try:
+                content = zlib.decompressobj().decompress(content, MAX_STREAM_SIZE)
+            except zlib.error:
+                continue
+        elif b"/Filter" in header:
+            continue  # outros filtros (DCT, LZW...) não têm texto legível
+        yield content
+
+
+def _simple_pdf_text(path, max_pages):
+    # (texto, páginas) sem o pypdf; max_pages não se aplica (os streams não
+    # são associados às páginas)
+    with open(path, "rb") as source:
+        try:
+            data = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return "", None  # arquivo vazio
+    with data:
+        lines = []
+        for content in _content_streams(data):
+            for match in _TEXT_OPERATOR_RE.finditer(content):
+                if match.group("string") is not None:
+                    lines.append(_unescape(match.group("string")))
+                    continue
+                parts = []
+                for item in _ARRAY_ITEM_RE.finditer(match.group("array")):
+                    if item.group("string") is not None:
+                        parts.append(_unescape(item.group("string")))
+                    elif float(item.group("number") or 0) <= -_TJ_SPACE:
+                        parts.append(" ")
+                lines.append("".join(parts))
+        pages = sum(1 for _ in _PAGE_RE.finditer(data))
+    return "\n".join(lines), pages or None
+
+
+def pdf_text(path, max_pages):
+    if pypdf is None:
+        return _simple_pdf_text(path, max_pages)
+    reader = pypdf.PdfReader(path)
+    pages = []
+    for page in reader.pages[:max_pages]:
+        pages.append(page.extract_text() or "")
+    return "\n".join(pages), len(reader.pages)
+
+
+def _tesseract(path, mime_type, language):
+    import pytesseract
+    from PIL import Image
+
+    if mime_type == PDF_MIME_TYPE:
+        return ""  # o tesseract não lê PDFs; só imagens
+    with Image.open(path) as image:
+        return pytesseract.image_to_string(image, lang=language)
+
+
+def ocr_engine(name):
+    # Função de OCR configurada em EXTRACTION_OCR_ENGINE
+    if not name:
+        return None
+    if name == "tesseract":
+        return _tesseract
+    module_name, _, function_name = name.partition(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def extract_file(path, mime_type, max_pages, max_chars, ocr=None, language=None):
+    # {"text", "method", "page_count", "error"} de um arquivo; erros do
+    # arquivo (corrompido, formato inesperado) voltam no resultado
+    result = {"text": "", "method": None, "page_count": None, "error": None}
+    try:
+        if mime_type == PDF_MIME_TYPE:
+            text, result["page_count"] = pdf_text(path, max_pages)
+            result["text"], result["method"] = text, "pdf"
+            pages = min(result["page_count"] or 1, max_pages)
+            if len(text.strip()) >= MIN_CHARS_PER_PAGE * pages:
+                ocr = None
+
+        engine = ocr_engine(ocr)
+        if engine is not None:
+            text = engine(path, mime_type, language) or ""
+            if len(text.strip()) > len(result["text"].strip()):
+                result["text"], result["method"] = text, "ocr"
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    # Espaços repetidos não ajudam a busca
+    text = re.sub(r"[ \t\r\f\v]+", " ", result["text"])
+    result["text"] = re.sub(r"\n\s*\n+", "\n", text).strip()[:max_chars]
+    return result
@@ -0,0 +1,198 @@
+# Contagem de problemas por categoria, tag, autor e categoria×tag.
+# As contagens ficam na tabela facet_counts e são atualizadas a cada flush, na
+# mesma transação das alterações: antes do flush, o estado anterior de cada
+# problema criado, alterado ou excluído é lido do banco e comparado com o
+# novo, e só a diferença é aplicada. Um rollback (inclusive de um savepoint)
+# desfaz as contagens junto com os dados.
+#
+# Alterações feitas fora do ORM (SQL direto, migrações) não passam por aqui;
+# rebuild() recalcula tudo a partir das tabelas (python manage.py
+# rebuild-facets).
+from collections import Counter
+
+from sqlalchemy import String, cast, event, func, inspect, literal, select
+from sqlalchemy.orm import Session
+
+from models import FacetCount, Problem, Tag, problem_tags
+
+CATEGORY = "category"
+TAG = "tag"
+AUTHOR = "author"
+CATEGORY_TAG = "category_tag"
+
+TRACKED_ATTRIBUTES = ("category", "author_id", "tag_items")
+
+
+def facet_keys(category, author_id, tags):
+    # Chaves (facet, value, subvalue) de um problema
+    keys = []
+    if author_id is not None:
+        keys.append((AUTHOR, str(author_id), ""))
+    for tag in tags:
+        keys.append((TAG, tag, ""))
+    # Sem categoria o flush falha (coluna obrigatória) e nada é contado
+    if category is not None:
+        keys.append((CATEGORY, category, ""))
+        keys.extend((CATEGORY_TAG, category, tag) for tag in tags)
+    return keys
+
+
+def _stored_state(connection, problem_ids):
+    # Categoria, autor e tags de cada problema como estão no banco (antes
+    # deste flush)
+    problems = Problem.__table__
+    tags = Tag.__table__
+    state = {
+        problem_id: [category, author_id, []]
+        for problem_id, category, author_id in connection.execute(
+            select(problems.c.id, problems.c.category, problems.c.author_id).where(
+                problems.c.id.in_(problem_ids)
+            )
+        )
+    }
+    for problem_id, name in connection.execute(
+        select(problem_tags.c.problem_id, tags.c.name)
+        .join(tags, tags.c.id == problem_tags.c.tag_id)
+        .where(problem_tags.c.problem_id.in_(problem_ids))
+    ):
+        state[problem_id][2].append(name)
+    return state
+
+
+def _has_changes(problem):
+    attrs = inspect(problem).attrs
+    return any(attrs[name].history.has_changes() for name in TRACKED_ATTRIBUTES)
+
+
+def _current_keys(problem, stored):
+    # Tags não carregadas (e não alteradas) continuam as mesmas do banco
+    if inspect(problem).attrs.tag_items.history.has_changes() or stored is None:
+        tags = [tag.name for tag in problem.tag_items]
+    else:
+        tags = stored[2]
+    author_id = problem.author_id
+    if author_id is None and problem.author is not None:
+        author_id = problem.author.id
+    return facet_keys(problem.category, author_id, tags)
+
+
+def collect_deltas(session):
+    created = [obj for obj in session.new if isinstance(obj, Problem)]
+    updated = [
+        obj for obj in session.dirty if isinstance(obj, Problem) and _has_changes(obj)
+    ]
+    deleted = [obj for obj in session.deleted if isinstance(obj, Problem)]
+    if not (created or updated or deleted):
+        return Counter()
+
+    stored = {}
+    ids = [obj.id for obj in updated + deleted if obj.id is not None]
+    if ids:
+        stored = _stored_state(session.connection(), ids)
+
+    deltas = Counter()
+    for problem in created + updated:
+        for key in _current_keys(problem, stored.get(problem.id)):
+            deltas[key] += 1
+    for problem in updated + deleted:
+        state = stored.get(problem.id)
+        if state is not None:
+            for key in facet_keys(*state):
+                deltas[key] -= 1
+    return deltas
+
+
+def apply_deltas(connection, deltas):
+    table = FacetCount.__table__
+    for (facet, value, subvalue), delta in sorted(deltas.items()):
+        if delta == 0:
+            continue
+        match = (
+            (table.c.facet == facet)
+            & (table.c.value == value)
+            & (table.c.subvalue == subvalue)
+        )
+        result = connection.execute(
+            table.update().where(match).values(count=table.c.count + delta)
+        )
+        if result.rowcount == 0:
+            connection.execute(
+                table.insert().values(
+                    facet=facet, value=value, subvalue=subvalue, count=delta
+                )
+            )
+    # Facetas que ficaram vazias
+    if any(delta < 0 for delta in deltas.values()):
+        connection.execute(table.delete().where(table.c.count <= 0))
+
+
+@event.listens_for(Session, "before_flush")
+def _update_facet_counts(session, flush_context, instances):
+    deltas = collect_deltas(session)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+def rebuild(connection):
+    # Recalcular todas as contagens a partir de problems e problem_tags
+    table = FacetCount.__table__
+    problems = Problem.__table__
+    tags = Tag.__table__
+    columns = [table.c.facet, table.c.value, table.c.subvalue, table.c.count]
+    tagged = problems.join(
+        problem_tags, problem_tags.c.problem_id == problems.c.id
+    ).join(tags, tags.c.id == problem_tags.c.tag_id)
+
+    queries = [
+        select(
+            literal(CATEGORY), problems.c.category, literal(""), func.count()
+        ).group_by(problems.c.category),
+        select(
+            literal(AUTHOR),
+            cast(problems.c.author_id, String),
+            literal(""),
+            func.count(),
+        ).group_by(problems.c.author_id),
+        select(literal(TAG), tags.c.name, literal(""), func.count())
+        .select_from(tagged)
+        .group_by(tags.c.name),
+        select(literal(CATEGORY_TAG), problems.c.category, tags.c.name, func.count())
+        .select_from(tagged)
+        .group_by(problems.c.category, tags.c.name),
+    ]
+    connection.execute(table.delete())
+    for query in queries:
+        connection.execute(table.insert().from_select(columns, query))
+
+
+def snapshot(connection):
+    table = FacetCount.__table__
+    return {
+        (facet, value, subvalue): count
+        for facet, value, subvalue, count in connection.execute(
+            select(table.c.facet, table.c.value, table.c.subvalue, table.c.count)
+        )
+    }
+
+
+def read(connection, category=None):
+    # Contagens agrupadas por faceta, da maior para a menor
+    table = FacetCount.__table__
+    query = select(table.c.facet, table.c.value, table.c.subvalue, table.c.count).where(
+        table.c.count > 0
+    )
+    if category is not None:
+        query = query.where(
+            (table.c.facet != CATEGORY_TAG) | (table.c.value == category)
+        )
+    facets = {CATEGORY: [], TAG: [], AUTHOR: [], CATEGORY_TAG: {}}
+    for facet, value, subvalue, count in connection.execute(
+        query.order_by(table.c.count.desc(), table.c.value, table.c.subvalue)
+    ):
+        if facet == CATEGORY_TAG:
+            facets[CATEGORY_TAG].setdefault(value, []).append(
+                {"name": subvalue, "count": count}
+            )
+        elif facet in facets:
+            facets[facet].append({"name": value, "count": count})
+    return facets
@@ -0,0 +1,176 @@
+# Envio dos arquivos enviados (anexos e miniaturas).
+#
+# FILE_SERVING_MODE define quem transfere os bytes:
+#   - "direct": o próprio Flask, com suporte a Range (PDFs), ETag,
+#     Last-Modified e Cache-Control
+#   - "x-accel": o Nginx, via cabeçalho X-Accel-Redirect (o location interno
+#     em X_ACCEL_PREFIX deve apontar para a pasta de uploads)
+#   - "x-sendfile": Apache (mod_xsendfile) ou lighttpd, via X-Sendfile
+# Nos dois últimos modos o worker do Flask só monta os cabeçalhos e fica livre
+# logo em seguida. SendfileStandIn simula o servidor web em desenvolvimento.
+import os
+from urllib.parse import quote, unquote
+
+from flask import current_app, send_file
+from werkzeug.datastructures import Headers
+from werkzeug.utils import send_file as werkzeug_send_file
+
+from metrics import metrics
+
+MIME_TYPES = {
+    "pdf": "application/pdf",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "gif": "image/gif",
+    "webp": "image/webp",
+    "mp4": "video/mp4",
+    "webm": "video/webm",
+}
+
+# Tipos abertos no navegador (os demais são sempre baixados)
+INLINE_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "webp", "pdf", "mp4", "webm"}
+
+IMMUTABLE_MAX_AGE = 31536000  # um ano
+
+
+def extension_of(filename):
+    return filename.rsplit(".", 1)[1].lower() if "." in filename else ""
+
+
+def mime_type_for(filename):
+    return MIME_TYPES.get(extension_of(filename), "application/octet-stream")
+
+
+def send_upload(
+    path,
+    download_name=None,
+    as_attachment=False,
+    etag=True,
+    immutable=False,
+    max_age=None,
+    mimetype=None,
+    size=None,
+):
+    # path é o caminho absoluto dentro da pasta de uploads; mimetype e size,
+    # quando conhecidos (metadados do anexo), evitam deduzir/consultar de novo
+    mode = current_app.config["FILE_SERVING_MODE"]
+    mimetype = mimetype or mime_type_for(path)
+    if immutable:
+        max_age = IMMUTABLE_MAX_AGE
+
+    if mode == "direct":
+        response = send_file(
+            path,
+            mimetype=mimetype,
+            as_attachment=as_attachment,
+            download_name=download_name,
+            conditional=True,
+            etag=etag,
+            max_age=max_age,
+        )
+        # Com Range, só o trecho pedido; 304 não tem corpo
+        metrics.file_served(mode, response.content_length or 0)
+    else:
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers["Content-Disposition"] = content_disposition(
+            download_name or os.path.basename(path), as_attachment
+        )
+        if isinstance(etag, str):
+            response.set_etag(etag)
+        if max_age is not None:
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+        else:
+            response.cache_control.no_cache = True
+
+        if mode == "x-accel":
+            upload_folder = os.path.join(
+                current_app.root_path, current_app.config["UPLOAD_FOLDER"]
+            )
+            relative = os.path.relpath(path, upload_folder).replace(os.sep, "/")
+            response.headers["X-Accel-Redirect"] = (
+                current_app.config["X_ACCEL_PREFIX"].rstrip("/") + "/" + quote(relative)
+            )
+        elif mode == "x-sendfile":
+            response.headers["X-Sendfile"] = path
+        else:
+            raise ValueError(f"FILE_SERVING_MODE desconhecido: {mode}")
+
+        # Quem envia é o servidor web: conta o tamanho do arquivo
+        if size is None:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+        metrics.file_served(mode, size)
+
+    if immutable:
+        response.cache_control.immutable = True
+    return response
+
+
+def content_disposition(filename, as_attachment):
+    disposition = "attachment" if as_attachment else "inline"
+    try:
+        filename.encode("ascii")
+        return f'{disposition}; filename="{filename}"'
+    except UnicodeEncodeError:
+        return f"{disposition}; filename*=UTF-8''{quote(filename)}"
+
+
+class SendfileStandIn:
+    # Middleware WSGI que faz o papel do Nginx/Apache em desenvolvimento e em
+    # testes: intercepta X-Accel-Redirect/X-Sendfile e envia o arquivo com
+    # suporte a Range, como o servidor web faria.
+    def __init__(self, wsgi_app, upload_folder, accel_prefix):
+        self.wsgi_app = wsgi_app
+        self.upload_folder = upload_folder
+        self.accel_prefix = accel_prefix.rstrip("/") + "/"
+
+    def __call__(self, environ, start_response):
+        captured = {}
+
+        def capture(status, headers, exc_info=None):
+            captured["status"] = status
+            captured["headers"] = headers
+            return lambda data: None
+
+        body = self.wsgi_app(environ, capture)
+        headers = Headers(captured["headers"])
+        path = self._target(headers)
+        if path is None:
+            start_response(captured["status"], captured["headers"])
+            return body
+
+        if hasattr(body, "close"):
+            body.close()
+        return self._serve(environ, start_response, path, headers)
+
+    def _target(self, headers):
+        if "X-Sendfile" in headers:
+            return headers["X-Sendfile"]
+
+        redirect = headers.get("X-Accel-Redirect")
+        if redirect and redirect.startswith(self.accel_prefix):
+            relative = unquote(redirect[len(self.accel_prefix) :])
+            return os.path.join(self.upload_folder, *relative.split("/"))
+        return None
+
+    def _serve(self, environ, start_response, path, headers):
+        try:
+            response = werkzeug_send_file(
+                path,
+                environ,
+                mimetype=headers.get("Content-Type"),
+                conditional=True,
+                etag=headers.get("ETag", "").strip('"') or True,
+            )
+        except FileNotFoundError:
+            start_response("404 NOT FOUND", [("Content-Type", "text/plain")])
+            return [b"Not Found"]
+
+        for name in ["Content-Disposition", "Cache-Control", "Vary"]:
+            if name in headers:
+                response.headers[name] = headers[name]
+        return response(environ, start_response)
@@ -0,0 +1,92 @@
+# Configuração do gunicorn para produção:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+# Os valores podem ser ajustados por variáveis de ambiente.
+import os
+
+# Worker gevent (padrão): cada requisição é um greenlet, então as conexões de
+# eventos (/api/problems/events) ociosas não ocupam threads e cada processo
+# atende até worker_connections delas; o trabalho que usa CPU vai para threads
+# do sistema (concurrency.py). Com GUNICORN_WORKER_CLASS=gthread (ou sem o
+# gevent instalado), threads reais.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gevent")
+if worker_class == "gevent":
+    try:
+        from gevent import monkey
+    except ImportError:  # dependência opcional
+        worker_class = "gthread"
+    else:
+        # Antes de carregar o app (preload_app): locks e threads criados na
+        # importação dos módulos também precisam ser cooperativos
+        monkey.patch_all()
+
+import multiprocessing  # noqa: E402
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+
+# Vários processos: usam todos os núcleos (e, com gthread, algumas threads
+# cada cobrem o tempo de espera por E/S)
+workers = int(
+    os.environ.get("GUNICORN_WORKERS", min(multiprocessing.cpu_count() * 2 + 1, 8))
+)
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+
+def shared_default(name):
+    # Backend "sqlite" (arquivo na pasta instance, comum aos workers) quando a
+    # variável não foi definida; o .env carregado pelo app ainda prevalece
+    if not os.environ.get(name):
+        os.environ[name] = "sqlite"
+
+
+# Com vários workers, o que precisa valer em todos os processos logo após uma
+# alteração não pode ficar na memória de cada um
+if workers > 1:
+    # Papel do usuário: rebaixar ou remover um administrador vale na hora
+    shared_default("IDENTITY_CACHE_BACKEND")
+    # Respostas: a geração trocada por um commit invalida todos os workers
+    shared_default("RESPONSE_CACHE_BACKEND")
+    # Tentativas de login: o limite vale para o conjunto, não por worker
+    shared_default("LOGIN_THROTTLE_BACKEND")
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+
+# Uploads em partes e exportações podem demorar
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Reciclar workers periodicamente (limita vazamentos de memória)
+max_requests = 1000
+max_requests_jitter = 100
+
+accesslog = "-"
+errorlog = "-"
+
+# Carregar o app uma vez no processo principal e compartilhar com os workers
+preload_app = True
+
+
+def on_starting(server):
+    # Criar tabelas e aplicar ajustes de esquema uma única vez
+    from wsgi import app
+    from app import prepare_database
+    from models import db
+
+    with app.app_context():
+        prepare_database()
+        db.engine.dispose()
+
+
+def post_fork(server, worker):
+    # Conexões abertas antes do fork não podem ser usadas pelos workers
+    from wsgi import app
+    from models import db
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    # Últimos valores das métricas do worker (METRICS_BACKEND="sqlite")
+    from metrics import metrics
+
+    metrics.flush()
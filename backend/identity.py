@@ -0,0 +1,73 @@
+# Cache da identidade do usuário logado.
+# O user_loader do Flask-Login roda em toda requisição autenticada (inclusive
+# em cada imagem servida por serve_file); com o cache, as requisições comuns
+# não consultam a tabela users. Guardamos só id, nome e papel (nunca o hash da
+# senha). Qualquer commit que altere um usuário (register, update_user,
+# delete_user) remove a entrada, então mudanças de papel valem na hora, também
+# nos outros workers quando o backend é compartilhado ("sqlite").
+from flask_login import UserMixin
+
+from cache import create_cache
+from events import models_committed
+from models import User, db
+
+
+class UserIdentity(UserMixin):
+    # Versão leve de User com o que as rotas usam de current_user
+    def __init__(self, id, username, role):
+        self.id = id
+        self.username = username
+        self.role = role
+
+    def to_dict(self):
+        return {"id": self.id, "username": self.username, "role": self.role}
+
+
+class IdentityCache:
+    def __init__(self):
+        self.backend = None
+
+    def init_app(self, app):
+        app.config.setdefault("IDENTITY_CACHE_BACKEND", "memory")
+        app.config.setdefault("IDENTITY_CACHE_TTL", 300)
+        app.config.setdefault("IDENTITY_CACHE_MAX_ENTRIES", 4096)
+        app.extensions["identity_cache"] = self
+        self.backend = create_cache(app, "IDENTITY_CACHE")
+        models_committed.connect(self._on_models_committed, sender=app, weak=False)
+
+    def _on_models_committed(self, sender, changes):
+        for change in changes:
+            if change.table == "users":
+                self.invalidate(change.id)
+
+    @staticmethod
+    def _key(user_id):
+        return f"identity:{user_id}"
+
+    def load(self, user_id):
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+
+        entry = self.backend.get(self._key(user_id))
+        if entry is None:
+            row = (
+                db.session.query(User.username, User.role)
+                .filter(User.id == user_id)
+                .first()
+            )
+            if row is None:
+                return None
+            entry = (row.username, row.role)
+            self.backend.set(self._key(user_id), entry)
+        return UserIdentity(user_id, *entry)
+
+    def invalidate(self, user_id=None):
+        if user_id is None:
+            self.backend.clear()
+        else:
+            self.backend.delete(self._key(user_id))
+
+
+identity_cache = IdentityCache()
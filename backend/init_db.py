@@ -1,5 +1,6 @@
 from app import app, create_upload_folder
 from models import db, User
+from migrations import upgrade
 import getpass
 import argparse
 
@@ -13,6 +14,9 @@ def init_db(criar_usuarios=False):
         # Criar tabelas
         db.create_all()
 
+        # Aplicar ajustes de esquema em bancos existentes
+        upgrade()
+
         # Verificar se já existe um usuário admin
         admin = User.query.filter_by(username="admin").first()
 
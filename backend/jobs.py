@@ -0,0 +1,241 @@
+# Fila de tarefas em segundo plano guardada no próprio banco (tabela jobs).
+#
+# enqueue() apenas adiciona a tarefa à sessão atual: ela só passa a existir se
+# a transação que a criou for confirmada, então uma alteração desfeita nunca
+# deixa tarefas para trás (e uma tarefa nunca se perde se o commit der certo).
+# Os workers (threads no processo do servidor ou "python manage.py worker")
+# pegam tarefas pendentes com um UPDATE condicional, o que permite vários
+# workers/processos sem executar a mesma tarefa duas vezes. Erros geram novas
+# tentativas com espera exponencial até max_attempts. Tarefas concluídas há
+# mais de JOB_RETENTION são removidas pelos próprios workers (a cada
+# JOB_PRUNE_INTERVAL) ou com "python manage.py prune-jobs".
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import update
+
+from events import models_committed
+from models import Job, db
+
+_handlers = {}
+
+PRUNE_BATCH_SIZE = 5000
+
+
+def handler(kind):
+    # Registra a função que executa as tarefas do tipo "kind"
+    def decorator(func):
+        _handlers[kind] = func
+        return func
+
+    return decorator
+
+
+def enqueue(kind, max_attempts=None, delay=None, **payload):
+    job = Job(kind=kind, run_after=datetime.utcnow())
+    job.payload = payload
+    if max_attempts is not None:
+        job.max_attempts = max_attempts
+    if delay is not None:
+        job.run_after += delay
+    db.session.add(job)
+    return job
+
+
+class JobQueue:
+    def __init__(self):
+        self.app = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._pruned_at = None
+
+    def init_app(self, app):
+        app.config.setdefault("JOB_WORKERS", 1)
+        app.config.setdefault("JOB_POLL_INTERVAL", 2.0)
+        app.config.setdefault("JOB_LOCK_TIMEOUT", 300)
+        app.config.setdefault("JOB_RETRY_DELAY", 5)
+        app.config.setdefault("JOB_RETENTION", timedelta(days=7))
+        app.config.setdefault("JOB_PRUNE_INTERVAL", 3600)
+        app.extensions["job_queue"] = self
+        self.app = app
+
+        # Workers do processo são iniciados na primeira requisição (depois do
+        # fork dos servidores WSGI com vários processos)
+        app.before_request(self._ensure_started)
+        models_committed.connect(self._on_models_committed, sender=app, weak=False)
+
+    def _on_models_committed(self, sender, changes):
+        if any(change.table == "jobs" for change in changes):
+            self._wake.set()
+
+    @property
+    def worker_id(self):
+        return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+    # --- Workers no processo do servidor ----------------------------------
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() or not self.app.config["JOB_WORKERS"]:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._threads = []
+            self._stop.clear()
+            for index in range(self.app.config["JOB_WORKERS"]):
+                thread = threading.Thread(
+                    target=self.run_forever, name=f"jobs-{index}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                processed = self.run_pending()
+            except Exception:
+                self.app.logger.exception("Erro no worker de tarefas")
+                processed = 0
+
+            self._prune_periodically()
+
+            if not processed:
+                self._wake.wait(self.app.config["JOB_POLL_INTERVAL"])
+                self._wake.clear()
+
+    def _prune_periodically(self):
+        # Uma limpeza por JOB_PRUNE_INTERVAL em cada processo (repetir em
+        # outro processo não faz mal: só apaga o que ainda existir)
+        now = time.monotonic()
+        interval = self.app.config["JOB_PRUNE_INTERVAL"]
+        if self._pruned_at is not None and now - self._pruned_at < interval:
+            return
+        self._pruned_at = now
+        try:
+            with self.app.app_context():
+                try:
+                    self.prune()
+                finally:
+                    db.session.remove()
+        except Exception:
+            self.app.logger.exception("Erro ao remover tarefas antigas")
+
+    # --- Execução ---------------------------------------------------------
+
+    def run_pending(self, limit=20):
+        # Executa até "limit" tarefas prontas; retorna quantas foram executadas
+        processed = 0
+        with self.app.app_context():
+            self._release_stale()
+            while processed < limit:
+                job = self._claim()
+                if job is None:
+                    break
+                self._run(job)
+                processed += 1
+            db.session.remove()
+        return processed
+
+    def _release_stale(self):
+        # Tarefas "running" de workers que morreram voltam para a fila
+        limit = datetime.utcnow() - timedelta(
+            seconds=self.app.config["JOB_LOCK_TIMEOUT"]
+        )
+        db.session.execute(
+            update(Job)
+            .where(Job.status == "running", Job.locked_at < limit)
+            .values(status="pending", locked_by=None, locked_at=None)
+        )
+        db.session.commit()
+
+    def _claim(self):
+        now = datetime.utcnow()
+        candidates = (
+            db.session.query(Job.id)
+            .filter(Job.status == "pending", Job.run_after <= now)
+            .order_by(Job.run_after, Job.id)
+            .limit(10)
+            .all()
+        )
+        for (job_id,) in candidates:
+            claimed = db.session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == "pending")
+                .values(
+                    status="running",
+                    locked_by=self.worker_id,
+                    locked_at=now,
+                    attempts=Job.attempts + 1,
+                )
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return db.session.get(Job, job_id)
+        return None
+
+    def _run(self, job):
+        func = _handlers.get(job.kind)
+        try:
+            if func is None:
+                raise LookupError(f"Tipo de tarefa desconhecido: {job.kind}")
+            func(**job.payload)
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(Job, job.id)
+            job.last_error = "".join(traceback.format_exception_only(type(e), e))
+            if job.attempts >= job.max_attempts:
+                job.status = "failed"
+                job.finished_at = datetime.utcnow()
+                current_app.logger.error(
+                    f"Tarefa {job.id} ({job.kind}) falhou definitivamente: {e}"
+                )
+            else:
+                job.status = "pending"
+                job.run_after = datetime.utcnow() + timedelta(
+                    seconds=self.app.config["JOB_RETRY_DELAY"] * 2 ** (job.attempts - 1)
+                )
+                current_app.logger.warning(
+                    f"Tarefa {job.id} ({job.kind}) falhou, nova tentativa: {e}"
+                )
+        else:
+            job.status = "done"
+            job.last_error = None
+            job.finished_at = datetime.utcnow()
+        job.locked_by = None
+        job.locked_at = None
+        db.session.commit()
+
+    def prune(self, batch_size=PRUNE_BATCH_SIZE):
+        # Remove tarefas concluídas antigas, em lotes para não segurar o lock
+        # de escrita (as que falharam ficam para análise)
+        limit = datetime.utcnow() - self.app.config["JOB_RETENTION"]
+        deleted = 0
+        while True:
+            ids = [
+                job_id
+                for (job_id,) in db.session.query(Job.id)
+                .filter(Job.status == "done", Job.finished_at < limit)
+                .limit(batch_size)
+            ]
+            if not ids:
+                return deleted
+            deleted += Job.query.filter(Job.id.in_(ids)).delete(
+                synchronize_session=False
+            )
+            db.session.commit()
+
+
+job_queue = JobQueue()
@@ -0,0 +1,399 @@
+from app import app
+import bulk
+import facets
+import jobs
+from jobs import job_queue
+from related import related_index
+from response_cache import response_cache
+from models import db, Blob, FileText, Problem, UploadSession
+from routes.upload_routes import chunk_dir
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import argparse
+import os
+import shutil
+import sys
+import tarfile
+import time
+import extraction
+import shards
+import storage
+import thumbnails
+import upload_gc
+
+
+# Gerar miniaturas para imagens enviadas antes do pipeline existir
+def backfill_thumbnails(force=False, workers=None):
+    with app.app_context():
+        upload_folder = os.path.join(app.root_path, app.config["UPLOAD_FOLDER"])
+        sizes = app.config["THUMBNAIL_SIZES"]
+        quality = app.config["THUMBNAIL_QUALITY"]
+
+        filenames = [
+            entry.name
+            for entry in shards.iter_files(upload_folder)
+            if thumbnails.is_image(entry.name)
+        ]
+        print(f"{len(filenames)} imagens encontradas em {upload_folder}")
+
+        def run(filename):
+            with app.app_context():
+                return thumbnails.generate(
+                    upload_folder, filename, sizes, quality, force=force
+                )
+
+        workers = workers or app.config["THUMBNAIL_WORKERS"]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            created = sum(executor.map(run, filenames))
+
+        print(f"{created} miniaturas geradas.")
+
+
+# Converter arquivos no formato antigo (uuid_nome) para o armazenamento
+# endereçado por conteúdo, removendo as cópias duplicadas
+def dedupe_uploads():
+    with app.app_context():
+        converted = 0
+        problem_ids = [row[0] for row in db.session.query(Problem.id).all()]
+
+        for problem_id in problem_ids:
+            problem = db.session.get(Problem, problem_id)
+            files = []
+            changed = False
+
+            for reference in problem.files:
+                if storage.parse_reference(reference) is None:
+                    path, _, original_name = storage.resolve(reference)
+                    if os.path.exists(path):
+                        with open(path, "rb") as source:
+                            new_reference = storage.store(source, original_name)
+                        storage.release(reference)
+                        reference = new_reference
+                        changed = True
+                        converted += 1
+                files.append(reference)
+
+            if changed:
+                storage.attach(problem, files)
+                db.session.commit()
+
+        print(f"{converted} arquivos convertidos.")
+
+
+# Remover sessões de upload em partes expiradas (partes e referências)
+def cleanup_uploads():
+    with app.app_context():
+        limit = datetime.utcnow() - app.config["UPLOAD_SESSION_TTL"]
+        uploads = UploadSession.query.filter(UploadSession.created_at < limit).all()
+
+        for upload in uploads:
+            if upload.status == "complete":
+                storage.release(upload.reference)
+            shutil.rmtree(chunk_dir(upload.id), ignore_errors=True)
+            db.session.delete(upload)
+        db.session.commit()
+
+        print(f"{len(uploads)} sessões de upload removidas.")
+
+
+# Recalcular as contagens por categoria, tag e autor, corrigindo divergências
+# (ex.: alterações feitas direto no banco)
+def rebuild_facets():
+    with app.app_context():
+        with db.engine.begin() as connection:
+            before = facets.snapshot(connection)
+            facets.rebuild(connection)
+            after = facets.snapshot(connection)
+        response_cache.invalidate()
+
+        drift = [
+            key
+            for key in before.keys() | after.keys()
+            if before.get(key) != after.get(key)
+        ]
+        for facet, value, subvalue in sorted(drift)[:20]:
+            name = f"{value} × {subvalue}" if subvalue else value
+            print(
+                f"{facet} {name}: {before.get((facet, value, subvalue), 0)} -> "
+                f"{after.get((facet, value, subvalue), 0)}"
+            )
+        print(f"{len(after)} contagens recalculadas; {len(drift)} corrigidas.")
+
+
+# Recalcular as listas de problemas relacionados de todos os problemas
+def rebuild_related():
+    def progress(total):
+        print(f"{total} problemas calculados...", file=sys.stderr)
+
+    with app.app_context():
+        started = time.perf_counter()
+        total = related_index.rebuild(progress=progress)
+        print(
+            f"Problemas relacionados de {total} problemas recalculados em "
+            f"{time.perf_counter() - started:.1f}s."
+        )
+
+
+# Mover os arquivos da raiz de uploads (e de thumbs) para as subpastas por
+# hash; pode rodar com o servidor no ar
+def shard_uploads(batch_size=None):
+    with app.app_context():
+        batch_size = batch_size or storage.SHARD_BATCH_SIZE
+        folder = storage.upload_folder()
+        for path in [folder, os.path.join(folder, thumbnails.THUMBNAIL_DIR)]:
+            total = 0
+            # Os ignorados continuam na raiz e reaparecem em cada lote
+            skipped = set()
+            while True:
+                moved, names = shards.migrate(path, limit=batch_size)
+                total += moved
+                skipped.update(names)
+                if not moved:
+                    break
+                print(f"{total} arquivos movidos em {path}...", file=sys.stderr)
+            print(f"{path}: {total} arquivos movidos; {len(skipped)} ignorados.")
+
+
+# Conferir a pasta de uploads com o banco: arquivos sem referência (órfãos) e
+# referências sem arquivo; com --delete, remover os órfãos
+def gc_uploads(delete=False, grace_hours=None):
+    def progress(report):
+        print(
+            f"{report.files} arquivos verificados; {report.orphans} órfãos...",
+            file=sys.stderr,
+        )
+
+    with app.app_context():
+        grace = None if grace_hours is None else timedelta(hours=grace_hours)
+        report = upload_gc.scan(delete=delete, grace=grace, progress=progress)
+
+    mb = 1024 * 1024
+    for name in report.orphan_examples:
+        print(f"Órfão: {name}")
+    for name in report.missing_examples:
+        print(f"Sem arquivo: {name}")
+    print(
+        f"{report.files} arquivos ({report.bytes / mb:.1f} MB) em "
+        f"{report.elapsed:.1f}s; {report.flat} ainda fora das subpastas."
+    )
+    print(
+        f"Órfãos: {report.orphans} ({report.orphan_bytes / mb:.1f} MB a "
+        f"recuperar); {report.recent} recentes mantidos "
+        f"({report.recent_bytes / mb:.1f} MB)."
+    )
+    print(f"Referências sem arquivo: {report.missing}.")
+    if delete:
+        print(f"Removidos: {report.removed} ({report.removed_bytes / mb:.1f} MB).")
+    elif report.orphans:
+        print("Use --delete para remover os órfãos.")
+
+
+# Agendar a extração de texto dos anexos já enviados (os que ainda não têm
+# texto, ou todos com --force); as tarefas rodam no worker
+def extract_texts(force=False):
+    with app.app_context():
+        extracted = {sha256 for (sha256,) in db.session.query(FileText.sha256)}
+        scheduled = 0
+        for blob in Blob.query.filter(Blob.ref_count > 0).yield_per(1000):
+            if not extraction.supported(blob.storage_name):
+                continue
+            if force or blob.sha256 not in extracted:
+                jobs.enqueue("extract_text", sha256=blob.sha256, force=force)
+                scheduled += 1
+        db.session.commit()
+        print(f"{scheduled} extrações agendadas.")
+
+
+# Executar as tarefas em segundo plano fora do servidor web
+def run_worker(once=False):
+    print("Worker de tarefas iniciado.")
+    if once:
+        processed = job_queue.run_pending(limit=1000)
+        print(f"{processed} tarefas executadas.")
+        return
+
+    try:
+        job_queue.run_forever()
+    except KeyboardInterrupt:
+        job_queue.stop()
+
+
+# Remover as tarefas concluídas há mais de JOB_RETENTION (ou --days)
+def prune_jobs(days=None):
+    with app.app_context():
+        if days is not None:
+            app.config["JOB_RETENTION"] = timedelta(days=days)
+        deleted = job_queue.prune()
+        print(f"{deleted} tarefas concluídas removidas.")
+
+
+# Exportar a base em NDJSON (ou tar com os arquivos) para um arquivo ou stdout
+def export_problems(output=None, with_files=False, batch_size=None):
+    with app.app_context():
+        batch_size = batch_size or bulk.EXPORT_BATCH_SIZE
+        chunks = (
+            bulk.iter_tar(batch_size) if with_files else bulk.iter_ndjson(batch_size)
+        )
+        target = open(output, "wb") if output else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                target.write(chunk)
+        finally:
+            if output:
+                target.close()
+
+
+# Importar problemas de um NDJSON ou de um tar gerado pela exportação
+def import_problems(path, files_dir=None, batch_size=None, default_author="admin"):
+    def progress(result):
+        print(
+            f"{result.imported} problemas importados ({result.rate:.0f}/s)",
+            file=sys.stderr,
+        )
+
+    with app.app_context():
+        archive = tarfile.open(path) if tarfile.is_tarfile(path) else None
+        try:
+            if archive is not None:
+                lines = archive.extractfile(bulk.NDJSON_MEMBER)
+                open_file = bulk.tar_opener(archive)
+            else:
+                lines = open(path, "rb")
+                open_file = bulk.directory_opener(files_dir) if files_dir else None
+
+            with lines:
+                result = bulk.import_records(
+                    lines,
+                    open_file=open_file,
+                    batch_size=batch_size or bulk.IMPORT_BATCH_SIZE,
+                    default_author=default_author,
+                    progress=progress,
+                )
+        finally:
+            if archive is not None:
+                archive.close()
+
+        for number, reason in result.skipped[:20]:
+            print(f"Linha {number} ignorada: {reason}", file=sys.stderr)
+        print(
+            f"{result.imported} problemas importados em {result.elapsed:.1f}s "
+            f"({result.rate:.0f}/s); {len(result.skipped)} linhas ignoradas; "
+            f"{result.missing_files} arquivos não encontrados."
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tarefas de manutenção da wiki")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser(
+        "backfill-thumbnails", help="Gerar miniaturas das imagens já enviadas"
+    )
+    backfill.add_argument(
+        "--force", action="store_true", help="Regerar miniaturas existentes"
+    )
+    backfill.add_argument("--workers", type=int, help="Número de threads")
+
+    commands.add_parser(
+        "dedupe-uploads",
+        help="Converter arquivos antigos para o armazenamento por conteúdo",
+    )
+
+    commands.add_parser(
+        "cleanup-uploads", help="Remover sessões de upload em partes expiradas"
+    )
+
+    commands.add_parser(
+        "rebuild-facets", help="Recalcular as contagens por categoria, tag e autor"
+    )
+
+    commands.add_parser(
+        "rebuild-related", help="Recalcular os problemas relacionados de todos"
+    )
+
+    shard = commands.add_parser(
+        "shard-uploads", help="Mover os arquivos enviados para as subpastas por hash"
+    )
+    shard.add_argument("--batch-size", type=int, help="Arquivos por lote")
+
+    gc = commands.add_parser(
+        "gc-uploads",
+        help="Conferir a pasta de uploads com o banco e remover arquivos órfãos",
+    )
+    gc.add_argument("--delete", action="store_true", help="Remover os órfãos")
+    gc.add_argument(
+        "--grace-hours",
+        type=float,
+        help="Idade mínima dos órfãos removidos (padrão: UPLOAD_GC_GRACE)",
+    )
+
+    extract = commands.add_parser(
+        "extract-texts", help="Extrair o texto dos anexos já enviados para a busca"
+    )
+    extract.add_argument(
+        "--force", action="store_true", help="Extrair de novo os que já têm texto"
+    )
+
+    worker = commands.add_parser("worker", help="Executar a fila de tarefas")
+    worker.add_argument(
+        "--once", action="store_true", help="Executar as tarefas pendentes e sair"
+    )
+
+    prune = commands.add_parser(
+        "prune-jobs", help="Remover as tarefas concluídas antigas da fila"
+    )
+    prune.add_argument(
+        "--days",
+        type=float,
+        help="Idade mínima das tarefas removidas (padrão: JOB_RETENTION)",
+    )
+
+    export = commands.add_parser(
+        "export", help="Exportar os problemas em NDJSON (ou tar com --files)"
+    )
+    export.add_argument("--output", "-o", help="Arquivo de saída (padrão: stdout)")
+    export.add_argument(
+        "--files", action="store_true", help="Gerar tar com os arquivos anexados"
+    )
+    export.add_argument("--batch-size", type=int, help="Problemas por consulta")
+
+    import_ = commands.add_parser(
+        "import", help="Importar problemas de um NDJSON ou tar exportado"
+    )
+    import_.add_argument("path", help="Arquivo .ndjson ou .tar")
+    import_.add_argument(
+        "--files-dir", help="Pasta com os arquivos (para NDJSON com anexos)"
+    )
+    import_.add_argument("--batch-size", type=int, help="Problemas por transação")
+    import_.add_argument(
+        "--default-author",
+        default="admin",
+        help="Usuário dos problemas com autor desconhecido",
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "backfill-thumbnails":
+        backfill_thumbnails(force=args.force, workers=args.workers)
+    elif args.command == "dedupe-uploads":
+        dedupe_uploads()
+    elif args.command == "cleanup-uploads":
+        cleanup_uploads()
+    elif args.command == "rebuild-facets":
+        rebuild_facets()
+    elif args.command == "rebuild-related":
+        rebuild_related()
+    elif args.command == "shard-uploads":
+        shard_uploads(args.batch_size)
+    elif args.command == "gc-uploads":
+        gc_uploads(delete=args.delete, grace_hours=args.grace_hours)
+    elif args.command == "extract-texts":
+        extract_texts(force=args.force)
+    elif args.command == "worker":
+        run_worker(once=args.once)
+    elif args.command == "prune-jobs":
+        prune_jobs(args.days)
+    elif args.command == "export":
+        export_problems(args.output, args.files, args.batch_size)
+    elif args.command == "import":
+        import_problems(args.path, args.files_dir, args.batch_size, args.default_author)
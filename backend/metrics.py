@@ -0,0 +1,445 @@
+# Métricas da aplicação no formato de texto do Prometheus (/api/metrics).
+#   - latência das requisições por rota, método e status (histograma)
+#   - comandos SQL e tempo no banco por requisição (via query_counter)
+#   - bytes recebidos no corpo das requisições e bytes gravados em uploads
+#   - bytes enviados pelo serviço de arquivos (file_serving)
+# Os valores ficam na memória de cada processo. Com METRICS_BACKEND="sqlite",
+# cada worker grava periodicamente um retrato dos seus valores em um arquivo
+# SQLite local e o endpoint soma os retratos de todos os workers da máquina
+# (inclusive os que já foram reciclados, para que os contadores não voltem).
+# Com SLOW_REQUEST_MS, requisições mais lentas que o limite são registradas no
+# log junto com os comandos SQL mais demorados.
+import hmac
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+
+from flask import Response, current_app, g, jsonify, request
+from flask_login import current_user
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# nome: (tipo, descrição, rótulos, buckets)
+METRICS = {
+    "http_requests_total": (
+        "counter",
+        "Requisições atendidas",
+        ("route", "method", "status"),
+        None,
+    ),
+    "http_request_duration_seconds": (
+        "histogram",
+        "Tempo de resposta das requisições",
+        ("route", "method", "status"),
+        LATENCY_BUCKETS,
+    ),
+    "http_request_queries": (
+        "histogram",
+        "Comandos SQL por requisição",
+        ("route", "method"),
+        QUERY_BUCKETS,
+    ),
+    "db_queries_total": (
+        "counter",
+        "Comandos SQL executados nas requisições",
+        ("route", "method"),
+        None,
+    ),
+    "db_query_duration_seconds_total": (
+        "counter",
+        "Tempo gasto no banco de dados nas requisições",
+        ("route", "method"),
+        None,
+    ),
+    "http_request_body_bytes_total": (
+        "counter",
+        "Bytes recebidos no corpo das requisições",
+        ("route", "method"),
+        None,
+    ),
+    "upload_bytes_total": (
+        "counter",
+        "Bytes de arquivos enviados gravados no armazenamento",
+        (),
+        None,
+    ),
+    "file_serving_responses_total": (
+        "counter",
+        "Arquivos e miniaturas servidos",
+        ("mode",),
+        None,
+    ),
+    "file_serving_bytes_total": (
+        "counter",
+        "Bytes de arquivos servidos (tamanho do arquivo nos modos x-accel e "
+        "x-sendfile)",
+        ("mode",),
+        None,
+    ),
+}
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Registry:
+    # Valores de um processo: {(nome, rótulos): valor} para contadores e
+    # {(nome, rótulos): [contagem por bucket..., soma, total]} para histogramas
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1, labels=()):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels=()):
+        buckets = METRICS[name][3]
+        key = (name, labels)
+        with self._lock:
+            values = self.histograms.get(key)
+            if values is None:
+                values = self.histograms[key] = [0] * len(buckets) + [0.0, 0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    values[index] += 1
+                    break
+            values[-2] += value
+            values[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return (
+                dict(self.counters),
+                {key: list(values) for key, values in self.histograms.items()},
+            )
+
+    def merge(self, snapshot):
+        counters, histograms = snapshot
+        with self._lock:
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, values in histograms.items():
+                current = self.histograms.get(key)
+                if current is None:
+                    self.histograms[key] = list(values)
+                else:
+                    for index, value in enumerate(values):
+                        current[index] += value
+
+
+class SQLiteStore:
+    # Retratos dos registros de cada processo em um arquivo compartilhado
+    ARCHIVE = "archive"
+
+    def __init__(self, path, stale_after=600):
+        self.path = path
+        self.stale_after = stale_after
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS metrics ("
+            "instance TEXT PRIMARY KEY, pid INTEGER, snapshot BLOB NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+
+    def _connection(self):
+        # Uma conexão por thread e por processo (não reaproveitar após fork)
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def save(self, instance, snapshot):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO metrics (instance, pid, snapshot, updated_at) "
+            "VALUES (?, ?, ?, ?)",
+            (
+                instance,
+                os.getpid(),
+                pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL),
+                time.time(),
+            ),
+        )
+
+    def load_all(self):
+        self._compact()
+        registry = Registry()
+        for (snapshot,) in self._connection().execute("SELECT snapshot FROM metrics"):
+            registry.merge(pickle.loads(snapshot))
+        return registry
+
+    def _compact(self):
+        # Retratos de processos que já terminaram são somados em uma única
+        # linha, para que a tabela não cresça com a reciclagem dos workers
+        connection = self._connection()
+        rows = connection.execute(
+            "SELECT instance, pid, snapshot FROM metrics "
+            "WHERE instance != ? AND updated_at < ?",
+            (self.ARCHIVE, time.time() - self.stale_after),
+        ).fetchall()
+        finished = [row for row in rows if not _process_alive(row[1])]
+        if not finished:
+            return
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            registry = Registry()
+            archive = connection.execute(
+                "SELECT snapshot FROM metrics WHERE instance = ?", (self.ARCHIVE,)
+            ).fetchone()
+            if archive is not None:
+                registry.merge(pickle.loads(archive[0]))
+            for instance, _, snapshot in finished:
+                deleted = connection.execute(
+                    "DELETE FROM metrics WHERE instance = ?", (instance,)
+                ).rowcount
+                if deleted:
+                    registry.merge(pickle.loads(snapshot))
+            connection.execute(
+                "INSERT OR REPLACE INTO metrics (instance, pid, snapshot, updated_at) "
+                "VALUES (?, NULL, ?, ?)",
+                (
+                    self.ARCHIVE,
+                    pickle.dumps(registry.snapshot(), pickle.HIGHEST_PROTOCOL),
+                    time.time(),
+                ),
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Metrics:
+    def __init__(self):
+        self.registry = Registry()
+        self.store = None
+        self.flush_interval = 5
+        self._instance = uuid.uuid4().hex
+        self._last_flush = 0.0
+        # Os valores herdados no fork (gunicorn com preload_app) pertencem ao
+        # processo pai
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self.registry = Registry()
+        self._instance = uuid.uuid4().hex
+        self._last_flush = 0.0
+
+    def init_app(self, app):
+        app.config.setdefault("METRICS_ENABLED", True)
+        app.config.setdefault("METRICS_TOKEN", None)
+        app.config.setdefault("METRICS_BACKEND", "memory")
+        app.config.setdefault("METRICS_FLUSH_INTERVAL", 5)
+        app.config.setdefault("SLOW_REQUEST_MS", None)
+        app.config.setdefault("SLOW_REQUEST_MAX_QUERIES", 10)
+        app.extensions["metrics"] = self
+        if not app.config["METRICS_ENABLED"]:
+            return
+
+        self.flush_interval = app.config["METRICS_FLUSH_INTERVAL"]
+        backend = app.config["METRICS_BACKEND"]
+        if backend == "sqlite":
+            path = app.config.get("METRICS_SQLITE_PATH") or os.path.join(
+                app.instance_path, "metrics.sqlite3"
+            )
+            self.store = SQLiteStore(path)
+        elif backend != "memory":
+            raise ValueError(f"Backend de métricas desconhecido: {backend}")
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    # --- Registro dos valores ---------------------------------------------
+
+    def inc(self, name, amount=1, **labels):
+        self.registry.inc(name, amount, self._labels(name, labels))
+
+    def observe(self, name, value, **labels):
+        self.registry.observe(name, value, self._labels(name, labels))
+
+    def _labels(self, name, labels):
+        return tuple(str(labels[label]) for label in METRICS[name][2])
+
+    def file_served(self, mode, nbytes):
+        self.inc("file_serving_responses_total", mode=mode)
+        self.inc("file_serving_bytes_total", nbytes, mode=mode)
+
+    # --- Integração com as requisições do Flask ---------------------------
+
+    def _start_request(self):
+        g.metrics_started = time.perf_counter()
+
+    def _finish_request(self, response):
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        method = request.method
+        status = response.status_code
+        self.inc("http_requests_total", route=route, method=method, status=status)
+        self.observe(
+            "http_request_duration_seconds",
+            elapsed,
+            route=route,
+            method=method,
+            status=status,
+        )
+        if request.content_length:
+            self.inc(
+                "http_request_body_bytes_total",
+                request.content_length,
+                route=route,
+                method=method,
+            )
+
+        counter = g.get("query_count")
+        if counter is not None:
+            self.observe(
+                "http_request_queries", counter.count, route=route, method=method
+            )
+            self.inc("db_queries_total", counter.count, route=route, method=method)
+            self.inc(
+                "db_query_duration_seconds_total",
+                counter.duration,
+                route=route,
+                method=method,
+            )
+
+        threshold = current_app.config["SLOW_REQUEST_MS"]
+        if threshold is not None and elapsed * 1000 >= threshold:
+            self._log_slow_request(elapsed, status, counter)
+
+        if self.store is not None and time.monotonic() - self._last_flush >= (
+            self.flush_interval
+        ):
+            self.flush()
+        return response
+
+    def _log_slow_request(self, elapsed, status, counter):
+        lines = [
+            "Requisição lenta: %s %s -> %s em %.0f ms"
+            % (request.method, request.full_path.rstrip("?"), status, elapsed * 1000)
+        ]
+        if counter is not None and counter.count:
+            lines.append(
+                "%d comandos SQL em %.0f ms; mais demorados:"
+                % (counter.count, counter.duration * 1000)
+            )
+            limit = current_app.config["SLOW_REQUEST_MAX_QUERIES"]
+            for seconds, statement in counter.slowest(limit):
+                lines.append("  [%.1f ms] %s" % (seconds * 1000, statement))
+        current_app.logger.warning("\n".join(lines))
+
+    # --- Agregação entre processos ----------------------------------------
+
+    def flush(self):
+        # Grava o retrato deste processo (sem efeito com o backend "memory")
+        if self.store is None:
+            return
+        self._last_flush = time.monotonic()
+        self.store.save(self._instance, self.registry.snapshot())
+
+    def collect(self):
+        if self.store is None:
+            return self.registry
+        self.flush()
+        return self.store.load_all()
+
+    def render(self):
+        registry = self.collect()
+        counters, histograms = registry.snapshot()
+        lines = []
+        for name, (kind, description, label_names, buckets) in METRICS.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(
+                            f"{name}{_format_labels(label_names, labels)} "
+                            f"{_format_value(value)}"
+                        )
+                continue
+
+            for (metric, labels), values in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, values):
+                    cumulative += count
+                    bucket_labels = _format_labels(
+                        label_names + ("le",), labels + (_format_value(bound),)
+                    )
+                    lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                bucket_labels = _format_labels(
+                    label_names + ("le",), labels + ("+Inf",)
+                )
+                lines.append(f"{name}_bucket{bucket_labels} {values[-1]}")
+                formatted = _format_labels(label_names, labels)
+                lines.append(f"{name}_sum{formatted} {_format_value(values[-2])}")
+                lines.append(f"{name}_count{formatted} {values[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+def metrics_endpoint():
+    if not current_app.config["METRICS_ENABLED"]:
+        return jsonify({"error": "Métricas desativadas"}), 404
+
+    # Token para o Prometheus; sem token configurado, só administradores
+    token = current_app.config["METRICS_TOKEN"]
+    if token:
+        authorization = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(authorization, f"Bearer {token}"):
+            return jsonify({"error": "Não autorizado"}), 401
+    elif not current_user.is_authenticated or current_user.role != "admin":
+        return jsonify({"error": "Não autorizado"}), 403
+
+    response = Response(metrics.render(), content_type=CONTENT_TYPE)
+    response.cache_control.no_store = True
+    return response
+
+
+metrics = Metrics()
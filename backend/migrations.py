@@ -0,0 +1,317 @@
+# Ajustes de esquema para bancos já existentes.
+# db.create_all() só cria tabelas novas, então colunas, índices e estruturas
+# auxiliares adicionados depois são aplicados aqui. Todos os passos podem ser
+# executados mais de uma vez.
+import json
+import os
+from datetime import datetime
+
+from sqlalchemy import exists, inspect, select, text
+
+import facets
+import shards
+import storage
+import thumbnails
+from models import (
+    Attachment,
+    Blob,
+    FacetCount,
+    FileText,
+    Job,
+    Problem,
+    RelatedProblem,
+    Tag,
+    db,
+    parse_tags,
+    problem_tags,
+)
+from search import search_index
+
+MIGRATION_BATCH_SIZE = 500
+
+
+def add_missing_columns(connection):
+    # Colunas declaradas nos modelos depois que as tabelas já existiam (só as
+    # que aceitam NULL; o valor das linhas antigas é preenchido em seguida)
+    inspector = inspect(connection)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(
+                text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+            )
+
+
+def widen_columns(connection):
+    # Colunas de texto aumentadas nos modelos depois que as tabelas já
+    # existiam (ex.: users.password_hash, para hashes scrypt). O SQLite não
+    # limita o tamanho de VARCHAR (nem altera colunas), então fica como está.
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        return
+    inspector = inspect(connection)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {
+            column["name"]: getattr(column["type"], "length", None)
+            for column in inspector.get_columns(table.name)
+        }
+        for column in table.columns:
+            length = getattr(column.type, "length", None)
+            current = existing.get(column.name)
+            if length is None or current is None or current >= length:
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            if dialect == "mysql":
+                nullable = "NULL" if column.nullable else "NOT NULL"
+                statement = (
+                    f"ALTER TABLE {table.name} MODIFY {column.name} "
+                    f"{column_type} {nullable}"
+                )
+            else:
+                statement = (
+                    f"ALTER TABLE {table.name} ALTER COLUMN {column.name} "
+                    f"TYPE {column_type}"
+                )
+            connection.execute(text(statement))
+
+
+def create_missing_indexes(connection):
+    # Índices declarados nos modelos depois que as tabelas já existiam
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def migrate_tags(connection):
+    # Popular a tabela de tags a partir da string separada por vírgulas dos
+    # problemas que ainda não têm associações
+    problems = Problem.__table__
+    tags = Tag.__table__
+
+    rows = connection.execute(
+        select(problems.c.id, problems.c.tags).where(
+            ~exists().where(problem_tags.c.problem_id == problems.c.id)
+        )
+    ).all()
+    if not rows:
+        return
+
+    names_by_problem = {problem_id: parse_tags(value) for problem_id, value in rows}
+    all_names = {name for names in names_by_problem.values() for name in names}
+
+    tag_ids = dict(connection.execute(select(tags.c.name, tags.c.id)).all())
+    missing = [{"name": name} for name in sorted(all_names - set(tag_ids))]
+    if missing:
+        connection.execute(tags.insert(), missing)
+        tag_ids = dict(connection.execute(select(tags.c.name, tags.c.id)).all())
+
+    links = [
+        {"problem_id": problem_id, "tag_id": tag_ids[name]}
+        for problem_id, names in names_by_problem.items()
+        for name in names
+    ]
+    if links:
+        connection.execute(problem_tags.insert(), links)
+
+
+def migrate_attachments(connection):
+    # Levar as listas JSON de problems.files_json (coluna antiga) para a
+    # tabela attachments, calculando os metadados de cada arquivo uma vez.
+    # As listas migradas são apagadas, então o passo pode ser repetido.
+    columns = {column["name"] for column in inspect(connection).get_columns("problems")}
+    if "files_json" not in columns:
+        return
+
+    blobs = Blob.__table__
+    attachments = Attachment.__table__
+    while True:
+        rows = connection.execute(
+            text(
+                "SELECT id, files_json FROM problems "
+                "WHERE files_json IS NOT NULL AND files_json NOT IN ('', '[]') "
+                "ORDER BY id LIMIT :limit"
+            ),
+            {"limit": MIGRATION_BATCH_SIZE},
+        ).all()
+        if not rows:
+            return
+
+        references = {}
+        for problem_id, files_json in rows:
+            try:
+                value = json.loads(files_json)
+            except ValueError:
+                value = []
+            references[problem_id] = [item for item in value if isinstance(item, str)]
+
+        # Blobs do lote em uma consulta (pela própria conexão da migração)
+        hashes = {
+            parsed[0]
+            for items in references.values()
+            for parsed in map(storage.parse_reference, items)
+            if parsed is not None
+        }
+        blob_rows = {
+            row.sha256: row
+            for row in connection.execute(
+                select(blobs.c.sha256, blobs.c.extension, blobs.c.size).where(
+                    blobs.c.sha256.in_(hashes)
+                )
+            )
+        }
+
+        values = []
+        for problem_id, items in references.items():
+            for position, reference in enumerate(items):
+                parsed = storage.parse_reference(reference)
+                blob = blob_rows.get(parsed[0]) if parsed is not None else None
+                if blob is not None:
+                    storage_name = f"{blob.sha256}.{blob.extension}"
+                    fields = {
+                        "storage_name": storage_name,
+                        "original_name": parsed[1],
+                        "sha256": blob.sha256,
+                    }
+                    fields.update(
+                        storage.file_metadata(storage_name, blob.sha256, blob.size)
+                    )
+                else:
+                    storage_name = storage.reference_name(reference)
+                    fields = {
+                        "storage_name": storage_name,
+                        "original_name": (
+                            storage_name.split("_", 1)[1]
+                            if "_" in storage_name
+                            else storage_name
+                        ),
+                        "sha256": None,
+                    }
+                    fields.update(storage.file_metadata(storage_name))
+                fields.update(
+                    problem_id=problem_id, position=position, reference=reference
+                )
+                values.append(fields)
+
+        if values:
+            connection.execute(attachments.insert(), values)
+        connection.execute(
+            text("UPDATE problems SET files_json = NULL WHERE id IN :ids").bindparams(
+                db.bindparam("ids", expanding=True)
+            ),
+            {"ids": list(references)},
+        )
+
+
+def fill_updated_at(connection):
+    # Problemas anteriores à coluna updated_at: a última alteração conhecida é
+    # a criação
+    problems = Problem.__table__
+    connection.execute(
+        problems.update()
+        .where(problems.c.updated_at.is_(None))
+        .values(updated_at=db.func.coalesce(problems.c.created_at, datetime.utcnow()))
+    )
+
+
+def populate_facets(connection):
+    # Contagens das facetas em bancos criados antes da tabela facet_counts
+    has_counts = connection.execute(select(FacetCount.__table__.c.facet).limit(1))
+    if has_counts.first() is None:
+        facets.rebuild(connection)
+
+
+def schedule_related(connection):
+    # Listas de problemas relacionados ainda não calculadas: agendar o cálculo
+    # completo na fila de tarefas (ou "python manage.py rebuild-related")
+    jobs = Job.__table__
+    pending = connection.execute(
+        select(jobs.c.id)
+        .where(jobs.c.kind == "rebuild_related", jobs.c.status == "pending")
+        .limit(1)
+    ).first()
+    has_lists = connection.execute(
+        select(RelatedProblem.__table__.c.problem_id).limit(1)
+    ).first()
+    has_problems = connection.execute(select(Problem.__table__.c.id).limit(1)).first()
+    if pending is None and has_lists is None and has_problems is not None:
+        connection.execute(jobs.insert().values(kind="rebuild_related"))
+
+
+def schedule_extraction(connection):
+    # PDFs enviados antes da extração de texto: uma tarefa por arquivo, só na
+    # primeira vez (imagens e novas tentativas: "python manage.py extract-texts")
+    if connection.execute(select(FileText.__table__.c.sha256).limit(1)).first():
+        return
+    jobs = Job.__table__
+    pending = connection.execute(
+        select(jobs.c.id).where(jobs.c.kind == "extract_text").limit(1)
+    ).first()
+    if pending is not None:
+        return
+
+    blobs = Blob.__table__
+    hashes = connection.execute(
+        select(blobs.c.sha256).where(blobs.c.extension == "pdf", blobs.c.ref_count > 0)
+    ).scalars()
+    values = [
+        {"kind": "extract_text", "payload_json": json.dumps({"sha256": sha256})}
+        for sha256 in hashes
+    ]
+    if values:
+        connection.execute(jobs.insert(), values)
+
+
+def schedule_sharding(connection):
+    # Arquivos gravados na raiz de uploads antes das subpastas: migração em
+    # segundo plano (ou "python manage.py shard-uploads")
+    folder = storage.upload_folder()
+    if not (
+        shards.has_flat_files(folder)
+        or shards.has_flat_files(os.path.join(folder, thumbnails.THUMBNAIL_DIR))
+    ):
+        return
+    jobs = Job.__table__
+    pending = connection.execute(
+        select(jobs.c.id)
+        .where(jobs.c.kind == "shard_uploads", jobs.c.status == "pending")
+        .limit(1)
+    ).first()
+    if pending is None:
+        connection.execute(jobs.insert().values(kind="shard_uploads"))
+
+
+def upgrade():
+    with db.engine.begin() as connection:
+        # Colunas novas antes dos índices que as usam
+        add_missing_columns(connection)
+        widen_columns(connection)
+        fill_updated_at(connection)
+        create_missing_indexes(connection)
+
+        # Índice de busca textual (criado e populado se ainda não existir)
+        search_index.ensure(connection)
+
+        # Tags normalizadas a partir da coluna problems.tags
+        migrate_tags(connection)
+
+        # Anexos a partir da coluna antiga problems.files_json
+        migrate_attachments(connection)
+
+        # Contagens por categoria, tag e autor
+        populate_facets(connection)
+
+        # Cálculo inicial dos problemas relacionados
+        schedule_related(connection)
+
+        # Texto dos PDFs já enviados, para a busca
+        schedule_extraction(connection)
+
+        # Arquivos da raiz de uploads para as subpastas por hash
+        schedule_sharding(connection)
@@ -1,4 +1,6 @@
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import IntegrityError
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from datetime import datetime
@@ -7,19 +9,53 @@ import json
 db = SQLAlchemy()
 
 
+def parse_tags(value):
+    # Separar a string de tags por vírgula, sem vazios nem repetições
+    names = []
+    for name in (value or "").split(","):
+        name = name.strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+# Associação problema <-> tag; a chave primária atende as buscas por problema
+# e o índice em tag_id atende os filtros por tag
+problem_tags = db.Table(
+    "problem_tags",
+    db.Column(
+        "problem_id",
+        db.Integer,
+        db.ForeignKey("problems.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    db.Column(
+        "tag_id",
+        db.Integer,
+        db.ForeignKey("tags.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    db.Index("ix_problem_tags_tag_id", "tag_id", "problem_id"),
+)
+
+
 class User(db.Model, UserMixin):
     __tablename__ = "users"
 
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
+    # Hashes scrypt e pbkdf2:sha512 passam de 160 caracteres
+    password_hash = db.Column(db.String(255), nullable=False)
     role = db.Column(
         db.String(20), nullable=False, default="user"
     )  # admin, tecnico, user
     problems = db.relationship("Problem", backref="author", lazy=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        # Algoritmo e custo definidos em PASSWORD_HASH_METHOD
+        self.password_hash = generate_password_hash(
+            password, method=current_app.config["PASSWORD_HASH_METHOD"]
+        )
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -34,25 +70,44 @@ class Problem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
-    category = db.Column(db.String(100), nullable=False)
+    category = db.Column(db.String(100), nullable=False, index=True)
     tags = db.Column(db.String(200), nullable=False)  # Tags separadas por vírgula
-    files_json = db.Column(
-        db.Text, default="[]"
-    )  # Lista de caminhos de arquivos em JSON
+    tag_items = db.relationship(
+        "Tag", secondary=problem_tags, backref=db.backref("problems", lazy=True)
+    )
+    attachments = db.relationship(
+        "Attachment",
+        order_by="Attachment.position",
+        cascade="all, delete-orphan",
+        lazy=True,
+    )
     youtubeLink = db.Column(db.String(255), nullable=True)  # URL do vídeo do YouTube
     author_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Atualizado a cada alteração do problema, das tags ou dos anexos
+    # (changes.py)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Índices da paginação por chave (created_at, id) e do feed de alterações
+    # (updated_at, id)
+    __table_args__ = (
+        db.Index("ix_problems_created_at_id", "created_at", "id"),
+        db.Index("ix_problems_updated_at_id", "updated_at", "id"),
+    )
+
+    # Tamanho do trecho da descrição enviado na listagem resumida
+    EXCERPT_LENGTH = 200
+
+    def set_tags(self, value):
+        # Mantém a string (usada em to_dict) e a tabela de tags sincronizadas
+        names = parse_tags(value)
+        self.tags = ",".join(names)
+        self.tag_items = Tag.get_or_create_all(names)
 
     @property
     def files(self):
-        try:
-            return json.loads(self.files_json)
-        except:
-            return []
-
-    @files.setter
-    def files(self, value):
-        self.files_json = json.dumps(value)
+        # Referências dos anexos (alteradas com storage.attach)
+        return [attachment.reference for attachment in self.attachments]
 
     def to_dict(self):
         return {
@@ -60,10 +115,310 @@ class Problem(db.Model):
             "title": self.title,
             "description": self.description,
             "category": self.category,
-            "tags": self.tags.split(","),
+            "tags": parse_tags(self.tags),
             "files": self.files,
+            "attachments": [attachment.to_dict() for attachment in self.attachments],
             "youtubeLink": self.youtubeLink,
             "author": self.author.username,
             "author_id": self.author_id,
             "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat(),
+        }
+
+    @classmethod
+    def summary_columns(cls):
+        # Somente as colunas que a listagem usa: sem a descrição completa e
+        # sem arquivos, com o nome do autor vindo do join com users
+        return [
+            cls.id,
+            cls.title,
+            cls.category,
+            cls.tags,
+            cls.youtubeLink,
+            cls.author_id,
+            cls.created_at,
+            cls.updated_at,
+            db.func.substr(cls.description, 1, cls.EXCERPT_LENGTH).label("excerpt"),
+            User.username.label("author"),
+        ]
+
+    @staticmethod
+    def summary_to_dict(row):
+        return {
+            "id": row.id,
+            "title": row.title,
+            "excerpt": row.excerpt,
+            "category": row.category,
+            "tags": parse_tags(row.tags),
+            "youtubeLink": row.youtubeLink,
+            "author": row.author,
+            "author_id": row.author_id,
+            "created_at": row.created_at.isoformat(),
+            "updated_at": row.updated_at.isoformat(),
+        }
+
+
+class Tag(db.Model):
+    __tablename__ = "tags"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+
+    @classmethod
+    def get_or_create_all(cls, names):
+        if not names:
+            return []
+
+        with db.session.no_autoflush:
+            existing = {tag.name: tag for tag in cls.query.filter(cls.name.in_(names))}
+
+        tags = []
+        for name in names:
+            tag = existing.get(name)
+            if tag is None:
+                tag = cls(name=name)
+                try:
+                    with db.session.begin_nested():
+                        db.session.add(tag)
+                except IntegrityError:
+                    # Outra requisição criou a mesma tag ao mesmo tempo
+                    tag = cls.query.filter_by(name=name).one()
+                existing[name] = tag
+            tags.append(tag)
+        return tags
+
+
+class FacetCount(db.Model):
+    # Quantidade de problemas por faceta, mantida a cada flush (facets.py).
+    # Facetas: category, tag e author (value é a categoria, a tag ou o id do
+    # autor; subvalue vazio) e category_tag (value é a categoria e subvalue
+    # a tag)
+    __tablename__ = "facet_counts"
+
+    facet = db.Column(db.String(20), primary_key=True)
+    value = db.Column(db.String(100), primary_key=True)
+    subvalue = db.Column(db.String(100), primary_key=True, default="")
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class RelatedProblem(db.Model):
+    # Problemas mais parecidos com cada problema, pré-calculados por
+    # related.py (rank 0 é o mais parecido)
+    __tablename__ = "related_problems"
+
+    problem_id = db.Column(
+        db.Integer, db.ForeignKey("problems.id", ondelete="CASCADE"), primary_key=True
+    )
+    related_id = db.Column(
+        db.Integer, db.ForeignKey("problems.id", ondelete="CASCADE"), primary_key=True
+    )
+    rank = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_related_problems_problem_id_rank", "problem_id", "rank"),
+        # Quem lista um problema (para recalcular quando ele muda)
+        db.Index("ix_related_problems_related_id", "related_id"),
+    )
+
+
+class ProblemTombstone(db.Model):
+    # Problemas excluídos, para que o feed de alterações (changes.py) informe
+    # as exclusões; guardados por CHANGES_TOMBSTONE_TTL
+    __tablename__ = "problem_tombstones"
+
+    problem_id = db.Column(db.Integer, primary_key=True)  # sem FK: já excluído
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_problem_tombstones_deleted_at", "deleted_at", "problem_id"),
+    )
+
+
+class ProblemEvent(db.Model):
+    # Criação, alteração ou exclusão de um problema, enviada aos clientes
+    # conectados em /api/problems/events (broadcast.py); o ID é o ID do
+    # evento SSE, guardado por SSE_EVENT_TTL para a retomada com Last-Event-ID
+    __tablename__ = "problem_events"
+
+    id = db.Column(db.Integer, primary_key=True)
+    problem_id = db.Column(db.Integer, nullable=False)  # sem FK: exclusões
+    action = db.Column(db.String(10), nullable=False)  # created, updated, deleted
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # AUTOINCREMENT: IDs nunca reaproveitados, mesmo depois da limpeza
+    __table_args__ = (
+        db.Index("ix_problem_events_created_at", "created_at"),
+        {"sqlite_autoincrement": True},
+    )
+
+
+class Blob(db.Model):
+    # Conteúdo de um arquivo enviado, guardado uma única vez pelo SHA-256 e
+    # compartilhado entre todos os problemas que o referenciam
+    __tablename__ = "blobs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    extension = db.Column(db.String(10), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    original_name = db.Column(db.String(255), nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def storage_name(self):
+        return f"{self.sha256}.{self.extension}"
+
+
+class Attachment(db.Model):
+    # Arquivo anexado a um problema, com os metadados calculados uma única vez
+    # ao anexar: listagens e o envio dos arquivos não precisam acessar o disco
+    __tablename__ = "attachments"
+
+    id = db.Column(db.Integer, primary_key=True)
+    problem_id = db.Column(
+        db.Integer, db.ForeignKey("problems.id", ondelete="CASCADE"), nullable=False
+    )
+    position = db.Column(db.Integer, nullable=False, default=0)
+    reference = db.Column(db.String(400), nullable=False, index=True)
+    storage_name = db.Column(
+        db.String(255), nullable=False, index=True
+    )  # nome na pasta
+    original_name = db.Column(db.String(255), nullable=False)
+    sha256 = db.Column(db.String(64), nullable=True, index=True)  # None: antigos
+    size = db.Column(db.BigInteger, nullable=True)
+    mime_type = db.Column(db.String(100), nullable=False)
+    width = db.Column(db.Integer, nullable=True)  # imagens
+    height = db.Column(db.Integer, nullable=True)
+    page_count = db.Column(db.Integer, nullable=True)  # PDFs
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_attachments_problem_id_position", "problem_id", "position"),
+    )
+
+    def to_dict(self):
+        return {
+            "file": self.reference,
+            "name": self.original_name,
+            "size": self.size,
+            "mime_type": self.mime_type,
+            "sha256": self.sha256,
+            "width": self.width,
+            "height": self.height,
+            "page_count": self.page_count,
+        }
+
+    @classmethod
+    def for_problems(cls, problem_ids):
+        # {problem_id: [anexos]} de vários problemas em uma consulta;
+        # problem_ids pode ser uma lista ou um select de ids
+        attachments = {}
+        for attachment in cls.query.filter(cls.problem_id.in_(problem_ids)).order_by(
+            cls.problem_id, cls.position
+        ):
+            attachments.setdefault(attachment.problem_id, []).append(
+                attachment.to_dict()
+            )
+        return attachments
+
+
+class FileText(db.Model):
+    # Texto extraído de um arquivo (PDF ou, com OCR, imagem), uma vez por
+    # conteúdo; usado pela busca (extraction.py)
+    __tablename__ = "file_texts"
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    status = db.Column(db.String(20), nullable=False)  # done, failed
+    method = db.Column(db.String(20), nullable=True)  # pdf, ocr
+    page_count = db.Column(db.Integer, nullable=True)
+    text = db.Column(db.Text, nullable=False, default="")
+    error = db.Column(db.Text, nullable=True)
+    elapsed = db.Column(db.Float, nullable=True)  # segundos de extração
+    extracted_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class UploadSession(db.Model):
+    # Upload em partes (retomável) para arquivos acima de MAX_CONTENT_LENGTH.
+    # As partes ficam em disco; depois de finalizado, o arquivo vira um blob e
+    # a sessão guarda uma referência até ser anexada a um problema.
+    __tablename__ = "upload_sessions"
+
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=True)  # checksum informado
+    status = db.Column(
+        db.String(20), nullable=False, default="pending"
+    )  # pending, complete, attached
+    reference = db.Column(db.String(400), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    @property
+    def total_chunks(self):
+        return max((self.size + self.chunk_size - 1) // self.chunk_size, 1)
+
+    def chunk_length(self, index):
+        if index < self.total_chunks - 1:
+            return self.chunk_size
+        return self.size - self.chunk_size * (self.total_chunks - 1)
+
+    def to_dict(self, received=None):
+        data = {
+            "id": self.id,
+            "filename": self.filename,
+            "size": self.size,
+            "chunk_size": self.chunk_size,
+            "total_chunks": self.total_chunks,
+            "status": self.status,
+            "file": self.reference,
+        }
+        if received is not None:
+            data["received"] = received
+        return data
+
+
+class Job(db.Model):
+    # Tarefa em segundo plano (fila persistente no próprio banco). Criada na
+    # mesma transação da alteração que a originou e executada pelos workers
+    # de jobs.py, com novas tentativas em caso de erro.
+    __tablename__ = "jobs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload_json = db.Column(db.Text, nullable=False, default="{}")
+    status = db.Column(
+        db.String(20), nullable=False, default="pending"
+    )  # pending, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(64), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (db.Index("ix_jobs_status_run_after", "status", "run_after"),)
+
+    @property
+    def payload(self):
+        return json.loads(self.payload_json or "{}")
+
+    @payload.setter
+    def payload(self, value):
+        self.payload_json = json.dumps(value)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "payload": self.payload,
+            "status": self.status,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "created_at": self.created_at.isoformat(),
         }
@@ -0,0 +1,155 @@
+# Verificação de senhas no login.
+#
+# O hash da senha (PASSWORD_HASH_METHOD) é caro de propósito. Para que uma
+# rajada de logins não ocupe todos os workers do servidor, a verificação roda
+# em um pool com LOGIN_VERIFY_WORKERS threads e uma fila limitada: se a fila
+# estiver cheia por mais de LOGIN_VERIFY_TIMEOUT segundos o login responde 503.
+# Tentativas erradas são contadas por usuário (LOGIN_MAX_ATTEMPTS dentro de
+# LOGIN_ATTEMPT_WINDOW segundos); ao passar do limite o login responde 429 sem
+# calcular hash nenhum. A contagem usa os backends de cache.py, então com o
+# backend "sqlite" ela vale para todos os workers da máquina.
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from cache import create_cache
+from concurrency import thread_pool
+
+
+class LoginThrottled(Exception):
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+class VerifierBusy(Exception):
+    pass
+
+
+def hash_method_of(password_hash):
+    # "pbkdf2:sha256:600000$salt$hash" -> "pbkdf2:sha256:600000"
+    return password_hash.split("$", 1)[0]
+
+
+class PasswordVerifier:
+    def __init__(self):
+        self.app = None
+        self.attempts = None
+        self._executor = None
+        self._slots = None
+        self._method = None
+        self._dummy_hash = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000")
+        app.config.setdefault("LOGIN_VERIFY_WORKERS", 4)
+        app.config.setdefault("LOGIN_VERIFY_QUEUE", 32)
+        app.config.setdefault("LOGIN_VERIFY_TIMEOUT", 10)
+        app.config.setdefault("LOGIN_MAX_ATTEMPTS", 5)
+        app.config.setdefault("LOGIN_ATTEMPT_WINDOW", 300)
+        app.config.setdefault("LOGIN_THROTTLE_BACKEND", "memory")
+        app.config.setdefault("LOGIN_THROTTLE_MAX_ENTRIES", 10000)
+        app.config.setdefault("LOGIN_THROTTLE_TTL", app.config["LOGIN_ATTEMPT_WINDOW"])
+        app.extensions["password_verifier"] = self
+        self.app = app
+        self.attempts = create_cache(app, "LOGIN_THROTTLE")
+
+    # --- Parâmetros do hash ----------------------------------------------
+
+    def _prepare(self):
+        # Hash de referência com o método configurado: dá o nome completo do
+        # método (com os parâmetros padrão preenchidos pelo Werkzeug) e serve
+        # de alvo para usuários inexistentes, que assim levam o mesmo tempo
+        with self._lock:
+            if self._dummy_hash is None:
+                dummy = generate_password_hash(
+                    "", method=self.app.config["PASSWORD_HASH_METHOD"]
+                )
+                self._method = hash_method_of(dummy)
+                self._dummy_hash = dummy
+
+    @property
+    def method(self):
+        if self._method is None:
+            self._prepare()
+        return self._method
+
+    def needs_rehash(self, password_hash):
+        return hash_method_of(password_hash) != self.method
+
+    # --- Pool de verificação -----------------------------------------------
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                workers = self.app.config["LOGIN_VERIFY_WORKERS"]
+                self._executor = thread_pool(workers, thread_name_prefix="login")
+                self._slots = threading.BoundedSemaphore(
+                    workers + self.app.config["LOGIN_VERIFY_QUEUE"]
+                )
+            return self._executor
+
+    def verify(self, password_hash, password):
+        # Executa check_password_hash no pool; password_hash=None verifica
+        # contra o hash de referência (e retorna False)
+        if self._dummy_hash is None:
+            self._prepare()
+
+        executor = self._pool()
+        timeout = self.app.config["LOGIN_VERIFY_TIMEOUT"]
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=timeout):
+            raise VerifierBusy()
+
+        try:
+            future = executor.submit(
+                check_password_hash, password_hash or self._dummy_hash, password
+            )
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        remaining = max(timeout - (time.monotonic() - started), 0.1)
+        try:
+            valid = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            future.cancel()
+            raise VerifierBusy()
+        return valid and password_hash is not None
+
+    # --- Limite de tentativas --------------------------------------------
+
+    @staticmethod
+    def _key(username):
+        return f"login-attempts:{username.strip().lower()}"
+
+    def check_throttle(self, username):
+        entry = self.attempts.get(self._key(username))
+        if entry is None:
+            return
+        failures, first_at = entry
+        window = self.app.config["LOGIN_ATTEMPT_WINDOW"]
+        retry_after = int(first_at + window - time.time()) + 1
+        if failures >= self.app.config["LOGIN_MAX_ATTEMPTS"] and retry_after > 0:
+            raise LoginThrottled(retry_after)
+
+    def record_failure(self, username):
+        key = self._key(username)
+        now = time.time()
+        window = self.app.config["LOGIN_ATTEMPT_WINDOW"]
+        failures, first_at = self.attempts.get(key) or (0, now)
+        if first_at + window <= now:
+            failures, first_at = 0, now
+        self.attempts.set(
+            key, (failures + 1, first_at), ttl=max(int(first_at + window - now), 1)
+        )
+
+    def reset(self, username):
+        self.attempts.delete(self._key(username))
+
+
+password_verifier = PasswordVerifier()
@@ -0,0 +1,147 @@
+# Contagem dos comandos SQL executados por requisição.
+# Cada requisição (ou bloco "with query_counter.count()") recebe um contador;
+# os eventos before/after_cursor_execute do SQLAlchemy incrementam todos os
+# contadores ativos na thread atual, com o tempo gasto em cada comando. O total
+# pode ser devolvido no cabeçalho X-Query-Count e comparado com um limite
+# (SQL_QUERY_BUDGET).
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryCount:
+    def __init__(self, keep_statements=False):
+        self.count = 0
+        self.duration = 0.0  # segundos
+        self.statements = [] if keep_statements else None
+        self.durations = [] if keep_statements else None
+
+    def record(self, statement):
+        self.count += 1
+        if self.statements is not None:
+            self.statements.append(statement)
+            self.durations.append(None)
+
+    def record_duration(self, statement, seconds):
+        self.duration += seconds
+        if self.durations is None:
+            return
+        # Último comando igual ainda sem tempo
+        for index in range(len(self.statements) - 1, -1, -1):
+            if self.durations[index] is None and self.statements[index] == statement:
+                self.durations[index] = seconds
+                break
+
+    def slowest(self, limit=10):
+        # [(segundos, comando)] dos comandos mais demorados
+        if self.statements is None:
+            return []
+        timed = [
+            (duration or 0.0, statement)
+            for statement, duration in zip(self.statements, self.durations)
+        ]
+        return sorted(timed, key=lambda item: item[0], reverse=True)[:limit]
+
+
+class QueryCounter:
+    def __init__(self):
+        self._local = threading.local()
+        event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def init_app(self, app):
+        app.config.setdefault("QUERY_COUNT_HEADER", False)
+        app.config.setdefault("SQL_QUERY_BUDGET", None)
+        app.extensions["query_counter"] = self
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._teardown_request)
+
+    @property
+    def _active(self):
+        if not hasattr(self._local, "active"):
+            self._local.active = []
+        return self._local.active
+
+    def _before_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        for counter in self._active:
+            counter.record(statement)
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def _after_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        started = conn.info.get("query_started")
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        for counter in self._active:
+            counter.record_duration(statement, elapsed)
+
+    def push(self, keep_statements=False):
+        counter = QueryCount(keep_statements)
+        self._active.append(counter)
+        return counter
+
+    def pop(self, counter):
+        if counter in self._active:
+            self._active.remove(counter)
+
+    @contextmanager
+    def count(self, keep_statements=False):
+        counter = self.push(keep_statements)
+        try:
+            yield counter
+        finally:
+            self.pop(counter)
+
+    @contextmanager
+    def assert_max_queries(self, limit):
+        # Para testes e benchmarks: falha se o bloco executar mais comandos
+        # SQL do que o esperado (por exemplo, uma regressão para N+1)
+        with self.count(keep_statements=True) as counter:
+            yield counter
+        if counter.count > limit:
+            raise AssertionError(
+                "%d comandos SQL executados (máximo %d):\n%s"
+                % (counter.count, limit, "\n".join(counter.statements))
+            )
+
+    # --- Integração com as requisições do Flask ---------------------------
+
+    def _start_request(self):
+        g.query_count = self.push(keep_statements=True)
+
+    def _finish_request(self, response):
+        counter = g.get("query_count")
+        if counter is None:
+            return response
+
+        if current_app.config["QUERY_COUNT_HEADER"]:
+            response.headers["X-Query-Count"] = str(counter.count)
+
+        budget = current_app.config["SQL_QUERY_BUDGET"]
+        if budget is not None and counter.count > budget:
+            current_app.logger.warning(
+                "%s %s executou %d comandos SQL (limite %d):\n%s",
+                request.method,
+                request.path,
+                counter.count,
+                budget,
+                "\n".join(counter.statements),
+            )
+        return response
+
+    def _teardown_request(self, exc):
+        counter = g.pop("query_count", None)
+        if counter is not None:
+            self.pop(counter)
+
+
+query_counter = QueryCounter()
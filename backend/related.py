@@ -0,0 +1,612 @@
+# Problemas relacionados: para cada problema, os RELATED_TOP_K mais parecidos
+# ficam pré-calculados na tabela related_problems, e a rota só lê essa tabela.
+#
+# A semelhança combina o cosseno dos vetores TF-IDF de título e descrição, o
+# cosseno das tags (ponderadas pelo IDF) e um bônus para a mesma categoria:
+#
+#   score = RELATED_TEXT_WEIGHT * texto + RELATED_TAG_WEIGHT * tags
+#           + RELATED_CATEGORY_WEIGHT * (mesma categoria)
+#
+# O bônus de categoria só vale para problemas que já têm palavras ou tags em
+# comum. Cada processo que executa as tarefas mantém em memória um índice
+# invertido (listas de postings em arrays compactos); com o NumPy instalado
+# (opcional) a pontuação contra todos os problemas é uma soma vetorizada
+# (bincount) e a seleção do top-k usa argpartition.
+#
+# Atualização incremental: o commit que cria, altera ou exclui problemas
+# enfileira uma tarefa update_related com os IDs. A tarefa recalcula a lista
+# do próprio problema e a dos candidatos a serem afetados (os que já o listam
+# e os mais parecidos com ele). O índice de cada processo acompanha as
+# alterações feitas em qualquer processo pelas mesmas colunas do feed de
+# alterações (problems.updated_at e problem_tombstones, ver changes.py), e é
+# refeito a cada RELATED_REFRESH_INTERVAL (os pesos IDF mudam aos poucos).
+# "python manage.py rebuild-related" recalcula todas as listas.
+#
+# A tokenização, a montagem do índice e a pontuação passam por offload(): com
+# o worker gevent do gunicorn as tarefas são greenlets, e essa parte roda em
+# uma thread do sistema para não parar as requisições do processo; as
+# leituras do banco continuam no greenlet.
+import heapq
+import math
+import threading
+import time
+from array import array
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+import jobs
+from concurrency import offload
+from models import (
+    Job,
+    Problem,
+    ProblemTombstone,
+    RelatedProblem,
+    Tag,
+    db,
+    problem_tags,
+)
+from response_cache import response_cache
+from search import TITLE_WEIGHT, tokenize
+
+try:
+    import numpy
+except ImportError:  # dependência opcional
+    numpy = None
+
+TRACKED_ATTRIBUTES = ("title", "description", "category", "tag_items")
+
+# Termos curtos demais e palavras comuns (já sem acentos) não ajudam a
+# comparar problemas
+MIN_TERM_LENGTH = 3
+STOPWORDS = frozenset(
+    "nao com que para por uma dos das nos nas aos sem mais como quando esta "
+    "este isso essa esse pelo pela sao ser foi tem ter apos entre cada seu sua "
+    "muito ela ele elas eles onde qual depois antes ainda mesmo the and for".split()
+)
+
+# Candidatos a ter a lista alterada quando um problema muda: os N mais
+# parecidos com ele, além dos que já o listam
+CANDIDATE_FACTOR = 2
+
+# RELATED_MAX_DF só vale para termos que aparecem em pelo menos esse número
+# de problemas (em bases pequenas qualquer termo passaria da fração)
+COMMON_MIN_DOCUMENTS = 100
+
+WRITE_BATCH_SIZE = 5000
+LOAD_BATCH_SIZE = 1000
+
+
+def _idf(total, frequency):
+    return math.log((1 + total) / (1 + frequency)) + 1
+
+
+def _normalize(weights, limit=None):
+    items = sorted(weights.items(), key=lambda item: -item[1])
+    if limit:
+        items = items[:limit]
+    norm = math.sqrt(sum(weight * weight for _, weight in items)) or 1.0
+    return [(key, weight / norm) for key, weight in items]
+
+
+def term_frequencies(title, description):
+    counts = Counter()
+    for term in tokenize(title):
+        if len(term) >= MIN_TERM_LENGTH and term not in STOPWORDS:
+            counts[term] += TITLE_WEIGHT
+    for term in tokenize(description):
+        if len(term) >= MIN_TERM_LENGTH and term not in STOPWORDS:
+            counts[term] += 1
+    return counts
+
+
+class Postings:
+    # Vocabulário e listas de postings (slot, peso) só de acréscimo; um slot
+    # morto é ignorado na pontuação e sai na próxima reconstrução
+    def __init__(self):
+        self.ids = {}
+        self.slots = []
+        self.weights = []
+        self.frequency = []
+
+    def term_id(self, term):
+        term_id = self.ids.get(term)
+        if term_id is None:
+            term_id = self.ids[term] = len(self.slots)
+            self.slots.append(array("i"))
+            self.weights.append(array("f"))
+            self.frequency.append(0)
+        return term_id
+
+    def add(self, term_id, slot, weight):
+        self.slots[term_id].append(slot)
+        self.weights[term_id].append(weight)
+
+
+class RelatedModel:
+    def __init__(self, config):
+        self.top_k = config["RELATED_TOP_K"]
+        self.max_terms = config["RELATED_MAX_TERMS"]
+        self.max_df = config["RELATED_MAX_DF"]
+        self.min_score = config["RELATED_MIN_SCORE"]
+        self.text_weight = config["RELATED_TEXT_WEIGHT"]
+        self.tag_weight = config["RELATED_TAG_WEIGHT"]
+        self.category_weight = config["RELATED_CATEGORY_WEIGHT"]
+
+        self.built_at = time.monotonic()
+        # Criado antes de ler os problemas: o que mudar durante a leitura é
+        # reaplicado. seen guarda o updated_at (ou deleted_at) já aplicado dos
+        # problemas alterados dentro da janela de segurança
+        self.synced_at = datetime.utcnow()
+        self.seen = {}
+        self.total = 0
+        self.text = Postings()
+        self.tags = Postings()
+        self.categories = {}
+
+        # Por slot: problema, categoria, vivo e o vetor normalizado (IDs e
+        # pesos; as tags entram com ID negativo, ~tag_id)
+        self.slot_problem = array("q")
+        self.slot_category = array("i")
+        self.alive = bytearray()
+        self.vector_ids = []
+        self.vector_weights = []
+        self.slot_of = {}
+
+    # --- Carga e atualização ----------------------------------------------
+
+    def _load(self, connection, problem_ids=None):
+        # Lotes de (id, {term_id: frequência}, categoria, tag_ids); as linhas
+        # são lidas aqui e tokenizadas em offload()
+        problems = Problem.__table__
+        tags = Tag.__table__
+        query = select(
+            problems.c.id, problems.c.title, problems.c.description, problems.c.category
+        )
+        tag_query = select(problem_tags.c.problem_id, tags.c.name).join(
+            tags, tags.c.id == problem_tags.c.tag_id
+        )
+        if problem_ids is not None:
+            query = query.where(problems.c.id.in_(problem_ids))
+            tag_query = tag_query.where(problem_tags.c.problem_id.in_(problem_ids))
+
+        tag_ids = offload(self._tag_ids, connection.execute(tag_query).all())
+        for rows in connection.execute(query).partitions(LOAD_BATCH_SIZE):
+            yield offload(self._documents, rows, tag_ids)
+
+    def _tag_ids(self, rows):
+        tag_ids = {}
+        for problem_id, name in rows:
+            tag_ids.setdefault(problem_id, set()).add(self.tags.term_id(name))
+        return tag_ids
+
+    def _documents(self, rows, tag_ids):
+        documents = []
+        for problem_id, title, description, category in rows:
+            terms = {
+                self.text.term_id(term): count
+                for term, count in term_frequencies(title, description).items()
+            }
+            documents.append(
+                (problem_id, terms, category, tag_ids.get(problem_id, set()))
+            )
+        return documents
+
+    def _count(self, terms, tag_ids):
+        for term_id in terms:
+            self.text.frequency[term_id] += 1
+        for tag_id in tag_ids:
+            self.tags.frequency[tag_id] += 1
+
+    def build(self, connection):
+        # Duas passadas: frequências de documento e depois os vetores (entre
+        # elas, só os IDs dos termos e as contagens ficam em memória)
+        documents = []
+        for batch in self._load(connection):
+            offload(self._collect, batch, documents)
+        self.total = len(documents)
+        offload(self._add_all, documents)
+
+    def _collect(self, batch, documents):
+        for problem_id, terms, category, tag_ids in batch:
+            self._count(terms, tag_ids)
+            documents.append(
+                (
+                    problem_id,
+                    array("i", terms.keys()),
+                    array("H", (min(count, 65535) for count in terms.values())),
+                    category,
+                    tag_ids,
+                )
+            )
+
+    def _add_all(self, documents):
+        for problem_id, term_ids, counts, category, tag_ids in documents:
+            self._add(problem_id, dict(zip(term_ids, counts)), category, tag_ids)
+
+    def _add(self, problem_id, terms, category, tag_ids):
+        slot = len(self.slot_problem)
+        text_vector = _normalize(
+            {
+                term_id: (1 + math.log(count))
+                * _idf(self.total, self.text.frequency[term_id])
+                for term_id, count in terms.items()
+            },
+            self.max_terms,
+        )
+        tag_vector = _normalize(
+            {
+                tag_id: _idf(self.total, self.tags.frequency[tag_id])
+                for tag_id in tag_ids
+            }
+        )
+        # Termos comuns demais ficam só na norma
+        common = max(self.max_df * self.total, COMMON_MIN_DOCUMENTS)
+        text_vector = [
+            (term_id, weight)
+            for term_id, weight in text_vector
+            if self.text.frequency[term_id] <= common
+        ]
+        for term_id, weight in text_vector:
+            self.text.add(term_id, slot, weight)
+        for tag_id, weight in tag_vector:
+            self.tags.add(tag_id, slot, weight)
+
+        category_id = self.categories.setdefault(category, len(self.categories))
+        self.slot_problem.append(problem_id)
+        self.slot_category.append(category_id)
+        self.alive.append(1)
+        self.vector_ids.append(
+            array(
+                "i",
+                [term_id for term_id, _ in text_vector]
+                + [~tag_id for tag_id, _ in tag_vector],
+            )
+        )
+        self.vector_weights.append(
+            array("f", [weight for _, weight in text_vector + tag_vector])
+        )
+        self.slot_of[problem_id] = slot
+
+    def _remove(self, problem_id):
+        slot = self.slot_of.pop(problem_id, None)
+        if slot is not None:
+            self.alive[slot] = 0
+            self.vector_ids[slot] = self.vector_weights[slot] = None
+
+    def refresh(self, connection, problem_ids):
+        # Recarregar problemas alterados (os que não existem mais saem). As
+        # frequências de documento só contam os problemas novos; a próxima
+        # reconstrução acerta o restante
+        known = {problem_id for problem_id in problem_ids if problem_id in self.slot_of}
+        for problem_id in known:
+            self._remove(problem_id)
+        found = set()
+        for batch in self._load(connection, problem_ids):
+            for problem_id, terms, category, tag_ids in batch:
+                if problem_id not in known:
+                    self._count(terms, tag_ids)
+                self._add(problem_id, terms, category, tag_ids)
+                found.add(problem_id)
+        self.total += len(found - known) - len(known - found)
+
+    # --- Pontuação ----------------------------------------------------------
+
+    def _query(self, slot):
+        # (postings, ID, peso já multiplicado pelo fator) de cada termo e tag
+        for key, weight in zip(self.vector_ids[slot], self.vector_weights[slot]):
+            if key >= 0:
+                yield self.text, key, weight * self.text_weight
+            else:
+                yield self.tags, ~key, weight * self.tag_weight
+
+    def top(self, problem_id, limit=None):
+        # [(problem_id, score)] dos mais parecidos, do maior para o menor
+        limit = limit or self.top_k
+        slot = self.slot_of.get(problem_id)
+        if slot is None:
+            return []
+        if numpy is not None:
+            ranked = self._top_numpy(slot, limit)
+        else:
+            ranked = self._top_python(slot, limit)
+        return sorted(ranked, key=lambda item: (-item[1], item[0]))
+
+    def top_lists(self, problem_ids):
+        return {problem_id: self.top(problem_id) for problem_id in problem_ids}
+
+    def candidates(self, problem_ids):
+        # Os mais parecidos com os problemas alterados (podem passar a listá-los)
+        found = set()
+        for problem_id in problem_ids:
+            found.update(
+                related_id
+                for related_id, _ in self.top(problem_id, self.top_k * CANDIDATE_FACTOR)
+            )
+        return found
+
+    def _top_python(self, slot, limit):
+        scores = Counter()
+        for postings, term_id, weight in self._query(slot):
+            for other, other_weight in zip(
+                postings.slots[term_id], postings.weights[term_id]
+            ):
+                scores[other] += weight * other_weight
+
+        category = self.slot_category[slot]
+        candidates = []
+        for other, score in scores.items():
+            if other == slot or not self.alive[other]:
+                continue
+            if self.slot_category[other] == category:
+                score += self.category_weight
+            if score >= self.min_score:
+                candidates.append((self.slot_problem[other], score))
+        return heapq.nlargest(limit, candidates, key=lambda item: item[1])
+
+    def _top_numpy(self, slot, limit):
+        indexes, weights = [], []
+        for postings, term_id, weight in self._query(slot):
+            # Visões sem cópia dos arrays de postings
+            indexes.append(numpy.frombuffer(postings.slots[term_id], numpy.int32))
+            weights.append(
+                numpy.frombuffer(postings.weights[term_id], numpy.float32) * weight
+            )
+        if not indexes:
+            return []
+        scores = numpy.bincount(
+            numpy.concatenate(indexes),
+            weights=numpy.concatenate(weights),
+            minlength=len(self.slot_problem),
+        )
+        del indexes, weights
+
+        scores[slot] = 0
+        scores *= numpy.frombuffer(self.alive, numpy.uint8)
+        matches = numpy.flatnonzero(scores > 0)
+        same_category = (
+            numpy.frombuffer(self.slot_category, numpy.int32)[matches]
+            == self.slot_category[slot]
+        )
+        values = scores[matches] + self.category_weight * same_category
+        keep = values >= self.min_score
+        matches, values = matches[keep], values[keep]
+        if len(values) > limit:
+            best = numpy.argpartition(-values, limit - 1)[:limit]
+            matches, values = matches[best], values[best]
+        problems = numpy.frombuffer(self.slot_problem, numpy.int64)[matches]
+        return list(zip(problems.tolist(), values.tolist()))
+
+
+class RelatedIndex:
+    def __init__(self):
+        self._model = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault("RELATED_ENABLED", True)
+        app.config.setdefault("RELATED_TOP_K", 10)
+        app.config.setdefault("RELATED_MAX_TERMS", 32)
+        app.config.setdefault("RELATED_MAX_DF", 0.2)
+        app.config.setdefault("RELATED_MIN_SCORE", 0.05)
+        app.config.setdefault("RELATED_TEXT_WEIGHT", 0.6)
+        app.config.setdefault("RELATED_TAG_WEIGHT", 0.3)
+        app.config.setdefault("RELATED_CATEGORY_WEIGHT", 0.1)
+        app.config.setdefault("RELATED_REFRESH_INTERVAL", 12 * 3600)
+        app.config.setdefault("RELATED_UPDATE_LIMIT", 200)
+        app.config.setdefault("RELATED_REBUILD_CHUNK", 5000)
+        app.extensions["related_index"] = self
+
+    # --- Índice em memória ----------------------------------------------
+
+    def _current(self, connection):
+        model = self._model
+        interval = current_app.config["RELATED_REFRESH_INTERVAL"]
+        if model is None or time.monotonic() - model.built_at > interval:
+            model = RelatedModel(current_app.config)
+            model.build(connection)
+            self._model = model
+        return model
+
+    def _catch_up(self, connection, model):
+        # Aplicar as alterações de qualquer processo desde a última leitura:
+        # problemas com updated_at mais novo e exclusões. updated_at é definido
+        # no flush, então a janela CHANGES_SAFETY_WINDOW cobre transações que
+        # demoraram a confirmar; o que já foi aplicado com o mesmo horário não
+        # é recarregado
+        now = datetime.utcnow()
+        since = model.synced_at - current_app.config["CHANGES_SAFETY_WINDOW"]
+        problems = Problem.__table__
+        tombstones = ProblemTombstone.__table__
+        rows = connection.execute(
+            select(problems.c.id, problems.c.updated_at).where(
+                problems.c.updated_at >= since
+            )
+        ).all()
+        rows += connection.execute(
+            select(tombstones.c.problem_id, tombstones.c.deleted_at).where(
+                tombstones.c.deleted_at >= since
+            )
+        ).all()
+        changed = {
+            problem_id for problem_id, at in rows if model.seen.get(problem_id) != at
+        }
+        model.seen = dict(rows)
+        model.synced_at = now
+        if changed:
+            model.refresh(connection, sorted(changed))
+
+    # --- Tabela related_problems ------------------------------------------
+
+    @staticmethod
+    def _write(connection, lists):
+        table = RelatedProblem.__table__
+        problem_ids = list(lists)
+        for start in range(0, len(problem_ids), WRITE_BATCH_SIZE):
+            connection.execute(
+                table.delete().where(
+                    table.c.problem_id.in_(
+                        problem_ids[start : start + WRITE_BATCH_SIZE]
+                    )
+                )
+            )
+        rows = [
+            {
+                "problem_id": problem_id,
+                "related_id": related_id,
+                "rank": rank,
+                "score": score,
+            }
+            for problem_id, ranked in lists.items()
+            for rank, (related_id, score) in enumerate(ranked)
+        ]
+        for start in range(0, len(rows), WRITE_BATCH_SIZE):
+            connection.execute(table.insert(), rows[start : start + WRITE_BATCH_SIZE])
+
+    def update(self, problem_ids):
+        # Recalcular as listas afetadas pela alteração dos problemas. Lotes
+        # grandes (importações) viram um recálculo completo em partes
+        if len(problem_ids) > current_app.config["RELATED_UPDATE_LIMIT"]:
+            self.schedule_rebuild()
+            db.session.commit()
+            return 0
+
+        connection = db.session.connection()
+        table = RelatedProblem.__table__
+        with self._lock:
+            model = self._current(connection)
+            self._catch_up(connection, model)
+
+            affected = set(problem_ids)
+            affected.update(
+                connection.execute(
+                    select(table.c.problem_id).where(
+                        table.c.related_id.in_(problem_ids)
+                    )
+                ).scalars()
+            )
+            affected.update(offload(model.candidates, problem_ids))
+            lists = offload(model.top_lists, affected)
+
+        # Problemas excluídos ficam com a lista vazia
+        self._write(connection, lists)
+        db.session.commit()
+        response_cache.invalidate()
+        return len(lists)
+
+    @staticmethod
+    def schedule_rebuild():
+        # Um recálculo completo pendente já cobre as alterações anteriores
+        pending = Job.query.filter_by(kind="rebuild_related", status="pending")
+        if not any(not job.payload.get("after_id") for job in pending):
+            jobs.enqueue("rebuild_related", after_id=0)
+
+    def rebuild_chunk(self, after_id=0):
+        # Listas dos próximos RELATED_REBUILD_CHUNK problemas com ID maior que
+        # after_id; devolve o último ID calculado (None quando termina) e a
+        # quantidade de listas
+        connection = db.session.connection()
+        table = RelatedProblem.__table__
+        with self._lock:
+            if not after_id:
+                self._model = None
+            model = self._current(connection)
+            self._catch_up(connection, model)
+            problem_ids = sorted(
+                problem_id for problem_id in model.slot_of if problem_id > after_id
+            )[: current_app.config["RELATED_REBUILD_CHUNK"]]
+            lists = offload(model.top_lists, problem_ids)
+
+        last_id = problem_ids[-1] if problem_ids else None
+        # Inclui as listas de problemas excluídos nesse intervalo
+        stale = table.c.problem_id > after_id
+        if last_id is not None:
+            stale &= table.c.problem_id <= last_id
+        connection.execute(table.delete().where(stale))
+        self._write(connection, lists)
+        db.session.commit()
+        response_cache.invalidate()
+        return last_id, len(lists)
+
+    def rebuild(self, progress=None):
+        # Refazer o índice e todas as listas, parte por parte
+        after_id, total = 0, 0
+        while True:
+            after_id, count = self.rebuild_chunk(after_id)
+            if after_id is None:
+                return total
+            total += count
+            if progress:
+                progress(total)
+
+    def related(self, problem_id, limit):
+        # Leitura da tabela: IDs e scores, do mais parecido para o menos
+        return (
+            db.session.query(RelatedProblem.related_id, RelatedProblem.score)
+            .filter(RelatedProblem.problem_id == problem_id)
+            .order_by(RelatedProblem.rank)
+            .limit(limit)
+            .all()
+        )
+
+
+related_index = RelatedIndex()
+
+
+@jobs.handler("update_related")
+def update_job(problem_ids):
+    related_index.update(problem_ids)
+
+
+@jobs.handler("rebuild_related")
+def rebuild_job(after_id=0):
+    # Cada parte é uma tarefa, para nenhuma passar de JOB_LOCK_TIMEOUT
+    last_id, _ = related_index.rebuild_chunk(after_id)
+    if last_id is not None:
+        jobs.enqueue("rebuild_related", after_id=last_id)
+        db.session.commit()
+
+
+# --- Enfileiramento a cada commit ---------------------------------------------
+
+
+def _enabled():
+    return not has_app_context() or current_app.config.get("RELATED_ENABLED", True)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed(session, flush_context):
+    changed = set()
+    for problem in session.new:
+        if isinstance(problem, Problem):
+            changed.add(problem.id)
+    for problem in session.deleted:
+        if isinstance(problem, Problem):
+            changed.add(problem.id)
+    for problem in session.dirty:
+        if isinstance(problem, Problem) and any(
+            inspect(problem).attrs[name].history.has_changes()
+            for name in TRACKED_ATTRIBUTES
+        ):
+            changed.add(problem.id)
+    if changed:
+        session.info.setdefault("related_changed", set()).update(changed)
+
+
+@event.listens_for(Session, "before_commit")
+def _enqueue_update(session):
+    # Uma tarefa por transação, com todos os problemas alterados (o flush
+    # antecipado registra as alterações ainda pendentes)
+    session.flush()
+    changed = session.info.pop("related_changed", None)
+    if changed and _enabled():
+        jobs.enqueue("update_related", problem_ids=sorted(changed))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_changed(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop("related_changed", None)
@@ -0,0 +1,85 @@
+# Cache das respostas JSON das rotas de leitura, com ETag forte.
+# As respostas ficam guardadas por URL completa (caminho + query string) sob
+# uma "geração" do namespace; qualquer commit que altere problemas, tags ou
+# usuários troca a geração, invalidando todas as entradas de uma vez (inclusive
+# em outros workers quando o backend é compartilhado).
+import hashlib
+import uuid
+from functools import wraps
+
+from flask import current_app, request
+
+from cache import create_cache
+from events import models_committed
+
+# Tabelas cujas alterações invalidam as respostas em cache
+WATCHED_TABLES = {"problems", "tags", "problem_tags", "users", "attachments"}
+
+
+class ResponseCache:
+    def __init__(self):
+        self.backend = None
+
+    def init_app(self, app):
+        app.config.setdefault("RESPONSE_CACHE_BACKEND", "memory")
+        app.config.setdefault("RESPONSE_CACHE_TTL", 300)
+        app.config.setdefault("RESPONSE_CACHE_MAX_ENTRIES", 1024)
+        app.extensions["response_cache"] = self
+        self.backend = create_cache(app, "RESPONSE_CACHE")
+        models_committed.connect(self._on_models_committed, sender=app, weak=False)
+
+    def _on_models_committed(self, sender, changes):
+        if any(change.table in WATCHED_TABLES for change in changes):
+            self.invalidate()
+
+    def _generation(self, namespace):
+        # Geração aleatória (e não um contador) para que, se a chave for
+        # descartada pelo LRU, entradas antigas não voltem a ser válidas
+        generation = self.backend.get(f"generation:{namespace}")
+        if generation is None:
+            generation = self.invalidate(namespace)
+        return generation
+
+    def invalidate(self, namespace="problems"):
+        generation = uuid.uuid4().hex
+        self.backend.set(f"generation:{namespace}", generation, ttl=0)
+        return generation
+
+    def cached(self, namespace="problems"):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                key = "response:%s:%s:%s" % (
+                    namespace,
+                    self._generation(namespace),
+                    request.full_path,
+                )
+
+                entry = self.backend.get(key)
+                if entry is None:
+                    response = current_app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+
+                    body = response.get_data()
+                    entry = {
+                        "body": body,
+                        "mimetype": response.mimetype,
+                        "etag": hashlib.sha256(body).hexdigest()[:32],
+                    }
+                    self.backend.set(key, entry)
+
+                response = current_app.response_class(
+                    entry["body"], mimetype=entry["mimetype"]
+                )
+                response.set_etag(entry["etag"])
+                # Sempre revalidar com If-None-Match (304 se nada mudou)
+                response.headers["Cache-Control"] = "no-cache"
+                return response.make_conditional(request)
+
+            return wrapper
+
+        return decorator
+
+
+response_cache = ResponseCache()
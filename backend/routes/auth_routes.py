@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, session
 from flask_login import login_user, logout_user, current_user, login_required
 from models import User, db
+from passwords import LoginThrottled, VerifierBusy, password_verifier
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -12,11 +13,37 @@ def login():
     if not data or not data.get("username") or not data.get("password"):
         return jsonify({"error": "Usuário e senha são obrigatórios"}), 400
 
-    user = User.query.filter_by(username=data["username"]).first()
-
-    if not user or not user.check_password(data["password"]):
+    username = data["username"]
+    try:
+        password_verifier.check_throttle(username)
+    except LoginThrottled as e:
+        response = jsonify({"error": "Muitas tentativas. Tente novamente mais tarde"})
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, 429
+
+    user = User.query.filter_by(username=username).first()
+
+    # Verificar no pool de login (usuário inexistente leva o mesmo tempo)
+    try:
+        valid = password_verifier.verify(
+            user.password_hash if user else None, data["password"]
+        )
+    except VerifierBusy:
+        response = jsonify({"error": "Servidor ocupado. Tente novamente"})
+        response.headers["Retry-After"] = "5"
+        return response, 503
+
+    if not valid:
+        password_verifier.record_failure(username)
         return jsonify({"error": "Usuário ou senha inválidos"}), 401
 
+    password_verifier.reset(username)
+
+    # Refazer o hash se foi gerado com outro algoritmo ou custo
+    if password_verifier.needs_rehash(user.password_hash):
+        user.set_password(data["password"])
+        db.session.commit()
+
     login_user(user, remember=True)
     session.permanent = True
 
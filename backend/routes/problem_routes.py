@@ -1,21 +1,101 @@
 import os
 from flask import (
     Blueprint,
+    Response,
     request,
     jsonify,
     current_app,
-    send_from_directory,
-    send_file,
+    stream_with_context,
 )
 from flask_login import current_user, login_required
-from models import Problem, db
+from models import (
+    Attachment,
+    FacetCount,
+    Problem,
+    Tag,
+    UploadSession,
+    User,
+    db,
+    parse_tags,
+    problem_tags,
+)
+from pagination import InvalidCursor, decode_cursor, encode_cursor, parse_datetime
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload, selectinload
+from search import search_index
+from broadcast import broadcaster
+from related import related_index
+from response_cache import response_cache
+import bulk
+import changes
+import facets
+import file_serving
+import serialization
+import storage
+import thumbnails
 from werkzeug.utils import secure_filename
 from datetime import datetime
-import uuid
 
 problem_bp = Blueprint("problems", __name__)
 
 
+# Regras de permissão, usadas pelas rotas individuais e pela API em lote
+def can_create_problem(user):
+    return user.role in ["admin", "tecnico"]
+
+
+def can_edit_problem(user, problem):
+    return user.role == "admin" or problem.author_id == user.id
+
+
+def can_delete_problem(user):
+    return user.role == "admin"
+
+
+class InvalidField(ValueError):
+    pass
+
+
+def problem_fields(data):
+    # Campos de texto de um problema vindos do formulário ou de JSON; tags
+    # podem ser uma string separada por vírgulas ou uma lista
+    fields = {}
+    for name in ["title", "description", "category", "tags", "youtubeLink"]:
+        value = data.get(name)
+        if name == "tags" and isinstance(value, list):
+            value = ",".join(str(tag) for tag in value)
+        if value is not None and not isinstance(value, str):
+            raise InvalidField(f"Campo inválido: {name}")
+        fields[name] = value
+    return fields
+
+
+def apply_problem_fields(problem, fields):
+    # Campos vazios são ignorados; youtubeLink vazio remove o link
+    for name in ["title", "description", "category"]:
+        if fields[name]:
+            setattr(problem, name, fields[name])
+    if parse_tags(fields["tags"]):
+        problem.set_tags(fields["tags"])
+    if fields["youtubeLink"] is not None:
+        problem.youtubeLink = fields["youtubeLink"]
+
+
+def has_required_fields(fields):
+    return all(fields[name] for name in ["title", "description", "category"]) and (
+        parse_tags(fields["tags"])
+    )
+
+
+def remove_problem(problem):
+    # Excluir arquivos associados (a remoção do disco é feita pela fila de
+    # tarefas, somente se o commit for confirmado)
+    for file_path in problem.files:
+        remove_file(file_path)
+    db.session.delete(problem)
+
+
 def allowed_file(filename):
     return (
         "." in filename
@@ -26,67 +106,362 @@ def allowed_file(filename):
 
 def save_file(file):
     if file and allowed_file(file.filename):
-        # Gerar nome único para o arquivo
+        # Conteúdo gravado uma única vez, identificado pelo SHA-256
         filename = secure_filename(file.filename)
-        filename = f"{uuid.uuid4().hex}_{filename}"
-        file_path = os.path.join(
-            current_app.root_path, current_app.config["UPLOAD_FOLDER"], filename
-        )
-        file.save(file_path)
-        return os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
+        return storage.store(file.stream, filename)
     return None
 
 
+def attach_uploads():
+    # Arquivos enviados em partes (/api/uploads) e já finalizados pelo próprio
+    # usuário; a referência do blob passa da sessão de upload para o problema
+    upload_ids = []
+    for value in request.form.getlist("upload_ids"):
+        upload_ids.extend(item.strip() for item in value.split(",") if item.strip())
+    if not upload_ids:
+        return []
+
+    uploads = UploadSession.query.filter(
+        UploadSession.id.in_(upload_ids),
+        UploadSession.user_id == current_user.id,
+        UploadSession.status == "complete",
+    ).all()
+    for upload in uploads:
+        upload.status = "attached"
+    return [upload.reference for upload in uploads]
+
+
+def remove_file(file_path):
+    # Libera a referência; o arquivo é apagado em segundo plano, após o
+    # commit, se não for mais usado por nenhum problema
+    storage.release(file_path)
+
+
+def filter_by_tags(query, names, mode="all"):
+    # Filtro pela tabela de associação indexada; "all" exige todas as tags e
+    # "any" aceita qualquer uma delas
+    matches = (
+        select(problem_tags.c.problem_id)
+        .join(Tag, Tag.id == problem_tags.c.tag_id)
+        .where(Tag.name.in_(names))
+    )
+    if mode == "all":
+        matches = matches.group_by(problem_tags.c.problem_id).having(
+            func.count() == len(names)
+        )
+    return query.filter(Problem.id.in_(matches))
+
+
+def add_attachments(items, problem_ids):
+    # Metadados dos anexos na listagem resumida, com uma consulta a mais
+    attachments = Attachment.for_problems(problem_ids)
+    for item in items:
+        item["attachments"] = attachments.get(item["id"], [])
+    return items
+
+
 @problem_bp.route("/", methods=["GET"])
+@response_cache.cached()
 def get_problems():
     # Parâmetros de consulta opcionais para filtrar
-    tag = request.args.get("tag")
+    # Tags: ?tag=a&tag=b ou ?tags=a,b, combinadas com ?tag_mode=all|any
+    tags = parse_tags(
+        ",".join(request.args.getlist("tag") + request.args.getlist("tags"))
+    )
+    tag_mode = request.args.get("tag_mode", "all").lower()
     category = request.args.get("category")
 
-    query = Problem.query
+    if tag_mode not in ["all", "any"]:
+        return jsonify({"error": "tag_mode deve ser 'all' ou 'any'"}), 400
 
-    if tag:
-        query = query.filter(Problem.tags.like(f"%{tag}%"))
+    query = Problem.query.options(
+        joinedload(Problem.author), selectinload(Problem.attachments)
+    )
+
+    if tags:
+        query = filter_by_tags(query, tags, tag_mode)
 
     if category:
         query = query.filter_by(category=category)
 
-    problems = query.order_by(Problem.created_at.desc()).all()
-    return jsonify([problem.to_dict() for problem in problems]), 200
+    view = request.args.get("view")
+    if view not in [None, "full", "summary"]:
+        return jsonify({"error": "view deve ser 'full' ou 'summary'"}), 400
+
+    # Sem limit/cursor a resposta continua sendo a lista completa
+    if "limit" not in request.args and "cursor" not in request.args:
+        query = query.order_by(Problem.created_at.desc(), Problem.id.desc())
+        if request.args.get("stream", "").lower() in ["1", "true"]:
+            return serialization.stream_array(stream_problems(query, view))
+        if view == "summary":
+            rows = query.join(User).with_entities(*Problem.summary_columns())
+            items = [Problem.summary_to_dict(row) for row in rows]
+            problem_ids = query.order_by(None).with_entities(Problem.id)
+            return jsonify(add_attachments(items, problem_ids)), 200
+        return jsonify([problem.to_dict() for problem in query.all()]), 200
+
+    return paginate_problems(query, view or "summary")
+
+
+def stream_problems(query, view):
+    # Itens da lista completa lidos em lotes (com os anexos de cada lote),
+    # enviados conforme ficam prontos
+    batch_size = current_app.config["JSON_STREAM_BATCH_SIZE"]
+    if view == "summary":
+        query = query.join(User).with_entities(*Problem.summary_columns())
+
+    batch = []
+    for row in query.yield_per(batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield from _stream_batch(batch, view)
+            batch = []
+    yield from _stream_batch(batch, view)
+
+
+def _stream_batch(rows, view):
+    if view != "summary":
+        return [problem.to_dict() for problem in rows]
+    return add_attachments(
+        [Problem.summary_to_dict(row) for row in rows], [row.id for row in rows]
+    )
+
+
+def paginate_problems(query, view):
+    # Paginação por chave em (created_at, id), do mais recente para o mais
+    # antigo, usando o índice ix_problems_created_at_id
+    limit = request.args.get("limit", current_app.config["PAGE_SIZE"], type=int)
+    limit = min(max(limit, 1), current_app.config["MAX_PAGE_SIZE"])
+    cursor = request.args.get("cursor")
+    with_count = request.args.get("count", "false").lower() == "true"
+
+    result = {}
+
+    # Contagem só quando pedida e só na primeira página
+    if with_count and not cursor:
+        result["total"] = (
+            query.order_by(None).with_entities(func.count(Problem.id)).scalar()
+        )
+
+    if cursor:
+        try:
+            created_at, last_id = decode_cursor(cursor, 2)
+            created_at = parse_datetime(created_at)
+            last_id = int(last_id)
+        except (InvalidCursor, TypeError, ValueError):
+            return jsonify({"error": "Cursor inválido"}), 400
+
+        query = query.filter(
+            or_(
+                Problem.created_at < created_at,
+                and_(Problem.created_at == created_at, Problem.id < last_id),
+            )
+        )
+
+    query = query.order_by(Problem.created_at.desc(), Problem.id.desc())
+
+    if view == "summary":
+        rows = (
+            query.join(User)
+            .with_entities(*Problem.summary_columns())
+            .limit(limit + 1)
+            .all()
+        )
+        items = add_attachments(
+            [Problem.summary_to_dict(row) for row in rows[:limit]],
+            [row.id for row in rows[:limit]],
+        )
+    else:
+        rows = query.limit(limit + 1).all()
+        items = [problem.to_dict() for problem in rows[:limit]]
+
+    # Uma linha a mais indica que existe próxima página
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    result["items"] = items
+    result["next_cursor"] = next_cursor
+    return jsonify(result), 200
+
+
+@problem_bp.route("/changes", methods=["GET"])
+def get_changes():
+    # Sincronização incremental: problemas criados ou alterados e IDs
+    # excluídos desde o token (sem token, todos os problemas). Com has_more,
+    # o cliente repete a chamada com o novo token
+    view = request.args.get("view")
+    if view not in [None, "full", "summary"]:
+        return jsonify({"error": "view deve ser 'full' ou 'summary'"}), 400
+
+    limit = request.args.get("limit", current_app.config["CHANGES_PAGE_SIZE"], type=int)
+    limit = min(max(limit, 1), current_app.config["CHANGES_MAX_PAGE_SIZE"])
+
+    since = request.args.get("since")
+    try:
+        changed, deleted = (
+            changes.decode_token(since) if since else changes.initial_positions()
+        )
+    except InvalidCursor:
+        return jsonify({"error": "Token inválido"}), 400
+    except changes.ExpiredToken:
+        return (
+            jsonify({"error": "Token expirado: carregue a lista completa de novo"}),
+            410,
+        )
+
+    query = changes.changed_since(Problem.query, changed)
+    if view == "summary":
+        rows = (
+            query.join(User)
+            .with_entities(*Problem.summary_columns())
+            .limit(limit + 1)
+            .all()
+        )
+        items = add_attachments(
+            [Problem.summary_to_dict(row) for row in rows[:limit]],
+            [row.id for row in rows[:limit]],
+        )
+    else:
+        rows = (
+            query.options(joinedload(Problem.author), selectinload(Problem.attachments))
+            .limit(limit + 1)
+            .all()
+        )
+        items = [problem.to_dict() for problem in rows[:limit]]
+    tombstones = changes.deleted_since(db.session.connection(), deleted, limit + 1)
+
+    # Uma linha a mais em qualquer das duas listas indica que há mais
+    has_more = len(rows) > limit or len(tombstones) > limit
+    rows, tombstones = rows[:limit], tombstones[:limit]
+    if rows:
+        changed = (rows[-1].updated_at, rows[-1].id)
+    if tombstones:
+        deleted = tuple(tombstones[-1])
+
+    return (
+        jsonify(
+            {
+                "items": items,
+                "deleted": [problem_id for _, problem_id in tombstones],
+                "token": changes.encode_token(changed, deleted, has_more),
+                "has_more": has_more,
+            }
+        ),
+        200,
+    )
+
+
+@problem_bp.route("/events", methods=["GET"])
+def problem_events():
+    # Stream SSE com as criações, alterações e exclusões de problemas; o
+    # navegador reconecta sozinho enviando Last-Event-ID
+    if not current_app.config["SSE_ENABLED"]:
+        return jsonify({"error": "Eventos desativados"}), 404
+    last_event_id = request.headers.get("Last-Event-ID", type=int)
+    if last_event_id is None:
+        last_event_id = request.args.get("last_event_id", type=int)
+
+    if not broadcaster.connect():
+        response = jsonify({"error": "Muitas conexões de eventos abertas"})
+        response.headers["Retry-After"] = "30"
+        return response, 503
+
+    response = Response(broadcaster.stream(last_event_id), mimetype="text/event-stream")
+    response.call_on_close(broadcaster.disconnect)
+    response.headers["Cache-Control"] = "no-cache, no-transform"
+    # Nginx: enviar cada evento assim que sair, sem buffer
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@problem_bp.route("/search", methods=["GET"])
+def search_problems():
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "Informe o termo de busca"}), 400
+
+    limit = request.args.get("limit", current_app.config["PAGE_SIZE"], type=int)
+    limit = min(max(limit, 1), current_app.config["MAX_PAGE_SIZE"])
+    offset = max(request.args.get("offset", 0, type=int), 0)
+
+    hits = search_index.search(db.session.connection(), query, limit, offset)
+    problems = {
+        problem.id: problem
+        for problem in Problem.query.options(
+            joinedload(Problem.author), selectinload(Problem.attachments)
+        ).filter(Problem.id.in_([hit.problem_id for hit in hits]))
+    }
+
+    # Manter a ordem de relevância retornada pelo índice
+    results = []
+    for hit in hits:
+        problem = problems.get(hit.problem_id)
+        if problem is None:
+            continue
+        data = problem.to_dict()
+        data["score"] = hit.score
+        data["snippet"] = hit.snippet
+        results.append(data)
+
+    return jsonify(results), 200
 
 
 @problem_bp.route("/<int:id>", methods=["GET"])
+@response_cache.cached()
 def get_problem(id):
-    problem = Problem.query.get_or_404(id)
+    problem = (
+        Problem.query.options(
+            joinedload(Problem.author), selectinload(Problem.attachments)
+        )
+        .filter_by(id=id)
+        .first_or_404()
+    )
     return jsonify(problem.to_dict()), 200
 
 
+@problem_bp.route("/<int:id>/related", methods=["GET"])
+@response_cache.cached()
+def get_related_problems(id):
+    # Problemas parecidos, pré-calculados pela fila de tarefas (related.py)
+    Problem.query.with_entities(Problem.id).filter_by(id=id).first_or_404()
+    top_k = current_app.config["RELATED_TOP_K"]
+    limit = min(max(request.args.get("limit", top_k, type=int), 1), top_k)
+
+    related = related_index.related(id, limit)
+    rows = {
+        row.id: row
+        for row in Problem.query.join(User)
+        .with_entities(*Problem.summary_columns())
+        .filter(Problem.id.in_([related_id for related_id, _ in related]))
+    }
+    items = []
+    for related_id, score in related:
+        # Problemas excluídos depois do cálculo ficam de fora
+        if related_id in rows:
+            data = Problem.summary_to_dict(rows[related_id])
+            data["score"] = round(score, 4)
+            items.append(data)
+    return jsonify(items), 200
+
+
 @problem_bp.route("/", methods=["POST"])
 @login_required
 def create_problem():
     # Verificar se o usuário tem permissão (admin ou técnico)
-    if current_user.role not in ["admin", "tecnico"]:
+    if not can_create_problem(current_user):
         return jsonify({"error": "Acesso não autorizado"}), 403
 
     # Processar dados do formulário
-    title = request.form.get("title")
-    description = request.form.get("description")
-    category = request.form.get("category")
-    tags = request.form.get("tags")
-    youtubeLink = request.form.get("youtubeLink")
-
-    if not title or not description or not category or not tags:
+    fields = problem_fields(request.form)
+    if not has_required_fields(fields):
         return jsonify({"error": "Todos os campos são obrigatórios"}), 400
 
     # Criar novo problema
-    problem = Problem(
-        title=title,
-        description=description,
-        category=category,
-        tags=tags,
-        youtubeLink=youtubeLink,
-        author_id=current_user.id,
-    )
+    problem = Problem(author_id=current_user.id)
+    apply_problem_fields(problem, fields)
+    db.session.add(problem)
 
     # Processar arquivos
     files = []
@@ -97,9 +472,9 @@ def create_problem():
             if file_path:
                 files.append(file_path)
 
-    problem.files = files
+    files.extend(attach_uploads())
+    storage.attach(problem, files)
 
-    db.session.add(problem)
     db.session.commit()
 
     return jsonify(problem.to_dict()), 201
@@ -111,26 +486,11 @@ def update_problem(id):
     problem = Problem.query.get_or_404(id)
 
     # Verificar se o usuário tem permissão (admin ou autor do problema)
-    if current_user.role != "admin" and problem.author_id != current_user.id:
+    if not can_edit_problem(current_user, problem):
         return jsonify({"error": "Acesso não autorizado"}), 403
 
     # Processar dados do formulário
-    title = request.form.get("title")
-    description = request.form.get("description")
-    category = request.form.get("category")
-    tags = request.form.get("tags")
-    youtubeLink = request.form.get("youtubeLink")
-
-    if title:
-        problem.title = title
-    if description:
-        problem.description = description
-    if category:
-        problem.category = category
-    if tags:
-        problem.tags = tags
-    if youtubeLink is not None:  # Permitir remover o link definindo como string vazia
-        problem.youtubeLink = youtubeLink
+    apply_problem_fields(problem, problem_fields(request.form))
 
     # Inicializar lista de arquivos final
     current_files = []
@@ -147,18 +507,15 @@ def update_problem(id):
 
                 existing_files = json.loads(json_data)
 
-                # Verificar quais arquivos foram removidos
+                # Verificar quais arquivos foram removidos (e aceitar apenas
+                # arquivos que já pertenciam ao problema)
                 original_files = problem.files
+                existing_files = [f for f in existing_files if f in original_files]
                 files_to_remove = [f for f in original_files if f not in existing_files]
 
                 for file_path in files_to_remove:
-                    try:
-                        full_path = os.path.join(current_app.root_path, file_path)
-                        if os.path.exists(full_path):
-                            os.remove(full_path)
-                            current_app.logger.info(f"Arquivo removido: {file_path}")
-                    except Exception as e:
-                        current_app.logger.error(f"Erro ao excluir arquivo: {e}")
+                    remove_file(file_path)
+                    current_app.logger.info(f"Arquivo removido: {file_path}")
 
                 # Adicionar arquivos mantidos à lista final
                 current_files.extend(existing_files)
@@ -186,11 +543,14 @@ def update_problem(id):
                     current_app.logger.info(f"Salvo em: {file_path}")
                     current_files.append(file_path)
 
-    # 3. Atualizar a lista de arquivos do problema
+    # 3. Anexar arquivos enviados em partes
+    current_files.extend(attach_uploads())
+
+    # 4. Atualizar a lista de arquivos do problema
     current_app.logger.info(f"Lista final de arquivos: {current_files}")
-    problem.files = current_files
+    storage.attach(problem, current_files)
 
-    # 4. Salvar as alterações
+    # 5. Salvar as alterações
     try:
         db.session.commit()
         return jsonify(problem.to_dict()), 200
@@ -204,45 +564,273 @@ def update_problem(id):
 @login_required
 def delete_problem(id):
     # Somente admin pode excluir problemas
-    if current_user.role != "admin":
+    if not can_delete_problem(current_user):
         return jsonify({"error": "Acesso não autorizado"}), 403
 
     problem = Problem.query.get_or_404(id)
+    remove_problem(problem)
+    db.session.commit()
 
-    # Excluir arquivos associados
-    for file_path in problem.files:
+    return jsonify({"message": "Problema excluído com sucesso"}), 200
+
+
+@problem_bp.route("/batch", methods=["GET"])
+@response_cache.cached()
+def get_problems_batch():
+    # Vários problemas em uma consulta: ?ids=1,2,3 (ou ids repetidos)
+    try:
+        ids = [
+            int(value)
+            for raw in request.args.getlist("ids")
+            for value in raw.split(",")
+            if value.strip()
+        ]
+    except ValueError:
+        return jsonify({"error": "IDs inválidos"}), 400
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return jsonify({"error": "Informe os IDs em ?ids="}), 400
+    if len(ids) > current_app.config["BATCH_MAX_ITEMS"]:
+        return (
+            jsonify(
+                {"error": f"Máximo de {current_app.config['BATCH_MAX_ITEMS']} IDs"}
+            ),
+            400,
+        )
+
+    problems = {
+        problem.id: problem
+        for problem in Problem.query.options(
+            joinedload(Problem.author), selectinload(Problem.attachments)
+        ).filter(Problem.id.in_(ids))
+    }
+    # Na ordem pedida; IDs inexistentes são listados à parte
+    return (
+        jsonify(
+            {
+                "items": [problems[id].to_dict() for id in ids if id in problems],
+                "missing": [id for id in ids if id not in problems],
+            }
+        ),
+        200,
+    )
+
+
+class OperationError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def run_operation(operation, problems):
+    # Aplica uma operação do lote e devolve (id, status); as regras de
+    # permissão são as mesmas das rotas individuais
+    if not isinstance(operation, dict):
+        raise OperationError(400, "Operação inválida")
+    op = operation.get("op")
+    data = operation.get("data") or {}
+    if not isinstance(data, dict):
+        raise OperationError(400, "Campo data inválido")
+    try:
+        fields = problem_fields(data)
+    except InvalidField as e:
+        raise OperationError(400, str(e))
+
+    if op == "create":
+        if not can_create_problem(current_user):
+            raise OperationError(403, "Acesso não autorizado")
+        if not has_required_fields(fields):
+            raise OperationError(400, "Todos os campos são obrigatórios")
+        problem = Problem(author_id=current_user.id)
+        apply_problem_fields(problem, fields)
+        db.session.add(problem)
+        db.session.flush()
+        return problem.id, 201
+
+    if op not in ("update", "delete"):
+        raise OperationError(400, "Operação desconhecida")
+    problem = problems.get(operation.get("id"))
+    if problem is None:
+        raise OperationError(404, "Problema não encontrado")
+
+    if op == "update":
+        if not can_edit_problem(current_user, problem):
+            raise OperationError(403, "Acesso não autorizado")
+        apply_problem_fields(problem, fields)
+    else:
+        if not can_delete_problem(current_user):
+            raise OperationError(403, "Acesso não autorizado")
+        remove_problem(problem)
+    db.session.flush()
+    if op == "delete":
+        del problems[problem.id]
+    return problem.id, 200
+
+
+@problem_bp.route("/batch", methods=["POST"])
+@login_required
+def batch_problems():
+    # Lista de operações create/update/delete aplicadas em uma transação:
+    # {"operations": [{"op": "update", "id": 1, "data": {...}}], "atomic": false}
+    # Cada operação roda em um savepoint: uma falha desfaz só aquele item,
+    # a menos que atomic seja true (aí qualquer falha desfaz o lote inteiro).
+    # Anexos continuam nas rotas individuais.
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get("operations"), list):
+        return jsonify({"error": "Informe a lista operations"}), 400
+    operations = payload["operations"]
+    atomic = bool(payload.get("atomic", False))
+    if len(operations) > current_app.config["BATCH_MAX_OPERATIONS"]:
+        return (
+            jsonify(
+                {
+                    "error": "Máximo de "
+                    f"{current_app.config['BATCH_MAX_OPERATIONS']} operações"
+                }
+            ),
+            400,
+        )
+
+    # Carregar de uma vez todos os problemas referenciados
+    ids = {
+        operation.get("id")
+        for operation in operations
+        if isinstance(operation, dict) and isinstance(operation.get("id"), int)
+    }
+    problems = {}
+    if ids:
+        problems = {
+            problem.id: problem
+            for problem in Problem.query.options(
+                selectinload(Problem.attachments)
+            ).filter(Problem.id.in_(ids))
+        }
+
+    results = []
+    failed = 0
+    for index, operation in enumerate(operations):
+        op = operation.get("op") if isinstance(operation, dict) else None
+        result = {"index": index, "op": op}
         try:
-            full_path = os.path.join(current_app.root_path, file_path)
-            if os.path.exists(full_path):
-                os.remove(full_path)
-        except:
-            pass
+            with db.session.begin_nested():
+                result["id"], result["status"] = run_operation(operation, problems)
+        except OperationError as e:
+            result["id"] = operation.get("id") if isinstance(operation, dict) else None
+            result["status"] = e.status
+            result["error"] = e.message
+        except SQLAlchemyError as e:
+            current_app.logger.error(f"Erro na operação {index} do lote: {e}")
+            result["id"] = operation.get("id") if isinstance(operation, dict) else None
+            result["status"] = 500
+            result["error"] = "Erro ao salvar problema"
+        if "error" in result:
+            failed += 1
+        results.append(result)
+        if failed and atomic:
+            break
+
+    if failed and atomic:
+        db.session.rollback()
+        return (
+            jsonify(
+                {
+                    "error": "Lote desfeito: uma das operações falhou",
+                    "results": results,
+                }
+            ),
+            400,
+        )
 
-    db.session.delete(problem)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Erro ao salvar lote: {e}")
+        return jsonify({"error": "Erro ao salvar lote"}), 500
+
+    return (
+        jsonify(
+            {
+                "results": results,
+                "succeeded": len(results) - failed,
+                "failed": failed,
+            }
+        ),
+        200,
+    )
+
+
+@problem_bp.route("/export", methods=["GET"])
+@login_required
+def export_problems():
+    # Somente admin pode exportar a base inteira
+    if current_user.role != "admin":
+        return jsonify({"error": "Acesso não autorizado"}), 403
+
+    # files=true gera um tar com o NDJSON e os arquivos anexados
+    with_files = request.args.get("files", "").lower() in ["1", "true"]
+    stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    if with_files:
+        body, mimetype, extension = bulk.iter_tar(), "application/x-tar", "tar"
+    else:
+        body, mimetype, extension = bulk.iter_ndjson(), "application/x-ndjson", "ndjson"
+
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers["Content-Disposition"] = file_serving.content_disposition(
+        f"wiki-export-{stamp}.{extension}", as_attachment=True
+    )
+    return response
 
-    return jsonify({"message": "Problema excluído com sucesso"}), 200
+
+def facet_values(facet):
+    # Valores com pelo menos um problema, lidos das contagens (facets.py)
+    rows = (
+        db.session.query(FacetCount.value)
+        .filter(FacetCount.facet == facet, FacetCount.count > 0)
+        .order_by(FacetCount.value)
+        .all()
+    )
+    return [row[0] for row in rows]
 
 
 @problem_bp.route("/categories", methods=["GET"])
+@response_cache.cached()
 def get_categories():
-    categories = db.session.query(Problem.category.distinct()).all()
-    return jsonify([category[0] for category in categories]), 200
+    return jsonify(facet_values(facets.CATEGORY)), 200
 
 
 @problem_bp.route("/tags", methods=["GET"])
+@response_cache.cached()
 def get_tags():
-    problems = Problem.query.all()
-    all_tags = set()
-
-    for problem in problems:
-        tags = problem.tags.split(",")
-        for tag in tags:
-            tag = tag.strip()
-            if tag:
-                all_tags.add(tag)
-
-    return jsonify(list(all_tags)), 200
+    return jsonify(facet_values(facets.TAG)), 200
+
+
+@problem_bp.route("/facets", methods=["GET"])
+@response_cache.cached()
+def get_facets():
+    # Quantidade de problemas por categoria, tag, autor e categoria×tag
+    # (?category= limita category_tags a uma categoria)
+    counts = facets.read(db.session.connection(), request.args.get("category"))
+    author_ids = [int(item["name"]) for item in counts[facets.AUTHOR]]
+    usernames = dict(
+        db.session.query(User.id, User.username).filter(User.id.in_(author_ids))
+    )
+    authors = [
+        {"id": id, "name": usernames.get(id), "count": item["count"]}
+        for id, item in zip(author_ids, counts[facets.AUTHOR])
+    ]
+    return (
+        jsonify(
+            {
+                "categories": counts[facets.CATEGORY],
+                "tags": counts[facets.TAG],
+                "authors": authors,
+                "category_tags": counts[facets.CATEGORY_TAG],
+            }
+        ),
+        200,
+    )
 
 
 # Rota para servir arquivos diretamente com opção de visualização inline
@@ -251,45 +839,74 @@ def serve_file(filename):
     # Verificar se é um pedido de download
     force_download = request.args.get("download", "false").lower() == "true"
 
+    # Tamanho da miniatura (?size=sm|md|lg); sem o parâmetro, envia o original
+    size = request.args.get("size")
+    if size and size not in current_app.config["THUMBNAIL_SIZES"]:
+        return jsonify({"error": "Tamanho de miniatura inválido"}), 400
+
     # Preparar o caminho do arquivo
     if filename.startswith("uploads/"):
         filename = filename[8:]  # Remove 'uploads/'
 
-    # Caminho completo para o arquivo
-    file_path = os.path.join(current_app.root_path, "uploads", filename)
-
-    # Verificar se o arquivo existe
-    if not os.path.exists(file_path):
-        return jsonify({"error": "Arquivo não encontrado"}), 404
-
-    # Extrair o nome original do arquivo (remover UUID)
-    original_filename = (
-        "_".join(filename.split("_")[1:]) if "_" in filename else filename
+    # Anexo (uma busca indexada, com os metadados gravados no upload); uploads
+    # em partes ainda não anexados são resolvidos pelo armazenamento
+    attachment = storage.find_attachment(filename)
+    if attachment is not None:
+        storage_name = attachment.storage_name
+        file_path = storage.file_path(storage_name)
+        original_filename = attachment.original_name
+        sha256, mimetype, file_size = (
+            attachment.sha256,
+            attachment.mime_type,
+            attachment.size,
+        )
+    else:
+        file_path, blob, original_filename = storage.resolve(filename)
+        storage_name = os.path.basename(file_path)
+        sha256 = blob.sha256 if blob else None
+        mimetype = file_size = None
+
+    # Miniatura pedida e ainda não gerada: o original vai no lugar dela, mas
+    # sem cache longo, senão o navegador nunca buscaria a miniatura
+    thumbnail_pending = False
+    if size and not force_download and thumbnails.is_image(storage_name):
+        response = serve_thumbnail(storage_name, size)
+        if response is not None:
+            return response
+        thumbnail_pending = True
+
+    # Imagens, PDFs e vídeos abrem no navegador (se não for forçado download)
+    as_attachment = (
+        force_download
+        or file_serving.extension_of(storage_name) not in file_serving.INLINE_EXTENSIONS
     )
 
-    # Obter o tipo de arquivo da extensão
-    file_ext = filename.rsplit(".", 1)[1].lower() if "." in filename else ""
+    try:
+        return file_serving.send_upload(
+            file_path,
+            download_name=original_filename,
+            as_attachment=as_attachment,
+            etag=sha256 or True,
+            # O conteúdo de um blob nunca muda: pode ficar em cache indefinidamente
+            immutable=sha256 is not None and not thumbnail_pending,
+            mimetype=mimetype,
+            size=file_size,
+        )
+    except FileNotFoundError:
+        return jsonify({"error": "Arquivo não encontrado"}), 404
 
-    # Configurar o tipo MIME para alguns tipos comuns
-    mime_types = {
-        "pdf": "application/pdf",
-        "jpg": "image/jpeg",
-        "jpeg": "image/jpeg",
-        "png": "image/png",
-        "gif": "image/gif",
-    }
 
-    mime_type = mime_types.get(file_ext, "application/octet-stream")
+def serve_thumbnail(filename, size):
+    # WebP para quem aceita, senão o formato de origem; se a miniatura ainda
+    # não existir, agenda a geração e deixa o original ser enviado
+    upload_folder = storage.upload_folder()
+    webp = "image/webp" in request.headers.get("Accept", "")
+    thumbnail = thumbnails.find_thumbnail(upload_folder, filename, size, webp)
 
-    # Verificar se é imagem ou PDF para abrir inline (se não for forçado download)
-    inline_exts = ["jpg", "jpeg", "png", "gif", "pdf"]
-    as_attachment = force_download or file_ext not in inline_exts
+    if not os.path.exists(thumbnail):
+        thumbnails.generate_in_background(filename)
+        return None
 
-    # Usar send_file que é mais confiável para diversos tipos de arquivo
-    return send_file(
-        file_path,
-        mimetype=mime_type,
-        as_attachment=as_attachment,
-        download_name=original_filename,
-        conditional=True,
-    )
+    response = file_serving.send_upload(thumbnail, max_age=86400)
+    response.vary.add("Accept")
+    return response
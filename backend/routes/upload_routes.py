@@ -0,0 +1,251 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from flask import Blueprint, request, jsonify, current_app
+from flask_login import current_user, login_required
+from models import UploadSession, db
+from werkzeug.utils import secure_filename
+import storage
+
+upload_bp = Blueprint("uploads", __name__)
+
+# Fluxo de upload em partes:
+#   POST   /api/uploads/                  -> inicia a sessão
+#   PUT    /api/uploads/<id>/chunks/<n>   -> envia a parte n (corpo bruto)
+#   GET    /api/uploads/<id>              -> partes já recebidas (para retomar)
+#   POST   /api/uploads/<id>/complete     -> monta e verifica o arquivo
+#   DELETE /api/uploads/<id>              -> cancela
+# O arquivo finalizado é anexado a um problema pelo campo "upload_ids" em
+# create_problem/update_problem.
+
+
+def chunk_dir(upload_id):
+    return os.path.join(storage.upload_folder(), storage.TEMP_DIR, "chunks", upload_id)
+
+
+def chunk_path(upload_id, index):
+    return os.path.join(chunk_dir(upload_id), f"{index}.part")
+
+
+def received_chunks(upload):
+    # Partes completas em disco (nome e tamanho conferem)
+    directory = chunk_dir(upload.id)
+    if not os.path.isdir(directory):
+        return []
+
+    received = []
+    for entry in os.scandir(directory):
+        name, _, extension = entry.name.partition(".")
+        if extension != "part" or not name.isdigit():
+            continue
+        index = int(name)
+        if index < upload.total_chunks and entry.stat().st_size == upload.chunk_length(
+            index
+        ):
+            received.append(index)
+    return sorted(received)
+
+
+def get_upload_or_404(upload_id):
+    upload = UploadSession.query.filter_by(
+        id=upload_id, user_id=current_user.id
+    ).first()
+    if upload is None:
+        return None, (jsonify({"error": "Upload não encontrado"}), 404)
+    return upload, None
+
+
+class ChunkReader:
+    # Lê as partes em sequência como se fossem um único arquivo, em blocos,
+    # sem carregar o arquivo inteiro na memória
+    def __init__(self, paths):
+        self._paths = iter(paths)
+        self._current = None
+
+    def read(self, size=-1):
+        while True:
+            if self._current is None:
+                path = next(self._paths, None)
+                if path is None:
+                    return b""
+                self._current = open(path, "rb")
+
+            data = self._current.read(size)
+            if data:
+                return data
+            self._current.close()
+            self._current = None
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+
+
+@upload_bp.route("/", methods=["POST"])
+@login_required
+def start_upload():
+    # Mesma regra de create_problem: somente admin ou técnico enviam arquivos
+    if current_user.role not in ["admin", "tecnico"]:
+        return jsonify({"error": "Acesso não autorizado"}), 403
+
+    data = request.get_json()
+    if not data or not data.get("filename") or not data.get("size"):
+        return jsonify({"error": "Nome e tamanho do arquivo são obrigatórios"}), 400
+
+    filename = secure_filename(data["filename"])
+    extension = filename.rsplit(".", 1)[1].lower() if "." in filename else ""
+    if extension not in current_app.config["ALLOWED_EXTENSIONS"]:
+        return jsonify({"error": "Tipo de arquivo não permitido"}), 400
+
+    try:
+        size = int(data["size"])
+    except (TypeError, ValueError):
+        return jsonify({"error": "Tamanho inválido"}), 400
+    if size <= 0 or size > current_app.config["MAX_UPLOAD_SIZE"]:
+        return jsonify({"error": "Tamanho de arquivo não permitido"}), 400
+
+    sha256 = data.get("sha256")
+    if sha256 is not None:
+        sha256 = str(sha256).lower()
+        if len(sha256) != 64:
+            return jsonify({"error": "Checksum SHA-256 inválido"}), 400
+
+    upload = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=current_user.id,
+        filename=filename,
+        size=size,
+        chunk_size=current_app.config["UPLOAD_CHUNK_SIZE"],
+        sha256=sha256,
+    )
+    db.session.add(upload)
+    db.session.commit()
+
+    os.makedirs(chunk_dir(upload.id), exist_ok=True)
+    return jsonify(upload.to_dict(received=[])), 201
+
+
+@upload_bp.route("/<upload_id>", methods=["GET"])
+@login_required
+def get_upload(upload_id):
+    upload, error = get_upload_or_404(upload_id)
+    if error:
+        return error
+
+    received = received_chunks(upload) if upload.status == "pending" else None
+    return jsonify(upload.to_dict(received=received)), 200
+
+
+@upload_bp.route("/<upload_id>/chunks/<int:index>", methods=["PUT"])
+@login_required
+def put_chunk(upload_id, index):
+    upload, error = get_upload_or_404(upload_id)
+    if error:
+        return error
+
+    if upload.status != "pending":
+        return jsonify({"error": "Upload já finalizado"}), 409
+    if index >= upload.total_chunks:
+        return jsonify({"error": "Parte inválida"}), 400
+
+    expected_length = upload.chunk_length(index)
+    expected_sha256 = request.headers.get("X-Chunk-SHA256")
+
+    # Gravar em arquivo temporário e renomear: uma parte interrompida nunca
+    # aparece como recebida
+    directory = chunk_dir(upload.id)
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    length = 0
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as output:
+            while True:
+                data = request.stream.read(storage.CHUNK_SIZE)
+                if not data:
+                    break
+                length += len(data)
+                if length > expected_length:
+                    break
+                digest.update(data)
+                output.write(data)
+
+        if length != expected_length:
+            os.remove(temp_path)
+            return (
+                jsonify(
+                    {"error": f"Tamanho da parte inválido (esperado {expected_length})"}
+                ),
+                400,
+            )
+
+        if expected_sha256 and digest.hexdigest() != expected_sha256.lower():
+            os.remove(temp_path)
+            return jsonify({"error": "Checksum da parte não confere"}), 400
+
+        os.replace(temp_path, chunk_path(upload.id, index))
+    except OSError as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        current_app.logger.error(f"Erro ao gravar parte {index} de {upload.id}: {e}")
+        return jsonify({"error": "Erro ao gravar a parte"}), 500
+
+    return jsonify({"index": index, "sha256": digest.hexdigest()}), 200
+
+
+@upload_bp.route("/<upload_id>/complete", methods=["POST"])
+@login_required
+def complete_upload(upload_id):
+    upload, error = get_upload_or_404(upload_id)
+    if error:
+        return error
+
+    if upload.status != "pending":
+        return jsonify(upload.to_dict()), 200
+
+    received = received_chunks(upload)
+    if len(received) != upload.total_chunks:
+        missing = sorted(set(range(upload.total_chunks)) - set(received))
+        return jsonify({"error": "Partes faltando", "missing": missing}), 409
+
+    # Montar o arquivo em streaming, calculando o hash ao mesmo tempo
+    reader = ChunkReader(
+        [chunk_path(upload.id, index) for index in range(upload.total_chunks)]
+    )
+    try:
+        temp_path, sha256, size = storage.write_temporary(reader)
+    finally:
+        reader.close()
+
+    if size != upload.size or (upload.sha256 and sha256 != upload.sha256):
+        os.remove(temp_path)
+        return jsonify({"error": "Checksum do arquivo não confere"}), 400
+
+    # A sessão passa a segurar uma referência ao blob até ser anexada
+    upload.reference = storage.store_file(temp_path, sha256, size, upload.filename)
+    upload.status = "complete"
+    db.session.commit()
+
+    shutil.rmtree(chunk_dir(upload.id), ignore_errors=True)
+    return jsonify(upload.to_dict()), 200
+
+
+@upload_bp.route("/<upload_id>", methods=["DELETE"])
+@login_required
+def cancel_upload(upload_id):
+    upload, error = get_upload_or_404(upload_id)
+    if error:
+        return error
+
+    if upload.status == "attached":
+        return jsonify({"error": "Upload já anexado a um problema"}), 409
+
+    if upload.status == "complete":
+        storage.release(upload.reference)
+    db.session.delete(upload)
+    db.session.commit()
+
+    shutil.rmtree(chunk_dir(upload.id), ignore_errors=True)
+    return jsonify({"message": "Upload cancelado"}), 200
@@ -0,0 +1,506 @@
+# Índice de busca textual dos problemas (título, descrição e o texto extraído
+# dos anexos, ver extraction.py).
+#
+# No SQLite usamos uma tabela virtual FTS5; em outros bancos (ou se o SQLite
+# não tiver FTS5) mantemos um índice invertido em uma tabela comum. Nos dois
+# casos o índice é atualizado na mesma transação que grava o problema, por
+# meio dos eventos de mapper do SQLAlchemy. O texto de um anexo pode chegar
+# depois (a extração roda em segundo plano): a tarefa de extração reindexa os
+# problemas que usam o arquivo.
+import math
+import re
+import unicodedata
+from collections import Counter, namedtuple
+
+from flask import current_app, has_app_context
+from markupsafe import escape
+from sqlalchemy import (
+    Column,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    case,
+    event,
+    func,
+    select,
+    text,
+)
+from sqlalchemy import inspect as db_inspect
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from models import Attachment, FileText, Problem
+
+TITLE_WEIGHT = 3
+# Texto dos anexos: no índice portátil cada termo conta uma vez, para que um
+# manual longo não supere o título e a descrição só pela repetição
+ATTACHMENT_WEIGHT = 1
+MAX_TERM_LENGTH = 64
+SNIPPET_RADIUS = 80
+
+# Marcadores dos termos no snippet() do FTS5 (caracteres de uso privado, que
+# não aparecem no texto): o trecho é escapado e só então eles viram <mark>
+_MARK_START = "\ue000"
+_MARK_END = "\ue001"
+
+SearchHit = namedtuple("SearchHit", ["problem_id", "score", "snippet"])
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_QUERY_TOKEN_RE = re.compile(r"\w+\*?", re.UNICODE)
+
+# Tabela do índice portátil. Fica fora de db.metadata para ser criada (e
+# populada) junto com o índice, e não por db.create_all().
+search_metadata = MetaData()
+search_terms = Table(
+    "search_terms",
+    search_metadata,
+    Column("term", String(MAX_TERM_LENGTH), nullable=False),
+    Column("problem_id", Integer, nullable=False),
+    Column("weight", Integer, nullable=False),
+    Index("ix_search_terms_term", "term", "problem_id"),
+    Index("ix_search_terms_problem_id", "problem_id"),
+)
+
+
+def fold(value):
+    # Minúsculas e sem acentos, preservando o tamanho do texto para que as
+    # posições encontradas possam ser usadas no texto original
+    folded = []
+    for char in value:
+        base = unicodedata.normalize("NFKD", char.lower()[:1])[:1] or char
+        folded.append(base)
+    return "".join(folded)
+
+
+def attachment_texts(connection, problem_ids):
+    # {problem_id: texto extraído dos anexos, na ordem dos anexos}
+    attachments = Attachment.__table__
+    texts = FileText.__table__
+    result = {}
+    rows = connection.execute(
+        select(attachments.c.problem_id, texts.c.text)
+        .join(texts, texts.c.sha256 == attachments.c.sha256)
+        .where(attachments.c.problem_id.in_(list(problem_ids)), texts.c.text != "")
+        .order_by(attachments.c.problem_id, attachments.c.position)
+    )
+    for problem_id, value in rows:
+        result.setdefault(problem_id, []).append(value)
+    return {problem_id: "\n".join(values) for problem_id, values in result.items()}
+
+
+def tokenize(value):
+    return [
+        token
+        for token in _TOKEN_RE.findall(fold(value or ""))
+        if len(token) <= MAX_TERM_LENGTH
+    ]
+
+
+class SearchIndex:
+    def __init__(self):
+        self._backends = {}
+
+    def init_app(self, app):
+        app.config.setdefault("SEARCH_BACKEND", "auto")
+        app.extensions["search_index"] = self
+
+    # --- Seleção e criação do índice -------------------------------------
+
+    def backend(self, connection):
+        key = str(connection.engine.url)
+        if key not in self._backends:
+            self._backends[key] = self._resolve_backend(connection)
+            self.ensure(connection)
+        return self._backends[key]
+
+    def _resolve_backend(self, connection):
+        configured = "auto"
+        if has_app_context():
+            configured = current_app.config.get("SEARCH_BACKEND", "auto")
+
+        if configured == "table":
+            return "table"
+
+        if connection.dialect.name == "sqlite" and self._fts5_available(connection):
+            return "fts5"
+
+        if configured == "fts5":
+            raise RuntimeError("FTS5 não está disponível neste banco de dados")
+        return "table"
+
+    @staticmethod
+    def _fts5_available(connection):
+        try:
+            connection.exec_driver_sql(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS temp._fts5_probe USING fts5(x)"
+            )
+            connection.exec_driver_sql("DROP TABLE temp._fts5_probe")
+            return True
+        except OperationalError:
+            return False
+
+    def ensure(self, connection):
+        # Cria o índice se ainda não existir e o popula com os problemas atuais
+        backend = self.backend(connection)
+
+        if backend == "fts5":
+            exists = connection.execute(
+                text(
+                    "SELECT 1 FROM sqlite_master "
+                    "WHERE type = 'table' AND name = 'problems_fts'"
+                )
+            ).first()
+            if exists:
+                columns = {
+                    row[1]
+                    for row in connection.exec_driver_sql(
+                        "PRAGMA table_info(problems_fts)"
+                    )
+                }
+                if "attachments" in columns:
+                    return
+                # Índice anterior à coluna com o texto dos anexos
+                connection.exec_driver_sql("DROP TABLE problems_fts")
+            connection.exec_driver_sql(
+                "CREATE VIRTUAL TABLE problems_fts USING fts5("
+                "title, description, attachments, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        else:
+            if connection.dialect.has_table(connection, search_terms.name):
+                return
+            search_terms.create(connection)
+
+        self.rebuild(connection)
+
+    def rebuild(self, connection):
+        backend = self.backend(connection)
+        problems = Problem.__table__
+
+        if backend == "fts5":
+            connection.exec_driver_sql("DELETE FROM problems_fts")
+            connection.exec_driver_sql(
+                "INSERT INTO problems_fts (rowid, title, description, attachments) "
+                "SELECT p.id, p.title, p.description, coalesce(("
+                "SELECT group_concat(t.text, char(10)) FROM attachments a "
+                "JOIN file_texts t ON t.sha256 = a.sha256 "
+                "WHERE a.problem_id = p.id AND t.text != ''), '') "
+                "FROM problems p"
+            )
+            return
+
+        connection.execute(search_terms.delete())
+        rows = connection.execute(
+            select(problems.c.id, problems.c.title, problems.c.description)
+        )
+        batch = []
+        for partition in rows.partitions(500):
+            texts = attachment_texts(connection, [row[0] for row in partition])
+            for problem_id, title, description in partition:
+                batch.extend(
+                    self._postings(
+                        problem_id, title, description, texts.get(problem_id)
+                    )
+                )
+            if len(batch) >= 5000:
+                connection.execute(search_terms.insert(), batch)
+                batch = []
+        if batch:
+            connection.execute(search_terms.insert(), batch)
+
+    # --- Manutenção incremental -------------------------------------------
+
+    @staticmethod
+    def _postings(problem_id, title, description, attachments=None):
+        weights = Counter()
+        for term in tokenize(title):
+            weights[term] += TITLE_WEIGHT
+        for term in tokenize(description):
+            weights[term] += 1
+        for term in set(tokenize(attachments)):
+            weights[term] += ATTACHMENT_WEIGHT
+        return [
+            {"term": term, "problem_id": problem_id, "weight": weight}
+            for term, weight in weights.items()
+        ]
+
+    def index(self, connection, problem, attachments=None):
+        # attachments: texto dos anexos, se já conhecido (None: consultar)
+        if attachments is None:
+            attachments = attachment_texts(connection, [problem.id]).get(problem.id)
+        self.remove(connection, problem.id)
+        self._insert(
+            connection, problem.id, problem.title, problem.description, attachments
+        )
+
+    def reindex(self, connection, problem_ids):
+        # Reindexa vários problemas (ex.: texto de um anexo extraído depois);
+        # IDs de problemas que não existem mais só saem do índice
+        problem_ids = list(problem_ids)
+        problems = Problem.__table__
+        rows = connection.execute(
+            select(problems.c.id, problems.c.title, problems.c.description).where(
+                problems.c.id.in_(problem_ids)
+            )
+        ).all()
+        texts = attachment_texts(connection, problem_ids)
+        for problem_id in problem_ids:
+            self.remove(connection, problem_id)
+        for problem_id, title, description in rows:
+            self._insert(
+                connection, problem_id, title, description, texts.get(problem_id)
+            )
+
+    def _insert(self, connection, problem_id, title, description, attachments):
+        if self.backend(connection) == "fts5":
+            connection.execute(
+                text(
+                    "INSERT INTO problems_fts (rowid, title, description, attachments) "
+                    "VALUES (:id, :title, :description, :attachments)"
+                ),
+                {
+                    "id": problem_id,
+                    "title": title,
+                    "description": description,
+                    "attachments": attachments or "",
+                },
+            )
+            return
+
+        postings = self._postings(problem_id, title, description, attachments)
+        if postings:
+            connection.execute(search_terms.insert(), postings)
+
+    def remove(self, connection, problem_id):
+        if self.backend(connection) == "fts5":
+            connection.execute(
+                text("DELETE FROM problems_fts WHERE rowid = :id"), {"id": problem_id}
+            )
+        else:
+            connection.execute(
+                search_terms.delete().where(search_terms.c.problem_id == problem_id)
+            )
+
+    # --- Consulta ---------------------------------------------------------
+
+    def search(self, connection, query, limit=20, offset=0):
+        if self.backend(connection) == "fts5":
+            return self._search_fts(connection, query, limit, offset)
+        return self._search_table(connection, query, limit, offset)
+
+    def _search_fts(self, connection, query, limit, offset):
+        # Cada palavra vira um termo entre aspas (AND implícito); um "*" no
+        # final da palavra habilita a busca por prefixo
+        terms = []
+        for token in _QUERY_TOKEN_RE.findall(query):
+            prefix = token.endswith("*")
+            terms.append('"%s"%s' % (token.rstrip("*"), "*" if prefix else ""))
+        if not terms:
+            return []
+
+        # O trecho vem da descrição; se ela não tiver os termos, do texto dos
+        # anexos
+        rows = connection.execute(
+            text(
+                "SELECT rowid, "
+                "bm25(problems_fts, :title_weight, 1.0, :attachment_weight) AS rank, "
+                "snippet(problems_fts, 1, :mark_start, :mark_end, '…', 16), "
+                "snippet(problems_fts, 2, :mark_start, :mark_end, '…', 16) "
+                "FROM problems_fts WHERE problems_fts MATCH :query "
+                "ORDER BY rank LIMIT :limit OFFSET :offset"
+            ),
+            {
+                "title_weight": float(TITLE_WEIGHT),
+                "attachment_weight": float(ATTACHMENT_WEIGHT),
+                "mark_start": _MARK_START,
+                "mark_end": _MARK_END,
+                "query": " ".join(terms),
+                "limit": limit,
+                "offset": offset,
+            },
+        )
+        return [
+            SearchHit(
+                row[0],
+                -row[1],
+                _marked_html(
+                    row[3]
+                    if _MARK_START not in row[2] and _MARK_START in row[3]
+                    else row[2]
+                ),
+            )
+            for row in rows
+        ]
+
+    def _search_table(self, connection, query, limit, offset):
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+
+        document_count = connection.execute(
+            select(func.count()).select_from(Problem.__table__)
+        ).scalar()
+        frequencies = dict(
+            connection.execute(
+                select(search_terms.c.term, func.count())
+                .where(search_terms.c.term.in_(terms))
+                .group_by(search_terms.c.term)
+            ).all()
+        )
+        # Todas as palavras precisam aparecer (mesma semântica do FTS5)
+        if len(frequencies) < len(terms):
+            return []
+
+        idf = {
+            term: math.log(1 + (document_count - df + 0.5) / (df + 0.5))
+            for term, df in frequencies.items()
+        }
+        score = func.sum(
+            search_terms.c.weight * case(idf, value=search_terms.c.term, else_=0.0)
+        ).label("score")
+        rows = connection.execute(
+            select(search_terms.c.problem_id, score)
+            .where(search_terms.c.term.in_(terms))
+            .group_by(search_terms.c.problem_id)
+            .having(func.count() == len(terms))
+            .order_by(score.desc(), search_terms.c.problem_id.desc())
+            .limit(limit)
+            .offset(offset)
+        ).all()
+        if not rows:
+            return []
+
+        problems = Problem.__table__
+        descriptions = {
+            problem_id: description or ""
+            for problem_id, description in connection.execute(
+                select(problems.c.id, problems.c.description).where(
+                    problems.c.id.in_([row[0] for row in rows])
+                )
+            )
+        }
+        # Encontrados só pelo texto dos anexos: trecho do anexo
+        texts = attachment_texts(
+            connection,
+            [
+                problem_id
+                for problem_id, _ in rows
+                if not contains_terms(descriptions.get(problem_id, ""), terms)
+            ],
+        )
+        hits = []
+        for problem_id, score in rows:
+            source = descriptions.get(problem_id, "")
+            if contains_terms(texts.get(problem_id, ""), terms):
+                source = texts[problem_id]
+            hits.append(SearchHit(problem_id, score, make_snippet(source, terms)))
+        return hits
+
+
+def contains_terms(value, terms):
+    return any(token in terms for token in tokenize(value))
+
+
+def _marked_html(snippet):
+    # Trecho do FTS5 em HTML: o texto escapado e os marcadores como <mark>
+    return (
+        str(escape(snippet))
+        .replace(_MARK_START, "<mark>")
+        .replace(_MARK_END, "</mark>")
+    )
+
+
+def make_snippet(value, terms):
+    # Trecho em HTML em volta do primeiro termo encontrado; o texto do
+    # problema é escapado, só as tags <mark> são inseridas
+    folded = fold(value)
+    positions = [
+        match.start() for match in _TOKEN_RE.finditer(folded) if match.group() in terms
+    ]
+    if not positions:
+        return str(escape(value[: SNIPPET_RADIUS * 2]))
+
+    start = max(positions[0] - SNIPPET_RADIUS, 0)
+    end = min(positions[0] + SNIPPET_RADIUS, len(value))
+    parts = []
+    cursor = start
+    for match in _TOKEN_RE.finditer(folded, start, end):
+        if match.group() in terms and match.end() <= end:
+            parts.append(escape(value[cursor : match.start()]))
+            term = value[match.start() : match.end()]
+            parts.append("<mark>%s</mark>" % escape(term))
+            cursor = match.end()
+    parts.append(escape(value[cursor:end]))
+
+    snippet = "".join(parts)
+    if start > 0:
+        snippet = "…" + snippet
+    if end < len(value):
+        snippet += "…"
+    return snippet
+
+
+search_index = SearchIndex()
+
+
+# Manter o índice sincronizado na mesma transação das alterações
+@event.listens_for(Problem, "after_insert")
+def _index_after_insert(mapper, connection, target):
+    # Os anexos de um problema novo são gravados depois dele (ver abaixo)
+    search_index.index(connection, target, attachments="")
+
+
+@event.listens_for(Problem, "after_update")
+def _index_after_update(mapper, connection, target):
+    state = db_inspect(target)
+    if (
+        state.attrs.title.history.has_changes()
+        or state.attrs.description.history.has_changes()
+    ):
+        search_index.index(connection, target)
+
+
+@event.listens_for(Problem, "after_delete")
+def _index_after_delete(mapper, connection, target):
+    search_index.remove(connection, target.id)
+
+
+@event.listens_for(Session, "after_flush")
+def _index_attachment_changes(session, flush_context):
+    # Anexos com texto extraído adicionados ou removidos mudam o texto do
+    # problema no índice. Os removidos da lista do problema (delete-orphan)
+    # não aparecem em session.deleted, só no histórico da relação.
+    attachments = [
+        instance
+        for instance in (*session.new, *session.deleted)
+        if isinstance(instance, Attachment)
+    ]
+    for problem in session.dirty:
+        if isinstance(problem, Problem):
+            history = db_inspect(problem).attrs.attachments.history
+            attachments.extend(history.added or ())
+            attachments.extend(history.deleted or ())
+
+    problems_by_hash = {}
+    for attachment in attachments:
+        if attachment.sha256:
+            problems_by_hash.setdefault(attachment.sha256, set()).add(
+                attachment.problem_id
+            )
+    if not problems_by_hash:
+        return
+
+    connection = session.connection()
+    texts = FileText.__table__
+    hashes = connection.execute(
+        select(texts.c.sha256).where(
+            texts.c.sha256.in_(list(problems_by_hash)), texts.c.text != ""
+        )
+    ).scalars()
+    problem_ids = {
+        problem_id for sha256 in hashes for problem_id in problems_by_hash[sha256]
+    }
+    if problem_ids:
+        search_index.reindex(connection, problem_ids)
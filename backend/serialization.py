@@ -0,0 +1,76 @@
+# Serialização JSON das respostas.
+# Com o orjson instalado (opcional), jsonify passa a usá-lo: a saída é a
+# mesma do provedor padrão do Flask (chaves ordenadas, formato compacto), bem
+# mais rápida para listas grandes. Tipos que o orjson não conhece (e datas,
+# que o Flask formata como data HTTP) passam pelo default do Flask; em modo
+# debug a saída indentada continua vindo do provedor padrão.
+#
+# stream_array() envia uma lista JSON em streaming: o primeiro byte sai antes
+# de a lista inteira ser montada e a memória fica limitada a um lote.
+from flask import Response, current_app, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # dependência opcional
+    orjson = None
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    available = orjson is not None
+
+    # UTF-8 em vez de escapes \uXXXX (menor e igual com ou sem o orjson)
+    ensure_ascii = False
+
+    def _compact(self):
+        return not (self.compact is False or self.compact is None and self._app.debug)
+
+    def dumps_bytes(self, obj):
+        # Serialização compacta em bytes, usada nas respostas
+        if orjson is not None:
+            option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            try:
+                return orjson.dumps(obj, default=self.default, option=option)
+            except (orjson.JSONEncodeError, TypeError):
+                # Ex.: inteiros acima de 64 bits ou chaves que não são texto
+                pass
+        return self.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    def response(self, *args, **kwargs):
+        if not self._compact():
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            self.dumps_bytes(obj) + b"\n", mimetype=self.mimetype
+        )
+
+
+def dumps_bytes(obj):
+    provider = current_app.json
+    if isinstance(provider, FastJSONProvider):
+        return provider.dumps_bytes(obj)
+    return provider.dumps(obj).encode("utf-8")
+
+
+def iter_array(items, chunk_size=STREAM_CHUNK_SIZE):
+    # Bytes de uma lista JSON, agrupados em blocos de ~chunk_size
+    buffer = bytearray(b"[")
+    first = True
+    for item in items:
+        if not first:
+            buffer += b","
+        buffer += dumps_bytes(item)
+        first = False
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += b"]\n"
+    yield bytes(buffer)
+
+
+def stream_array(items):
+    return Response(stream_with_context(iter_array(items)), mimetype="application/json")
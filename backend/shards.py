@@ -0,0 +1,134 @@
+# Subpastas por hash na pasta de uploads (e na de miniaturas): cada arquivo
+# fica em <pasta>/<aa>/<bb>/<nome>, com aa e bb os quatro primeiros dígitos do
+# SHA-256 (o do conteúdo, que já começa o nome dos blobs; nos arquivos antigos,
+# o do nome). Com 65.536 subpastas nenhum diretório cresce a ponto de deixar
+# buscas e backups lentos.
+#
+# Arquivos gravados antes ficam na raiz até serem movidos por migrate() (que
+# pode rodar com o servidor no ar): a leitura procura nos dois lugares.
+# Módulo sem dependências do app, usado por storage.py, thumbnails.py e
+# extraction.py.
+import hashlib
+import os
+import re
+
+_BLOB_NAME_RE = re.compile(r"^[0-9a-f]{64}\.")
+_SHARD_RE = re.compile(r"^[0-9a-f]{2}$")
+
+# Arquivos em gravação (renomeados ao final)
+_PARTIAL_SUFFIXES = (".part", ".tmp")
+
+
+def is_blob_name(name):
+    # <sha256>.<extensão> (armazenamento por conteúdo)
+    return _BLOB_NAME_RE.match(name) is not None
+
+
+def shard(name):
+    # (aa, bb) de um nome de arquivo
+    name = os.path.basename(name)
+    key = name if is_blob_name(name) else hashlib.sha256(name.encode()).hexdigest()
+    return key[:2], key[2:4]
+
+
+def path(folder, name):
+    # Local de um arquivo no formato com subpastas (onde os novos são gravados)
+    name = os.path.basename(name)
+    return os.path.join(folder, *shard(name), name)
+
+
+def flat_path(folder, name):
+    return os.path.join(folder, os.path.basename(name))
+
+
+def locate(folder, name):
+    # Caminho de um arquivo existente, na subpasta ou ainda na raiz. Se não
+    # estiver na raiz, o caminho na subpasta (o que também cobre um arquivo
+    # movido pela migração entre as duas verificações).
+    target = path(folder, name)
+    if os.path.exists(target):
+        return target
+    flat = flat_path(folder, name)
+    return flat if os.path.exists(flat) else target
+
+
+def prepare(folder, name):
+    # Caminho para gravar um arquivo novo, com a subpasta já criada
+    target = path(folder, name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    return target
+
+
+def is_shard(name):
+    return _SHARD_RE.match(name) is not None
+
+
+def iter_files(folder, flat=True):
+    # DirEntry de cada arquivo da pasta (subpastas e, com flat, a raiz), em
+    # streaming; outras pastas (tmp, thumbs) e arquivos ocultos ficam de fora
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if not is_shard(entry.name):
+                    continue
+                with os.scandir(entry.path) as level:
+                    for sub in level:
+                        if not sub.is_dir(follow_symlinks=False) or not is_shard(
+                            sub.name
+                        ):
+                            continue
+                        with os.scandir(sub.path) as files:
+                            for item in files:
+                                if _visible_file(item):
+                                    yield item
+            elif flat and _visible_file(entry):
+                yield entry
+
+
+def has_flat_files(folder):
+    # Há arquivos na raiz ainda não movidos para as subpastas?
+    try:
+        with os.scandir(folder) as entries:
+            return any(_movable(entry) for entry in entries)
+    except FileNotFoundError:
+        return False
+
+
+def _visible_file(entry):
+    return entry.is_file(follow_symlinks=False) and not entry.name.startswith(".")
+
+
+def _movable(entry):
+    return _visible_file(entry) and not entry.name.endswith(_PARTIAL_SUFFIXES)
+
+
+def migrate(folder, limit=None):
+    # Move até "limit" arquivos da raiz para as subpastas; retorna
+    # (movidos, nomes ignorados). Um arquivo que já exista na subpasta com o
+    # mesmo tamanho (o mesmo blob gravado de novo) só é removido da raiz; com
+    # tamanho diferente, fica onde está e é ignorado (de novo a cada chamada).
+    moved = 0
+    skipped = []
+    try:
+        entries = os.scandir(folder)
+    except FileNotFoundError:
+        return moved, skipped
+    with entries:
+        for entry in entries:
+            if limit is not None and moved >= limit:
+                break
+            if not _movable(entry):
+                continue
+            target = prepare(folder, entry.name)
+            try:
+                if os.path.exists(target):
+                    if os.path.getsize(target) != entry.stat().st_size:
+                        skipped.append(entry.name)
+                        continue
+                    os.remove(entry.path)
+                else:
+                    os.replace(entry.path, target)
+            except FileNotFoundError:
+                continue  # removido enquanto a pasta era percorrida
+            moved += 1
+    return moved, skipped
@@ -0,0 +1,340 @@
+# Armazenamento endereçado por conteúdo dos arquivos enviados.
+#
+# O conteúdo é gravado uma única vez em UPLOAD_FOLDER/<aa>/<bb>/<sha256>.<ext>
+# (subpastas pelo início do hash, ver shards.py). Os problemas guardam
+# referências no formato "uploads/<sha256>_<nome original>", o que mantém o
+# nome original como metadado (e compatível com o frontend, que exibe o que
+# vem depois do primeiro "_"). Cada referência incrementa o
+# contador do blob; quando ele chega a zero, a remoção do arquivo vira uma
+# tarefa da fila (jobs.py), criada na mesma transação. Arquivos antigos
+# ("uploads/<uuid>_<nome>") continuam funcionando.
+#
+# Cada referência anexada a um problema vira uma linha de attachments com os
+# metadados do arquivo (tamanho, tipo, dimensões, páginas), calculados uma vez
+# por conteúdo em attach(). O texto de PDFs (e imagens, com OCR) é extraído
+# em segundo plano para a busca (extraction.py).
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+
+from flask import current_app
+from PIL import Image
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import extraction
+import file_serving
+import jobs
+import shards
+import thumbnails
+from cache import MemoryCache
+from metrics import metrics
+from models import Attachment, Blob, FileText, db
+
+CHUNK_SIZE = 1024 * 1024
+TEMP_DIR = "tmp"
+SHARD_BATCH_SIZE = 2000  # arquivos movidos por tarefa de migração
+
+_REFERENCE_RE = re.compile(r"^(?:.*[/\\])?([0-9a-f]{64})_(.+)$")
+
+# Objetos de página de um PDF (não encontra páginas em object streams
+# comprimidos; nesse caso a contagem fica vazia)
+_PDF_PAGE_RE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+
+# Metadados por SHA-256: o conteúdo de um blob nunca muda
+_metadata_cache = MemoryCache(max_entries=4096, default_ttl=0)
+
+
+def upload_folder():
+    return os.path.join(current_app.root_path, current_app.config["UPLOAD_FOLDER"])
+
+
+def file_path(storage_name):
+    # Caminho de um arquivo da pasta de uploads (com ou sem subpasta)
+    return shards.locate(upload_folder(), storage_name)
+
+
+def parse_reference(reference):
+    # Retorna (sha256, nome original) de uma referência endereçada por
+    # conteúdo, ou None para arquivos no formato antigo
+    match = _REFERENCE_RE.match(reference)
+    if match is None:
+        return None
+    return match.group(1), match.group(2)
+
+
+def reference_name(reference):
+    # Nome do arquivo na pasta de uploads a partir de uma referência antiga.
+    # Versões anteriores montavam a referência com os.path.join, então no
+    # Windows o separador gravado é "\".
+    return re.split(r"[/\\]", reference)[-1]
+
+
+def make_reference(sha256, filename):
+    return f"{current_app.config['UPLOAD_FOLDER']}/{sha256}_{filename}"
+
+
+def write_temporary(stream):
+    # Copia o stream para um arquivo temporário calculando o hash em blocos,
+    # sem carregar o arquivo inteiro na memória
+    temp_dir = os.path.join(upload_folder(), TEMP_DIR)
+    os.makedirs(temp_dir, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=temp_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as output:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                output.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    metrics.inc("upload_bytes_total", size)
+    return temp_path, digest.hexdigest(), size
+
+
+def store_file(temp_path, sha256, size, filename):
+    # Registra um arquivo já gravado em temp_path e retorna a referência.
+    # O incremento do contador faz parte da transação atual.
+    extension = filename.rsplit(".", 1)[1].lower() if "." in filename else "bin"
+    with db.session.no_autoflush:
+        blob = Blob.query.filter_by(sha256=sha256).first()
+
+    if blob is None:
+        blob = Blob(
+            sha256=sha256,
+            extension=extension,
+            size=size,
+            original_name=filename,
+            ref_count=1,
+        )
+        try:
+            with db.session.begin_nested():
+                db.session.add(blob)
+        except IntegrityError:
+            # Outro upload do mesmo conteúdo registrou o blob antes
+            blob = Blob.query.filter_by(sha256=sha256).one()
+            _increment(blob)
+    else:
+        _increment(blob)
+
+    if os.path.exists(file_path(blob.storage_name)):
+        os.remove(temp_path)
+    else:
+        os.replace(temp_path, shards.prepare(upload_folder(), blob.storage_name))
+        thumbnails.schedule(blob.storage_name)
+        extraction.schedule(blob)
+
+    return make_reference(sha256, filename)
+
+
+def _increment(blob):
+    # UPDATE direto (como em release): atribuir "Blob.ref_count + 1" ao
+    # atributo perderia incrementos do mesmo blob antes do flush
+    db.session.query(Blob).filter_by(id=blob.id).update(
+        {Blob.ref_count: Blob.ref_count + 1}, synchronize_session=False
+    )
+
+
+def store(stream, filename):
+    temp_path, sha256, size = write_temporary(stream)
+    return store_file(temp_path, sha256, size, filename)
+
+
+def add_reference(sha256, filename):
+    # Nova referência a um conteúdo que já está armazenado, sem enviar o
+    # arquivo de novo; retorna None se o blob (ou o arquivo) não existir
+    with db.session.no_autoflush:
+        blob = Blob.query.filter_by(sha256=sha256).first()
+    if blob is None or not os.path.exists(file_path(blob.storage_name)):
+        return None
+
+    _increment(blob)
+    return make_reference(sha256, filename)
+
+
+def release(reference):
+    # Remove uma referência; o arquivo só é apagado (em segundo plano, depois
+    # do commit) se nenhum outro problema ainda usar o mesmo conteúdo
+    parsed = parse_reference(reference)
+    if parsed is None:
+        jobs.enqueue("delete_file", filename=reference_name(reference))
+        return
+
+    # O blob sem referências só é removido no commit (_delete_released): na
+    # mesma transação o conteúdo pode ser enviado de novo (um PUT que tira um
+    # anexo e envia o mesmo arquivo)
+    updated = (
+        db.session.query(Blob)
+        .filter_by(sha256=parsed[0])
+        .update({Blob.ref_count: Blob.ref_count - 1}, synchronize_session=False)
+    )
+    if updated:
+        db.session.info.setdefault("released_blobs", set()).add(parsed[0])
+
+
+@event.listens_for(Session, "before_commit")
+def _delete_released(session):
+    # Decide pelo contador final da transação quais blobs liberados ficaram
+    # sem referências
+    released = session.info.pop("released_blobs", None)
+    if not released:
+        return
+    for blob in session.query(Blob).filter(
+        Blob.sha256.in_(released), Blob.ref_count <= 0
+    ):
+        session.delete(blob)
+        jobs.enqueue("delete_file", filename=blob.storage_name, sha256=blob.sha256)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_released(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop("released_blobs", None)
+
+
+def resolve(reference):
+    # Retorna (caminho no disco, blob ou None, nome para download)
+    parsed = parse_reference(reference)
+    if parsed is not None:
+        blob = Blob.query.filter_by(sha256=parsed[0]).first()
+        if blob is not None:
+            return file_path(blob.storage_name), blob, parsed[1]
+
+    filename = reference_name(reference)
+    original_name = "_".join(filename.split("_")[1:]) if "_" in filename else filename
+    return file_path(filename), None, original_name
+
+
+def inspect_file(path):
+    # Tipo, tamanho, dimensões (imagens) e número de páginas (PDFs)
+    name = os.path.basename(path)
+    info = {
+        "mime_type": file_serving.mime_type_for(name),
+        "size": None,
+        "width": None,
+        "height": None,
+        "page_count": None,
+    }
+    try:
+        info["size"] = os.path.getsize(path)
+        if thumbnails.is_image(name):
+            # Só o cabeçalho é lido
+            with Image.open(path) as image:
+                info["width"], info["height"] = image.size
+        elif info["mime_type"] == "application/pdf" and info["size"]:
+            with open(path, "rb") as source, mmap.mmap(
+                source.fileno(), 0, access=mmap.ACCESS_READ
+            ) as data:
+                info["page_count"] = len(_PDF_PAGE_RE.findall(data)) or None
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        current_app.logger.warning(f"Metadados indisponíveis para {name}: {e}")
+    return info
+
+
+def file_metadata(storage_name, sha256=None, size=None):
+    # Metadados de um arquivo da pasta de uploads; os de blobs ficam em cache
+    if sha256 is not None:
+        info = _metadata_cache.get(sha256)
+        if info is not None:
+            return dict(info)
+
+    info = inspect_file(file_path(storage_name))
+    if size is not None:
+        info["size"] = size
+    if sha256 is not None:
+        _metadata_cache.set(sha256, dict(info))
+    return info
+
+
+def describe(reference):
+    # Colunas de Attachment para uma referência
+    parsed = parse_reference(reference)
+    blob = None
+    if parsed is not None:
+        with db.session.no_autoflush:
+            blob = Blob.query.filter_by(sha256=parsed[0]).first()
+
+    if blob is not None:
+        fields = {
+            "storage_name": blob.storage_name,
+            "original_name": parsed[1],
+            "sha256": blob.sha256,
+        }
+        fields.update(file_metadata(blob.storage_name, blob.sha256, blob.size))
+    else:
+        _, _, original_name = resolve(reference)
+        fields = {
+            "storage_name": reference_name(reference),
+            "original_name": original_name,
+            "sha256": None,
+        }
+        fields.update(file_metadata(fields["storage_name"]))
+    fields["reference"] = reference
+    return fields
+
+
+def attach(problem, references):
+    # Define os anexos do problema na ordem dada: os que já existiam são
+    # mantidos e os novos recebem os metadados do arquivo. Não altera os
+    # contadores dos blobs (feito por store/add_reference/release).
+    existing = {}
+    for attachment in problem.attachments:
+        existing.setdefault(attachment.reference, []).append(attachment)
+
+    attachments = []
+    for position, reference in enumerate(references):
+        kept = existing.get(reference)
+        attachment = kept.pop(0) if kept else Attachment(**describe(reference))
+        attachment.position = position
+        attachments.append(attachment)
+    problem.attachments = attachments
+
+
+def find_attachment(filename):
+    # Anexo pela referência (busca indexada), a partir do caminho da URL
+    reference = f"{current_app.config['UPLOAD_FOLDER']}/{os.path.basename(filename)}"
+    return Attachment.query.filter_by(reference=reference).first()
+
+
+@jobs.handler("delete_file")
+def delete_file(filename, sha256=None):
+    # O mesmo conteúdo pode ter sido enviado de novo depois da remoção
+    if sha256 is not None:
+        blob = Blob.query.filter_by(sha256=sha256).first()
+        if blob is not None and blob.ref_count > 0:
+            return
+
+    # Erros de E/S propagam para que a tarefa seja tentada novamente. O
+    # arquivo pode estar na subpasta ou ainda na raiz (antes da migração).
+    folder = upload_folder()
+    for path in [shards.path(folder, filename), shards.flat_path(folder, filename)]:
+        if os.path.exists(path):
+            os.remove(path)
+    if thumbnails.is_image(filename):
+        thumbnails.remove(folder, filename, current_app.config["THUMBNAIL_SIZES"])
+    # O texto extraído não fica guardado depois do arquivo
+    if sha256 is not None:
+        FileText.query.filter_by(sha256=sha256).delete()
+
+
+@jobs.handler("shard_uploads")
+def shard_uploads(batch_size=SHARD_BATCH_SIZE):
+    # Migração dos arquivos da raiz para as subpastas com o servidor no ar, um
+    # lote por tarefa (cada uma bem abaixo de JOB_LOCK_TIMEOUT); enquanto
+    # houver o que mover, a tarefa agenda a seguinte
+    folder = upload_folder()
+    moved = 0
+    for path in [folder, os.path.join(folder, thumbnails.THUMBNAIL_DIR)]:
+        moved += shards.migrate(path, limit=batch_size)[0]
+    if moved:
+        jobs.enqueue("shard_uploads", batch_size=batch_size)
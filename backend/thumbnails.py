@@ -0,0 +1,257 @@
+# Miniaturas e variantes WebP das imagens enviadas.
+# Para cada imagem são geradas, em cada tamanho de THUMBNAIL_SIZES, uma versão
+# WebP e uma versão no formato de origem (JPEG ou PNG) para navegadores sem
+# suporte a WebP. No upload a geração vira uma tarefa da fila (jobs.py); se
+# uma miniatura for pedida antes de existir, ela é gerada em um pool de
+# threads, sem bloquear a requisição.
+#
+# Cada imagem tem no máximo uma geração em andamento por processo, e uma
+# imagem que não pode ser decodificada ganha um marcador (<nome>.failed, na
+# pasta das miniaturas): pedidos seguintes enviam o original sem tentar de
+# novo. O marcador é removido pela geração com force (manage.py).
+import os
+import threading
+
+from flask import current_app
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+import jobs
+import shards
+from concurrency import cooperative, thread_pool
+
+IMAGE_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
+THUMBNAIL_DIR = "thumbs"
+
+FAILED_SUFFIX = ".failed"
+
+_executor = None
+_pending = set()  # imagens com geração em andamento no pool
+_pending_lock = threading.Lock()
+
+
+def is_image(filename):
+    return "." in filename and filename.rsplit(".", 1)[1].lower() in IMAGE_EXTENSIONS
+
+
+def _fallback_format(filename):
+    ext = filename.rsplit(".", 1)[1].lower()
+    return ("jpg", "JPEG") if ext in ["jpg", "jpeg"] else ("png", "PNG")
+
+
+def thumbnail_name(filename, size, webp=True):
+    extension = "webp" if webp else _fallback_format(filename)[0]
+    return f"{os.path.basename(filename)}.{size}.{extension}"
+
+
+def thumbnail_path(upload_folder, filename, size, webp=True):
+    # Local de gravação (subpastas como os originais, ver shards.py)
+    return shards.path(
+        os.path.join(upload_folder, THUMBNAIL_DIR), thumbnail_name(filename, size, webp)
+    )
+
+
+def find_thumbnail(upload_folder, filename, size, webp=True):
+    # Miniatura existente, na subpasta ou ainda na raiz de thumbs
+    return shards.locate(
+        os.path.join(upload_folder, THUMBNAIL_DIR), thumbnail_name(filename, size, webp)
+    )
+
+
+def failure_marker_path(upload_folder, filename):
+    return shards.path(
+        os.path.join(upload_folder, THUMBNAIL_DIR),
+        os.path.basename(filename) + FAILED_SUFFIX,
+    )
+
+
+def has_failed(upload_folder, filename):
+    # A imagem já falhou ao ser decodificada?
+    return os.path.exists(
+        shards.locate(
+            os.path.join(upload_folder, THUMBNAIL_DIR),
+            os.path.basename(filename) + FAILED_SUFFIX,
+        )
+    )
+
+
+def _mark_failed(upload_folder, filename):
+    marker = failure_marker_path(upload_folder, filename)
+    try:
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        with open(marker, "w"):
+            pass
+    except OSError as e:
+        current_app.logger.warning(f"Marcador de falha de {filename}: {e}")
+
+
+def _remove_failure_marker(upload_folder, filename):
+    folder = os.path.join(upload_folder, THUMBNAIL_DIR)
+    name = os.path.basename(filename) + FAILED_SUFFIX
+    for target in [shards.path(folder, name), shards.flat_path(folder, name)]:
+        try:
+            os.remove(target)
+        except FileNotFoundError:
+            pass
+
+
+def generate(upload_folder, filename, sizes, quality=80, force=False):
+    # Gera as variantes de uma imagem; retorna quantos arquivos foram criados
+    if force:
+        _remove_failure_marker(upload_folder, filename)
+    elif has_failed(upload_folder, filename):
+        return 0
+    source = shards.locate(upload_folder, filename)
+
+    targets = []
+    for size, max_side in sizes.items():
+        for webp in [True, False]:
+            if force or not os.path.exists(
+                find_thumbnail(upload_folder, filename, size, webp)
+            ):
+                targets.append(
+                    (
+                        max_side,
+                        webp,
+                        thumbnail_path(upload_folder, filename, size, webp),
+                    )
+                )
+    if not targets:
+        return 0
+    os.makedirs(os.path.dirname(targets[0][2]), exist_ok=True)
+
+    try:
+        original = Image.open(source)
+    except FileNotFoundError as e:
+        current_app.logger.error(f"Erro ao gerar miniaturas de {filename}: {e}")
+        return 0
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        current_app.logger.error(f"Imagem inválida, sem miniaturas: {filename}: {e}")
+        _mark_failed(upload_folder, filename)
+        return 0
+
+    with original:
+        try:
+            original.seek(0)
+            image = ImageOps.exif_transpose(original)
+            if image.mode not in ["RGB", "RGBA"]:
+                image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+            image.load()
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            # Conteúdo truncado ou corrompido: não adianta tentar de novo
+            current_app.logger.error(
+                f"Imagem inválida, sem miniaturas: {filename}: {e}"
+            )
+            _mark_failed(upload_folder, filename)
+            return 0
+
+        created = 0
+        try:
+            for max_side, webp, target in targets:
+                resized = image.copy()
+                resized.thumbnail((max_side, max_side), Image.LANCZOS)
+
+                fmt = "WEBP" if webp else _fallback_format(filename)[1]
+                if fmt == "JPEG" and resized.mode != "RGB":
+                    resized = resized.convert("RGB")
+
+                # Gravar em arquivo temporário e renomear, para que uma
+                # leitura concorrente nunca veja uma miniatura incompleta
+                temporary = f"{target}.tmp"
+                resized.save(temporary, fmt, quality=quality, optimize=True)
+                os.replace(temporary, target)
+                created += 1
+        except OSError as e:
+            # Erro de gravação (disco cheio, permissão): pode ser tentado de novo
+            current_app.logger.error(f"Erro ao gerar miniaturas de {filename}: {e}")
+        return created
+
+
+def remove(upload_folder, filename, sizes):
+    _remove_failure_marker(upload_folder, filename)
+    for size in sizes:
+        for webp in [True, False]:
+            name = thumbnail_name(filename, size, webp)
+            folder = os.path.join(upload_folder, THUMBNAIL_DIR)
+            for target in [shards.path(folder, name), shards.flat_path(folder, name)]:
+                try:
+                    os.remove(target)
+                except FileNotFoundError:
+                    pass
+
+
+def _get_executor(app):
+    global _executor
+    if _executor is None:
+        _executor = thread_pool(
+            app.config["THUMBNAIL_WORKERS"], thread_name_prefix="thumbnails"
+        )
+    return _executor
+
+
+def _submit(app, filename, force=False):
+    # Geração no pool, com o contexto do app
+    upload_folder = os.path.join(app.root_path, app.config["UPLOAD_FOLDER"])
+
+    def run():
+        with app.app_context():
+            return generate(
+                upload_folder,
+                filename,
+                app.config["THUMBNAIL_SIZES"],
+                app.config["THUMBNAIL_QUALITY"],
+                force=force,
+            )
+
+    return _get_executor(app).submit(run)
+
+
+def schedule(filename):
+    # Cria a tarefa de geração na transação atual
+    if is_image(filename):
+        jobs.enqueue("generate_thumbnails", filename=filename)
+
+
+@jobs.handler("generate_thumbnails")
+def generate_job(filename, force=False):
+    app = current_app._get_current_object()
+    if cooperative():
+        # Com gevent a tarefa é um greenlet: o redimensionamento vai para uma
+        # thread do sistema para não parar as requisições do processo
+        _submit(app, filename, force=force).result()
+        return
+    generate(
+        os.path.join(app.root_path, app.config["UPLOAD_FOLDER"]),
+        filename,
+        app.config["THUMBNAIL_SIZES"],
+        app.config["THUMBNAIL_QUALITY"],
+        force=force,
+    )
+
+
+def generate_in_background(filename):
+    # Gera as miniaturas no pool de threads e retorna imediatamente; None se
+    # a imagem já estiver sendo processada ou não puder ser decodificada
+    if not is_image(filename):
+        return None
+    app = current_app._get_current_object()
+    upload_folder = os.path.join(app.root_path, app.config["UPLOAD_FOLDER"])
+    if has_failed(upload_folder, filename):
+        return None
+
+    with _pending_lock:
+        if filename in _pending:
+            return None
+        _pending.add(filename)
+    try:
+        future = _submit(app, filename)
+    except BaseException:
+        with _pending_lock:
+            _pending.discard(filename)
+        raise
+    future.add_done_callback(lambda _: _discard_pending(filename))
+    return future
+
+
+def _discard_pending(filename):
+    with _pending_lock:
+        _pending.discard(filename)
@@ -0,0 +1,251 @@
+# Verificação de consistência entre a pasta de uploads e o banco, e remoção
+# dos arquivos órfãos (de commits que falharam, remoções que não chegaram ao
+# fim, uploads interrompidos).
+#
+# A pasta é percorrida em streaming (os.scandir, subpasta por subpasta) e os
+# nomes são conferidos com o banco em lotes de SCAN_BATCH_SIZE, então a
+# memória usada não depende do número de arquivos. Um arquivo está em uso se
+# algum anexo de problema, blob com referências ou upload em partes concluído
+# aponta para ele; miniaturas seguem a imagem de origem. No sentido inverso,
+# blobs e anexos antigos são lidos em lotes para encontrar referências sem
+# arquivo.
+#
+# Remoção segura: arquivos mais novos que UPLOAD_GC_GRACE são ignorados (podem
+# ser de um upload cujo commit ainda não aconteceu) e cada lote de órfãos é
+# conferido de novo com o banco, com a escrita bloqueada, logo antes de os
+# arquivos serem apagados.
+import os
+import time
+
+from flask import current_app
+from sqlalchemy import select, update
+
+import shards
+import storage
+import thumbnails
+from models import Attachment, Blob, UploadSession, db
+
+SCAN_BATCH_SIZE = 1000
+MAX_LISTED = 20
+
+FILE = "file"
+THUMBNAIL = "thumbnail"
+TEMPORARY = "temporary"
+
+
+class ScanReport:
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.flat = 0  # ainda na raiz (migração para as subpastas pendente)
+        self.orphans = 0
+        self.orphan_bytes = 0
+        self.recent = 0  # órfãos dentro do prazo de carência (mantidos)
+        self.recent_bytes = 0
+        self.removed = 0
+        self.removed_bytes = 0
+        self.orphan_examples = []
+        self.missing = 0  # referências cujo arquivo não existe
+        self.missing_examples = []
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+
+def iter_entries(folder):
+    # (tipo, DirEntry, nome do arquivo de origem) de tudo o que está na pasta
+    for entry in shards.iter_files(folder):
+        yield FILE, entry, entry.name
+
+    thumbs = os.path.join(folder, thumbnails.THUMBNAIL_DIR)
+    if os.path.isdir(thumbs):
+        for entry in shards.iter_files(thumbs):
+            if entry.name.endswith(thumbnails.FAILED_SUFFIX):
+                # Marcador de imagem que não pôde ser decodificada
+                source = entry.name[: -len(thumbnails.FAILED_SUFFIX)]
+            else:
+                source = entry.name.rsplit(".", 2)[0]  # <origem>.<tamanho>.<formato>
+            yield THUMBNAIL, entry, source
+
+    temporary = os.path.join(folder, storage.TEMP_DIR)
+    if os.path.isdir(temporary):
+        # Só os arquivos de upload; as partes (tmp/chunks) são das sessões de
+        # upload, removidas por "manage.py cleanup-uploads"
+        with os.scandir(temporary) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    yield TEMPORARY, entry, None
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def session_hashes():
+    # SHA-256 dos uploads em partes concluídos e ainda não anexados (poucos)
+    hashes = set()
+    for (reference,) in db.session.execute(
+        select(UploadSession.reference).where(
+            UploadSession.status == "complete", UploadSession.reference.isnot(None)
+        )
+    ):
+        parsed = storage.parse_reference(reference)
+        if parsed is not None:
+            hashes.add(parsed[0])
+    return hashes
+
+
+def referenced(names, pending_hashes=frozenset()):
+    # Subconjunto de "names" (nomes na pasta de uploads) em uso
+    names = set(names)
+    hashes = {name[:64] for name in names if shards.is_blob_name(name)}
+    used = set()
+    if hashes:
+        used.update(
+            f"{sha256}.{extension}"
+            for sha256, extension in db.session.execute(
+                select(Blob.sha256, Blob.extension).where(
+                    Blob.sha256.in_(hashes),
+                    (Blob.ref_count > 0) | Blob.sha256.in_(pending_hashes & hashes),
+                )
+            )
+        )
+    if names:
+        # Pelo nome na pasta, e não pela referência: a dos arquivos antigos
+        # depende de UPLOAD_FOLDER e do separador da época. Anexos contam
+        # mesmo que o contador do blob esteja errado.
+        used.update(
+            db.session.execute(
+                select(Attachment.storage_name)
+                .where(Attachment.storage_name.in_(names))
+                .distinct()
+            ).scalars()
+        )
+    return used & names
+
+
+def _lock_blobs(names):
+    # Bloqueia a escrita até o fim da transação: no SQLite qualquer UPDATE
+    # (mesmo sem linhas alteradas) reserva o banco, e um upload do mesmo
+    # conteúdo em andamento termina antes (ou só começa depois) da remoção
+    hashes = [name[:64] for name in names if shards.is_blob_name(name)]
+    db.session.execute(
+        update(Blob)
+        .where(Blob.sha256.in_(hashes or [""]))
+        .values(ref_count=Blob.ref_count)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _remove(report, candidates, pending_hashes):
+    # Remove os órfãos de um lote depois de conferi-los de novo
+    try:
+        _lock_blobs([source for _, _, source, _ in candidates if source])
+        still_used = referenced(
+            [source for _, _, source, _ in candidates if source], pending_hashes
+        )
+        for kind, path, source, size in candidates:
+            if source in still_used:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            report.removed += 1
+            report.removed_bytes += size
+    finally:
+        db.session.rollback()
+
+
+def scan(delete=False, grace=None, batch_size=SCAN_BATCH_SIZE, progress=None):
+    # Percorre a pasta de uploads e o banco; com delete, remove os órfãos
+    folder = storage.upload_folder()
+    if grace is None:
+        grace = current_app.config["UPLOAD_GC_GRACE"]
+    limit = time.time() - grace.total_seconds()
+    report = ScanReport()
+    pending_hashes = frozenset(session_hashes())
+
+    for batch in _batches(iter_entries(folder), batch_size):
+        sources = {source for _, _, source in batch if source}
+        used = referenced(sources, pending_hashes)
+        db.session.rollback()  # não manter a transação de leitura aberta
+
+        candidates = []
+        for kind, entry, source in batch:
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            report.files += 1
+            report.bytes += stat.st_size
+            if kind == FILE and os.path.dirname(entry.path) == folder:
+                report.flat += 1
+            if source in used:
+                continue
+
+            if stat.st_mtime > limit:
+                report.recent += 1
+                report.recent_bytes += stat.st_size
+                continue
+            report.orphans += 1
+            report.orphan_bytes += stat.st_size
+            if len(report.orphan_examples) < MAX_LISTED:
+                report.orphan_examples.append(os.path.relpath(entry.path, folder))
+            candidates.append((kind, entry.path, source, stat.st_size))
+
+        if delete and candidates:
+            _remove(report, candidates, pending_hashes)
+        if progress is not None:
+            progress(report)
+
+    _find_missing(report, batch_size)
+    return report
+
+
+def _find_missing(report, batch_size):
+    # Blobs em uso e anexos antigos cujo arquivo não existe mais
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(Blob.id, Blob.sha256, Blob.extension)
+            .where(Blob.id > last_id, Blob.ref_count > 0)
+            .order_by(Blob.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            _check_exists(report, f"{row.sha256}.{row.extension}")
+        last_id = rows[-1].id
+
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(Attachment.id, Attachment.storage_name)
+            .where(Attachment.id > last_id, Attachment.sha256.is_(None))
+            .order_by(Attachment.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            _check_exists(report, row.storage_name)
+        last_id = rows[-1].id
+    db.session.rollback()
+
+
+def _check_exists(report, name):
+    if not os.path.exists(storage.file_path(name)):
+        report.missing += 1
+        if len(report.missing_examples) < MAX_LISTED:
+            report.missing_examples.append(name)
@@ -0,0 +1,5 @@
+# Ponto de entrada para servidores WSGI de produção, por exemplo:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+# O esquema do banco é preparado uma única vez pelo processo principal do
+# gunicorn (veja gunicorn.conf.py), e não por cada worker.
+from app import app
@@ -6,7 +6,8 @@ import axios from 'axios';
 
 const CategoryList = () => {
   const [categories, setCategories] = useState([]);
-  const [problemsByCategory, setProblemsByCategory] = useState({});
+  const [tagsByCategory, setTagsByCategory] = useState({});
+  const [categoryProblems, setCategoryProblems] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const [selectedCategory, setSelectedCategory] = useState(null);
@@ -15,25 +16,13 @@ const CategoryList = () => {
     const fetchData = async () => {
       try {
         setLoading(true);
-        const [categoriesRes, problemsRes] = await Promise.all([
-          axios.get('/api/problems/categories'),
-          axios.get('/api/problems')
-        ]);
-        
-        const cats = categoriesRes.data;
-        const probs = problemsRes.data;
-        
-        // Agrupar problemas por categoria
-        const grouped = {};
-        cats.forEach(category => {
-          grouped[category] = probs.filter(problem => problem.category === category);
-        });
-        
-        setCategories(cats);
-        setProblemsByCategory(grouped);
+        // Contagens prontas no servidor (sem carregar todos os problemas)
+        const facetsRes = await axios.get('/api/problems/facets');
+        setCategories(facetsRes.data.categories);
+        setTagsByCategory(facetsRes.data.category_tags);
       } catch (error) {
         console.error('Erro ao carregar dados:', error);
-        setError('Falha ao carregar categorias e problemas.');
+        setError('Falha ao carregar categorias.');
       } finally {
         setLoading(false);
       }
@@ -42,6 +31,28 @@ const CategoryList = () => {
     fetchData();
   }, []);
   
+  // Carregar somente os problemas da categoria selecionada
+  useEffect(() => {
+    if (!selectedCategory) {
+      setCategoryProblems([]);
+      return;
+    }
+    
+    const fetchProblems = async () => {
+      try {
+        const res = await axios.get('/api/problems', {
+          params: { category: selectedCategory }
+        });
+        setCategoryProblems(res.data);
+      } catch (error) {
+        console.error('Erro ao carregar problemas:', error);
+        setError('Falha ao carregar problemas da categoria.');
+      }
+    };
+    
+    fetchProblems();
+  }, [selectedCategory]);
+  
   if (loading) {
     return <div>Carregando...</div>;
   }
@@ -60,8 +71,6 @@ const CategoryList = () => {
   
   // Renderização condicional baseada em se uma categoria está selecionada ou não
   if (selectedCategory) {
-    const categoryProblems = problemsByCategory[selectedCategory] || [];
-    
     return (
       <div>
         <div className="d-flex align-items-center mb-4">
@@ -136,39 +145,29 @@ const CategoryList = () => {
               <Card className="h-100">
                 <Card.Header className="bg-light" 
                   style={{ cursor: 'pointer' }} 
-                  onClick={() => handleCategorySelect(category)}
+                  onClick={() => handleCategorySelect(category.name)}
                 >
                   <div className="d-flex align-items-center">
                     <FaFolder className="me-2 text-primary" />
-                    <h5 className="mb-0">{category}</h5>
+                    <h5 className="mb-0">{category.name}</h5>
                   </div>
                 </Card.Header>
                 <Card.Body>
                   <Card.Text>
-                    {problemsByCategory[category]?.length || 0} problema(s) nesta categoria
+                    {category.count} problema(s) nesta categoria
                   </Card.Text>
                   
                   <ListGroup variant="flush">
-                    {(problemsByCategory[category] || []).slice(0, 5).map(problem => (
-                      <ListGroup.Item key={problem.id} className="border-0 px-0">
-                        <Link 
-                          to={`/problem/${problem.id}`}
-                          className="text-decoration-none"
-                        >
-                          {problem.title}
-                        </Link>
+                    {(tagsByCategory[category.name] || []).slice(0, 5).map(tag => (
+                      <ListGroup.Item key={tag.name} className="border-0 px-0 d-flex justify-content-between">
+                        <span className="badge bg-secondary">{tag.name}</span>
+                        <span className="text-muted">{tag.count}</span>
                       </ListGroup.Item>
                     ))}
                     
-                    {(problemsByCategory[category] || []).length > 5 && (
+                    {(tagsByCategory[category.name] || []).length > 5 && (
                       <ListGroup.Item className="border-0 px-0 text-center">
-                        <em>E mais {problemsByCategory[category].length - 5} problema(s)...</em>
-                      </ListGroup.Item>
-                    )}
-                    
-                    {(problemsByCategory[category] || []).length === 0 && (
-                      <ListGroup.Item className="border-0 px-0 text-center text-muted">
-                        Nenhum problema nesta categoria
+                        <em>E mais {tagsByCategory[category.name].length - 5} tag(s)...</em>
                       </ListGroup.Item>
                     )}
                   </ListGroup>
@@ -178,7 +177,7 @@ const CategoryList = () => {
                     variant="outline-primary"
                     size="sm"
                     className="w-100"
-                    onClick={() => handleCategorySelect(category)}
+                    onClick={() => handleCategorySelect(category.name)}
                   >
                     Ver Todos
                   </Button>
@@ -325,7 +325,7 @@ const EditProblem = () => {
                             {fileType === 'image' ? (
                               <div className="text-center">
                                 <img 
-                                  src={fileUrl} 
+                                  src={`${fileUrl}?size=sm`} 
                                   alt={`Arquivo ${idx + 1}`}
                                   className="img-fluid mb-2"
                                   style={{ maxHeight: '120px', objectFit: 'contain' }}
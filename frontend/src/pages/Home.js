@@ -5,6 +5,10 @@ import { FaSearch, FaTags } from 'react-icons/fa';
 import axios from 'axios';
 import ReactMarkdown from 'react-markdown';
 import rehypeRaw from 'rehype-raw';
+import { syncProblems } from '../problemSync';
+
+// Intervalo entre as tentativas de reconectar aos eventos (ms)
+const EVENTS_RETRY_DELAY = 30000;
 
 const Home = () => {
   const [problems, setProblems] = useState([]);
@@ -19,14 +23,15 @@ const Home = () => {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const [problemsRes, tagsRes, categoriesRes] = await Promise.all([
-          axios.get('/api/problems'),
+        // Lista mantida localmente; só as alterações são baixadas
+        const [problemsData, tagsRes, categoriesRes] = await Promise.all([
+          syncProblems(),
           axios.get('/api/problems/tags'),
           axios.get('/api/problems/categories')
         ]);
         
-        setProblems(problemsRes.data);
-        setFilteredProblems(problemsRes.data);
+        setProblems(problemsData);
+        setFilteredProblems(problemsData);
         setTags(tagsRes.data);
         setCategories(categoriesRes.data);
       } catch (error) {
@@ -39,6 +44,46 @@ const Home = () => {
     fetchData();
   }, []);
 
+  // Atualizações em tempo real: a cada evento (ou várias seguidas), baixar
+  // só as alterações pelo feed
+  useEffect(() => {
+    if (!window.EventSource) return;
+    let source = null;
+    let timer = null;
+    let retryTimer = null;
+    const refresh = () => {
+      clearTimeout(timer);
+      timer = setTimeout(async () => {
+        try {
+          setProblems(await syncProblems());
+        } catch (error) {
+          console.error('Erro ao atualizar problemas:', error);
+        }
+      }, 500);
+    };
+    const connect = (reconnecting) => {
+      source = new EventSource('/api/problems/events');
+      source.addEventListener('problem', refresh);
+      source.addEventListener('reset', refresh);
+      // Alterações feitas enquanto a aba estava sem conexão
+      if (reconnecting) source.onopen = refresh;
+      source.onerror = () => {
+        // Quedas comuns o navegador reconecta sozinho; uma conexão recusada
+        // (ex.: 503 com o servidor no limite de conexões) fica fechada de
+        // vez. Nesse caso, sincronizar agora e tentar de novo mais tarde.
+        if (source.readyState !== EventSource.CLOSED) return;
+        refresh();
+        retryTimer = setTimeout(() => connect(true), EVENTS_RETRY_DELAY);
+      };
+    };
+    connect(false);
+    return () => {
+      clearTimeout(timer);
+      clearTimeout(retryTimer);
+      source.close();
+    };
+  }, []);
+
   useEffect(() => {
     // Filtrar problemas com base nos critérios selecionados
     let filtered = [...problems];
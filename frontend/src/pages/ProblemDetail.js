@@ -17,6 +17,7 @@ const ProblemDetail = () => {
   const [selectedImage, setSelectedImage] = useState(null);
   const [showImageModal, setShowImageModal] = useState(false);
   const [youtubeVideoId, setYoutubeVideoId] = useState(null);
+  const [relatedProblems, setRelatedProblems] = useState([]);
   
   useEffect(() => {
     const fetchData = async () => {
@@ -44,6 +45,14 @@ const ProblemDetail = () => {
     fetchData();
   }, [id, navigate]);
   
+  // Problemas parecidos (carregados à parte, sem atrasar a página)
+  useEffect(() => {
+    setRelatedProblems([]);
+    axios.get(`/api/problems/${id}/related`)
+      .then(res => setRelatedProblems(res.data))
+      .catch(error => console.error('Erro ao carregar problemas relacionados:', error));
+  }, [id]);
+  
   // Função para extrair ID do vídeo do YouTube
   const extractYoutubeId = (url) => {
     if (!url) return;
@@ -297,7 +306,7 @@ const ProblemDetail = () => {
                           {fileType === 'image' ? (
                             <div className="text-center mb-2">
                               <img 
-                                src={fileViewUrl} 
+                                src={`${fileViewUrl}?size=sm`} 
                                 alt={`Anexo ${idx + 1}`} 
                                 className="img-fluid mb-2"
                                 style={{ maxHeight: '150px', cursor: 'pointer' }}
@@ -367,6 +376,26 @@ const ProblemDetail = () => {
         </Card.Body>
       </Card>
       
+      {relatedProblems.length > 0 && (
+        <Card className="mb-4">
+          <Card.Header className="bg-light">
+            <h5 className="mb-0">Problemas relacionados</h5>
+          </Card.Header>
+          <Card.Body>
+            <ul className="list-unstyled mb-0">
+              {relatedProblems.map(related => (
+                <li key={related.id} className="mb-2">
+                  <Link to={`/problem/${related.id}`} className="text-decoration-none">
+                    {related.title}
+                  </Link>
+                  <Badge bg="light" text="dark" className="ms-2">{related.category}</Badge>
+                </li>
+              ))}
+            </ul>
+          </Card.Body>
+        </Card>
+      )}
+      
       {/* Modal de confirmação para exclusão */}
       <Modal show={showDeleteModal} onHide={() => setShowDeleteModal(false)}>
         <Modal.Header closeButton>
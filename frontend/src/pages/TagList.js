@@ -6,7 +6,7 @@ import axios from 'axios';
 
 const TagList = () => {
   const [tags, setTags] = useState([]);
-  const [problems, setProblems] = useState([]);
+  const [categoriesByTag, setCategoriesByTag] = useState({});
   const [filteredTags, setFilteredTags] = useState([]);
   const [searchTerm, setSearchTerm] = useState('');
   const [loading, setLoading] = useState(true);
@@ -18,17 +18,25 @@ const TagList = () => {
     const fetchData = async () => {
       try {
         setLoading(true);
-        const [tagsRes, problemsRes] = await Promise.all([
-          axios.get('/api/problems/tags'),
-          axios.get('/api/problems')
-        ]);
+        // Contagens prontas no servidor (sem carregar todos os problemas)
+        const facetsRes = await axios.get('/api/problems/facets');
         
-        setTags(tagsRes.data);
-        setFilteredTags(tagsRes.data);
-        setProblems(problemsRes.data);
+        // Categorias de cada tag, a partir das contagens categoria×tag
+        const byTag = {};
+        Object.entries(facetsRes.data.category_tags).forEach(([category, items]) => {
+          items.forEach(item => {
+            byTag[item.name] = byTag[item.name] || [];
+            byTag[item.name].push({ name: category, count: item.count });
+          });
+        });
+        Object.values(byTag).forEach(items => items.sort((a, b) => b.count - a.count));
+        
+        setTags(facetsRes.data.tags);
+        setFilteredTags(facetsRes.data.tags);
+        setCategoriesByTag(byTag);
       } catch (error) {
         console.error('Erro ao carregar dados:', error);
-        setError('Falha ao carregar tags e problemas.');
+        setError('Falha ao carregar tags.');
       } finally {
         setLoading(false);
       }
@@ -43,23 +51,29 @@ const TagList = () => {
       setFilteredTags(tags);
     } else {
       const term = searchTerm.toLowerCase();
-      setFilteredTags(tags.filter(tag => tag.toLowerCase().includes(term)));
+      setFilteredTags(tags.filter(tag => tag.name.toLowerCase().includes(term)));
     }
   }, [searchTerm, tags]);
   
-  // Filtrar problemas quando uma tag é selecionada
+  // Carregar somente os problemas da tag selecionada
   useEffect(() => {
-    if (selectedTag) {
-      setFilteredProblems(problems.filter(problem => problem.tags.includes(selectedTag)));
-    } else {
+    if (!selectedTag) {
       setFilteredProblems([]);
+      return;
     }
-  }, [selectedTag, problems]);
-  
-  // Contar problemas por tag
-  const countProblemsByTag = (tag) => {
-    return problems.filter(problem => problem.tags.includes(tag)).length;
-  };
+    
+    const fetchProblems = async () => {
+      try {
+        const res = await axios.get('/api/problems', { params: { tag: selectedTag } });
+        setFilteredProblems(res.data);
+      } catch (error) {
+        console.error('Erro ao carregar problemas:', error);
+        setError('Falha ao carregar problemas da tag.');
+      }
+    };
+    
+    fetchProblems();
+  }, [selectedTag]);
   
   if (loading) {
     return <div>Carregando...</div>;
@@ -182,9 +196,9 @@ const TagList = () => {
                   key={idx} 
                   bg="primary"
                   className="me-2 mb-2 p-2 tag-badge"
-                  onClick={() => handleTagClick(tag)}
+                  onClick={() => handleTagClick(tag.name)}
                 >
-                  {tag} <span className="ms-1 badge bg-light text-dark">{countProblemsByTag(tag)}</span>
+                  {tag.name} <span className="ms-1 badge bg-light text-dark">{tag.count}</span>
                 </Badge>
               ))}
             </div>
@@ -195,11 +209,11 @@ const TagList = () => {
       <h3 className="mb-3">Tags Populares</h3>
       
       <Row>
+        {/* As tags já vêm ordenadas pela quantidade de problemas */}
         {filteredTags
-          .sort((a, b) => countProblemsByTag(b) - countProblemsByTag(a))
           .slice(0, 6)
           .map((tag, idx) => {
-            const tagProblems = problems.filter(problem => problem.tags.includes(tag));
+            const tagCategories = categoriesByTag[tag.name] || [];
             
             return (
               <Col key={idx} md={6} lg={4} className="mb-4">
@@ -210,37 +224,27 @@ const TagList = () => {
                         <Badge 
                           bg="primary" 
                           className="me-2 tag-badge"
-                          onClick={() => handleTagClick(tag)}
+                          onClick={() => handleTagClick(tag.name)}
                           style={{ cursor: 'pointer' }}
                         >
-                          {tag}
+                          {tag.name}
                         </Badge>
                       </h5>
-                      <span className="text-muted">{tagProblems.length} problema(s)</span>
+                      <span className="text-muted">{tag.count} problema(s)</span>
                     </div>
                   </Card.Header>
                   <Card.Body>
                     <ul className="list-unstyled">
-                      {tagProblems.slice(0, 3).map(problem => (
-                        <li key={problem.id} className="mb-2">
-                          <Link 
-                            to={`/problem/${problem.id}`}
-                            className="text-decoration-none"
-                          >
-                            {problem.title}
-                          </Link>
+                      {tagCategories.slice(0, 3).map(category => (
+                        <li key={category.name} className="mb-2 d-flex justify-content-between">
+                          <span>{category.name}</span>
+                          <span className="text-muted">{category.count}</span>
                         </li>
                       ))}
                       
-                      {tagProblems.length > 3 && (
+                      {tagCategories.length > 3 && (
                         <li className="text-center">
-                          <em>E mais {tagProblems.length - 3} problema(s)...</em>
-                        </li>
-                      )}
-                      
-                      {tagProblems.length === 0 && (
-                        <li className="text-muted text-center">
-                          Nenhum problema com esta tag
+                          <em>E mais {tagCategories.length - 3} categoria(s)...</em>
                         </li>
                       )}
                     </ul>
@@ -250,7 +254,7 @@ const TagList = () => {
                       variant="outline-primary"
                       size="sm"
                       className="w-100"
-                      onClick={() => handleTagClick(tag)}
+                      onClick={() => handleTagClick(tag.name)}
                     >
                       Ver Todos
                     </Button>
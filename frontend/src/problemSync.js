@@ -0,0 +1,64 @@
+import axios from 'axios';
+
+// Cópia local da lista de problemas, mantida pelo feed de alterações
+// (/api/problems/changes): cada visita baixa só o que mudou desde o último
+// token, em vez da lista inteira.
+const STORAGE_KEY = 'problemSync';
+
+const load = () => {
+  try {
+    const saved = JSON.parse(localStorage.getItem(STORAGE_KEY));
+    if (saved && saved.token && Array.isArray(saved.problems)) {
+      return saved;
+    }
+  } catch (error) {
+    // Cópia corrompida: sincronizar do zero
+  }
+  return { token: null, problems: [] };
+};
+
+const save = (token, problems) => {
+  try {
+    localStorage.setItem(STORAGE_KEY, JSON.stringify({ token, problems }));
+  } catch (error) {
+    // Sem espaço no navegador: a próxima visita baixa tudo de novo
+    localStorage.removeItem(STORAGE_KEY);
+  }
+};
+
+// Mais recentes primeiro, como na listagem da API
+const byCreatedAt = (a, b) =>
+  b.created_at.localeCompare(a.created_at) || b.id - a.id;
+
+export const syncProblems = async () => {
+  let { token, problems } = load();
+  const byId = new Map(problems.map(problem => [problem.id, problem]));
+
+  let hasMore = true;
+  while (hasMore) {
+    let data;
+    try {
+      const res = await axios.get('/api/problems/changes', {
+        params: token ? { since: token } : {}
+      });
+      data = res.data;
+    } catch (error) {
+      // Token expirado ou inválido: recomeçar com a lista completa
+      if (token && error.response && [400, 410].includes(error.response.status)) {
+        token = null;
+        byId.clear();
+        continue;
+      }
+      throw error;
+    }
+
+    data.items.forEach(problem => byId.set(problem.id, problem));
+    data.deleted.forEach(id => byId.delete(id));
+    token = data.token;
+    hasMore = data.has_more;
+  }
+
+  problems = Array.from(byId.values()).sort(byCreatedAt);
+  save(token, problems);
+  return problems;
+};